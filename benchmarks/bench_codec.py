@@ -0,0 +1,102 @@
+"""
+Bytes on the wire and encode/decode time of each payload codec.
+
+Compares JSON (what socket.io sends by default) with msgpack on the two
+largest replies Logseq sends: a getPageBlocksTree of a big page and a
+datascriptQuery returning many blocks.
+
+    python benchmarks/bench_codec.py --blocks 10000 --rows 20000
+"""
+import argparse
+import json
+import time
+import uuid
+
+from fake_logseq import make_page_tree
+from logspyq.server.codec import CODECS
+
+REPEAT = 5
+
+
+def make_query_result(rows: int):
+    """
+    Rows of [block] as returned by a `[:find (pull ?b [*]) ...]` query.
+    """
+    return [
+        [
+            {
+                "id": row + 1,
+                "uuid": str(uuid.UUID(int=row + 1)),
+                "content": f"TODO Task {row} with a [[Link]] and #tag",
+                "marker": "TODO",
+                "priority": "A",
+                "properties": {"status": "todo", "owner": "someone"},
+                "page": {"id": row // 50 + 1},
+                "parent": {"id": row // 50 + 1},
+                "left": {"id": row},
+                "refs": [{"id": 7}, {"id": 9}],
+                "path-refs": [{"id": 7}, {"id": 9}, {"id": row // 50 + 1}],
+            }
+        ]
+        for row in range(rows)
+    ]
+
+
+def json_encode(data) -> bytes:
+    # python-socketio's default serializer: compact-ish json.dumps.
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def json_decode(data: bytes):
+    return json.loads(data)
+
+
+def best_of(func, *args) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure(payload) -> dict:
+    results = {}
+    codecs = {"json": (json_encode, json_decode)}
+    if "msgpack" in CODECS:
+        codec = CODECS["msgpack"]
+        codecs["msgpack"] = (codec.encode, codec.decode)
+    for name, (encode, decode) in codecs.items():
+        wire = encode(payload)
+        results[name] = {
+            "bytes": len(wire),
+            "encode_ms": best_of(encode, payload) * 1000,
+            "decode_ms": best_of(decode, wire) * 1000,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--blocks", type=int, default=10000, help="Blocks in the getPageBlocksTree reply")
+    parser.add_argument("--rows", type=int, default=20000, help="Rows in the datascriptQuery reply")
+    args = parser.parse_args()
+    if "msgpack" not in CODECS:
+        print("msgpack is not installed: pip install msgpack")
+    payloads = {
+        f"getPageBlocksTree ({args.blocks} blocks)": make_page_tree(1, args.blocks, 2),
+        f"datascriptQuery ({args.rows} rows)": make_query_result(args.rows),
+    }
+    for label, payload in payloads.items():
+        print(f"\n{label}:")
+        results = measure(payload)
+        baseline = results["json"]["bytes"]
+        for name, result in results.items():
+            print(
+                f"  {name:8} {result['bytes'] / 1024:10.1f} KiB ({result['bytes'] / baseline:5.0%})"
+                f"  encode {result['encode_ms']:8.2f} ms  decode {result['decode_ms']:8.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Allocation and time cost of converting a getPageBlocksTree response.
+
+Compares the response modes of PluginServer.request on a synthetic page
+with N blocks (default 10k):
+
+    python benchmarks/bench_responses.py --blocks 10000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+import uuid
+
+from logspyq.api.utils import convert_response
+
+
+def make_tree(blocks: int, fanout: int = 10):
+    """
+    A page block tree with `blocks` blocks, `fanout` children per parent.
+    """
+    ids = iter(range(1, blocks + 1))
+
+    def block(parent_id, left_id):
+        block_id = next(ids)
+        return {
+            "id": block_id,
+            "uuid": str(uuid.uuid4()),
+            "content": f"Block {block_id} with some content and a [[Link]]",
+            "properties": {"status": "todo", "priority": "a"},
+            "parent": {"id": parent_id},
+            "left": {"id": left_id},
+            "page": {"id": 0},
+            "format": "markdown",
+            "children": [],
+        }
+
+    top_count = max(1, blocks // fanout)
+    roots, left = [], 0
+    for _ in range(top_count):
+        root = block(0, left)
+        roots.append(root)
+        left = root["id"]
+    remaining = blocks - top_count
+    for root in roots:
+        child_left = root["id"]
+        for _ in range(min(fanout - 1, remaining)):
+            child = block(root["id"], child_left)
+            root["children"].append(child)
+            child_left = child["id"]
+            remaining -= 1
+    return roots
+
+
+# Item access works the same on Box, LazyBox and plain dicts.
+def read_first_uuid(tree):
+    return tree[0]["uuid"]
+
+
+def read_all_uuids(tree):
+    return [block["uuid"] for block in tree]
+
+
+def measure(mode: str, payload: str, reader):
+    # Decode outside the measurement: every mode pays the same JSON cost.
+    raw = json.loads(payload)
+    tracemalloc.start()
+    start = time.perf_counter()
+    tree = convert_response(raw, mode)
+    reader(tree)
+    elapsed = time.perf_counter() - start
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"mode": mode, "seconds": elapsed, "peak_bytes": peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--blocks", type=int, default=10000)
+    args = parser.parse_args()
+    payload = json.dumps(make_tree(args.blocks))
+    print(f"getPageBlocksTree: {args.blocks} blocks, {len(payload)} bytes of JSON")
+    for label, reader in (("first uuid", read_first_uuid), ("all top-level uuids", read_all_uuids)):
+        print(f"\n{label}:")
+        for mode in ("box", "lazy", "raw"):
+            result = measure(mode, payload, reader)
+            print(f"  {mode:5} {result['seconds'] * 1000:9.2f} ms {result['peak_bytes'] / 1024:12.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+End-to-end benchmark of PluginServer against a fake Logseq client.
+
+Starts the server's ASGI app under uvicorn and a fake Logseq client
+(benchmarks/fake_logseq.py) in a separate process, then measures:
+
+    latency     sequential Editor.getBlock round trips (p50/p99)
+    throughput  concurrent Editor.getBlock requests per second
+    tree        time and peak memory of a large getPageBlocksTree per response mode
+    stream      items per second through Editor.iterPageBlocksTree's stream
+    callbacks   events per second dispatched to a registered handler
+
+Results are written as JSON; pass an earlier result with --compare to see
+the change per metric.
+
+    python benchmarks/bench_server.py --latency 0.002 --tree-blocks 10000
+    python benchmarks/bench_server.py --codec msgpack --scenarios tree stream
+    python benchmarks/bench_server.py --compare benchmarks/results/server-20240101-120000.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+import uvicorn
+
+from logspyq.server.server import PluginServer
+
+HERE = Path(__file__).parent
+
+
+def percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def timings(samples) -> dict:
+    return {
+        "p50_ms": percentile(samples, 0.5) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000 if samples else 0.0,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def block_uuid(args, rng: random.Random) -> str:
+    # Same ids as SyntheticGraph: blocks follow the page ids.
+    return str(uuid.UUID(int=args.pages + 1 + rng.randrange(args.pages * args.blocks)))
+
+
+async def bench_latency(server, args) -> dict:
+    rng = random.Random(1)
+    samples = []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        await server.request("Editor.getBlock", block_uuid(args, rng), timeout=10)
+        samples.append(time.perf_counter() - start)
+    return {"requests": args.requests, **timings(samples)}
+
+
+async def bench_throughput(server, args) -> dict:
+    rng = random.Random(2)
+    samples = []
+    remaining = args.requests * 4
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            await server.request("Editor.getBlock", block_uuid(args, rng), timeout=30)
+            samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(samples),
+        "concurrency": args.concurrency,
+        "requests_per_second": len(samples) / elapsed,
+        **timings(samples),
+    }
+
+
+async def bench_tree(server, args) -> dict:
+    results = {}
+    for mode in ("raw", "lazy", "box"):
+        samples = []
+        for _ in range(3):
+            start = time.perf_counter()
+            tree = await server.request("Editor.getPageBlocksTree", "big", timeout=60, response_mode=mode)
+            [block["uuid"] for block in tree]
+            samples.append(time.perf_counter() - start)
+        del tree
+        tracemalloc.start()
+        tree = await server.request("Editor.getPageBlocksTree", "big", timeout=60, response_mode=mode)
+        [block["uuid"] for block in tree]
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del tree
+        results[mode] = {"peak_bytes": peak, **timings(samples)}
+    return {"blocks": args.tree_blocks, "modes": results}
+
+
+async def bench_stream(server, args) -> dict:
+    start = time.perf_counter()
+    count = 0
+    async for _block in server.stream("Editor.getPageBlocksTree", "big", chunk_size=args.chunk_size, response_mode="raw"):
+        count += 1
+    elapsed = time.perf_counter() - start
+    return {"items": count, "chunk_size": args.chunk_size, "items_per_second": count / elapsed}
+
+
+async def bench_callbacks(server, args) -> dict:
+    event_name = "slash-command-bench"
+    done = asyncio.Event()
+    received = 0
+
+    async def handler(sid, *event):
+        nonlocal received
+        received += 1
+        if received >= args.callbacks:
+            done.set()
+
+    server.add_listener(event_name, handler, key="bench")
+    start = time.perf_counter()
+    await server.emit_raw("bench.fire", {"event_name": event_name, "count": args.callbacks})
+    await asyncio.wait_for(done.wait(), timeout=120)
+    elapsed = time.perf_counter() - start
+    server.remove_listener(event_name, "bench")
+    return {"events": received, "events_per_second": received / elapsed}
+
+
+SCENARIOS = {
+    "latency": bench_latency,
+    "throughput": bench_throughput,
+    "tree": bench_tree,
+    "stream": bench_stream,
+    "callbacks": bench_callbacks,
+}
+
+
+async def run(args) -> dict:
+    server = PluginServer(response_mode="lazy")
+    ready = asyncio.Event()
+
+    async def on_ready(sender=None, **kwargs):
+        ready.set()
+
+    server._signal_ready.connect(on_ready, weak=False)
+    port = free_port()
+    uvserver = uvicorn.Server(uvicorn.Config(server._app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.ensure_future(uvserver.serve())
+    while not uvserver.started:
+        await asyncio.sleep(0.05)
+    client = subprocess.Popen(
+        [
+            sys.executable,
+            str(HERE / "fake_logseq.py"),
+            "--url", f"http://127.0.0.1:{port}",
+            "--pages", str(args.pages),
+            "--blocks", str(args.blocks),
+            "--big-page-blocks", str(args.tree_blocks),
+            "--latency", str(args.latency),
+            "--codec", args.codec,
+        ]
+    )
+    server.metrics.start()
+    try:
+        await asyncio.wait_for(ready.wait(), timeout=30)
+        results = {}
+        for name in args.scenarios:
+            print(f"Running {name}...", file=sys.stderr)
+            results[name] = await SCENARIOS[name](server, args)
+        results["server"] = {"loop_lag": server.metrics.as_dict()["loop_lag"]}
+        return results
+    finally:
+        server.metrics.stop()
+        client.terminate()
+        client.wait()
+        uvserver.should_exit = True
+        await serving
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    out = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            out.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[name] = value
+    return out
+
+
+def compare(current: dict, previous: dict) -> None:
+    now, before = flatten(current["results"]), flatten(previous["results"])
+    print(f"\nCompared with {previous['meta'].get('commit') or 'previous run'}:")
+    for name, value in now.items():
+        if name in before and before[name]:
+            change = (value - before[name]) / before[name] * 100
+            print(f"  {name:45} {before[name]:14.2f} -> {value:14.2f} ({change:+6.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--blocks", type=int, default=50, help="Blocks per page")
+    parser.add_argument("--tree-blocks", type=int, default=10000, help="Blocks on the large page")
+    parser.add_argument("--latency", type=float, default=0.0, help="Injected latency in seconds")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--callbacks", type=int, default=5000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--codec", default="json", help="Payload codec the fake client negotiates")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--output", type=Path, help="Result file (default: benchmarks/results/server-<time>.json)")
+    parser.add_argument("--compare", type=Path, help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    report = {
+        "meta": {
+            "benchmark": "server",
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "params": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        },
+        "results": results,
+    }
+    output = args.output or HERE / "results" / time.strftime("server-%Y%m%d-%H%M%S.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(json.dumps(results, indent=2))
+    print(f"\nWrote {output}", file=sys.stderr)
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
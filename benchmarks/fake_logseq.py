@@ -0,0 +1,227 @@
+"""
+A stand-in for the Logseq plugin (plugin/index.ts) built on python-socketio.
+
+Serves a synthetic graph with optional injected latency, so the plugin
+server can be benchmarked without Logseq. Needs the socket.io client
+extras: pip install "python-socketio[asyncio_client]"
+
+    python benchmarks/fake_logseq.py --url http://localhost:8484 --pages 100 --blocks 50
+"""
+import argparse
+import asyncio
+import logging
+import uuid
+from typing import Dict, List, Optional
+
+import socketio
+
+from logspyq.server.codec import CODECS, decode
+
+log = logging.getLogger(__name__)
+
+REGISTRATIONS = (
+    "Editor.registerSlashCommand",
+    "Editor.registerBlockContextMenuItem",
+    "App.registerCommand",
+    "App.registerCommandPalette",
+)
+
+
+def make_page_tree(page_id: int, blocks: int, first_id: int, fanout: int = 10) -> List[dict]:
+    """
+    Nested block tree for one page, ids starting at `first_id`.
+    """
+    ids = iter(range(first_id, first_id + blocks))
+
+    def block(parent_id, left_id):
+        block_id = next(ids)
+        return {
+            "id": block_id,
+            "uuid": str(uuid.UUID(int=block_id)),
+            "content": f"Block {block_id} with some content and a [[Link]]",
+            "properties": {"status": "todo", "priority": "a"},
+            "parent": {"id": parent_id},
+            "left": {"id": left_id},
+            "page": {"id": page_id},
+            "format": "markdown",
+            "children": [],
+        }
+
+    top_count = max(1, blocks // fanout)
+    roots, left = [], page_id
+    for _ in range(min(top_count, blocks)):
+        root = block(page_id, left)
+        roots.append(root)
+        left = root["id"]
+    remaining = blocks - len(roots)
+    for root in roots:
+        child_left = root["id"]
+        for _ in range(min(fanout - 1, remaining)):
+            child = block(root["id"], child_left)
+            root["children"].append(child)
+            child_left = child["id"]
+            remaining -= 1
+    return roots
+
+
+class SyntheticGraph:
+    """
+    `pages` pages with `blocks` blocks each; page i is named "Page i".
+    With `big_page_blocks`, one more page named "Big" holds that many blocks.
+    """
+
+    def __init__(self, pages: int = 100, blocks: int = 50, big_page_blocks: int = 0) -> None:
+        self.pages: List[dict] = []
+        self.trees: Dict[str, List[dict]] = {}
+        self.blocks: Dict[str, dict] = {}
+        next_id = pages + 1
+        page_specs = [(page_id, f"Page {page_id}", blocks) for page_id in range(1, pages + 1)]
+        if big_page_blocks:
+            # Ids after every regular block, so regular block ids stay predictable.
+            page_specs.append((pages + pages * blocks + 1, "Big", big_page_blocks))
+            next_id_big = pages + pages * blocks + 2
+        for page_id, original_name, block_count in page_specs:
+            name = original_name.lower()
+            self.pages.append(
+                {"id": page_id, "uuid": str(uuid.UUID(int=page_id)), "name": name, "originalName": original_name}
+            )
+            if original_name == "Big":
+                next_id = next_id_big
+            tree = make_page_tree(page_id, block_count, next_id)
+            next_id += block_count
+            self.trees[name] = tree
+            stack = list(tree)
+            while stack:
+                block = stack.pop()
+                self.blocks[block["uuid"]] = block
+                stack.extend(block["children"])
+
+    def flat(self, name: str) -> List[dict]:
+        out, stack = [], list(reversed(self.trees.get(name.lower(), [])))
+        while stack:
+            block = stack.pop()
+            out.append({**block, "children": [["uuid", child["uuid"]] for child in block["children"]]})
+            stack.extend(reversed(block["children"]))
+        return out
+
+
+class FakeLogseq:
+    """
+    Answers the plugin server the way plugin/index.ts does.
+
+    Args:
+        graph: The graph to serve.
+        latency: Seconds to wait before answering each request.
+        codec: Payload codec to ask the server for ("json" or "msgpack").
+    """
+
+    def __init__(self, graph: SyntheticGraph, latency: float = 0.0, codec: str = "json") -> None:
+        self.graph = graph
+        self.latency = latency
+        self.requested_codec = codec
+        self.codec = CODECS["json"]
+        self.registered: Dict[str, dict] = {}
+        self.requests = 0
+        self._streams: Dict[str, List[dict]] = {}
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.sio.on("connect")(self._on_connect)
+        self.sio.on("bench.fire")(self._on_fire)
+        self.sio.on("*")(self._on_any)
+
+    async def connect(self, url: str) -> None:
+        await self.sio.connect(url, transports=["websocket"])
+
+    async def disconnect(self) -> None:
+        await self.sio.disconnect()
+
+    async def _on_connect(self):
+        if self.requested_codec != "json":
+            reply = await self.sio.call("codec", {"codecs": [self.requested_codec, "json"]}, timeout=5)
+            self.codec = CODECS[reply["codec"]]
+        await self.sio.emit("ready")
+        await self.sio.emit("graph", {"name": "bench", "path": "/tmp/bench"})
+
+    async def _on_fire(self, data):
+        """
+        Emit `count` callback events, as if the user triggered them.
+        """
+        data = decode(data)
+        for i in range(data["count"]):
+            await self.sio.emit(data["event_name"], self.codec.encode({"uuid": str(uuid.UUID(int=i))}))
+
+    async def _on_any(self, event: str, data=None):
+        return self.codec.encode(await self._answer(event, decode(data)))
+
+    async def _answer(self, event: str, data=None):
+        if event in REGISTRATIONS:
+            self.registered[data.get("event_name")] = data
+            return None
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if event == "batch":
+            return [self._reply(call["name"], call["data"]) for call in data["calls"]]
+        result = self.call(event, data or {})
+        return "null" if result is None else result
+
+    def _reply(self, name: str, data: dict) -> dict:
+        try:
+            result = self.call(name, data)
+        except Exception as e:
+            return {"error": str(e)}
+        return {"result": "null" if result is None else result}
+
+    def call(self, name: str, data: dict) -> Optional[object]:
+        args = data.get("args") or []
+        if name == "Editor.getAllPages":
+            return self.graph.pages
+        if name == "Editor.getPage":
+            return next((page for page in self.graph.pages if page["name"] == str(args[0]).lower()), None)
+        if name == "Editor.getPageBlocksTree":
+            return self.graph.trees.get(str(args[0]).lower())
+        if name == "Editor.getBlock":
+            return self.graph.blocks.get(args[0])
+        if name == "stream.open":
+            source = data["source"]
+            if source == "Editor.getAllPages":
+                items = self.graph.pages
+            else:
+                items = self.graph.flat(data["args"][0])
+            self._streams[data["stream"]] = list(items)
+            return {"stream": data["stream"], "total": len(items)}
+        if name == "stream.next":
+            items = self._streams.get(data["stream"], [])
+            chunk, rest = items[: data["chunk_size"]], items[data["chunk_size"] :]
+            if rest:
+                self._streams[data["stream"]] = rest
+            else:
+                self._streams.pop(data["stream"], None)
+            return {"items": chunk, "done": not rest}
+        if name == "stream.close":
+            self._streams.pop(data["stream"], None)
+            return None
+        return None
+
+
+async def run(url: str, pages: int, blocks: int, big_page_blocks: int, latency: float, codec: str) -> None:
+    client = FakeLogseq(SyntheticGraph(pages, blocks, big_page_blocks), latency=latency, codec=codec)
+    await client.connect(url)
+    log.info(f"Connected to {url}: {pages} pages x {blocks} blocks, {latency * 1000:.1f} ms latency")
+    await client.sio.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8484")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--blocks", type=int, default=50, help="Blocks per page")
+    parser.add_argument("--big-page-blocks", type=int, default=0, help="Blocks on an extra page named Big")
+    parser.add_argument("--latency", type=float, default=0.0, help="Injected latency in seconds")
+    parser.add_argument("--codec", choices=list(CODECS), default="json", help="Payload codec to negotiate")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args.url, args.pages, args.blocks, args.big_page_blocks, args.latency, args.codec))
+
+
+if __name__ == "__main__":
+    main()
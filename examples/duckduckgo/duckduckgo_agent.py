@@ -24,15 +24,18 @@ async def search_duck_duck_go(_sid):
     results = await AsyncDDGS().atext(keywords, max_results=int(logseq.settings.max_results))
     results = [Box(r) for r in results]
     current_block = await logseq.Editor.getCurrentBlock()
-    for result in results:  # type: ignore
-        properties = {
-            "link": result.href,
-            "description": result.body,
-            "source": "duckduckgo",
+    # All results go to Logseq in one insertBatchBlock call.
+    await logseq.Editor.insertBlocks(current_block.uuid, [
+        {
+            "content": result.title,
+            "properties": {
+                "link": result.href,
+                "description": result.body,
+                "source": "duckduckgo",
+            },
         }
-        await logseq.Editor.insertBlock(
-            current_block.uuid, result.title, properties=properties, sibling=False
-        )
+        for result in results
+    ])
 
 
 if __name__ == "__main__":
@@ -1,5 +1,4 @@
 import logging
-import re
 from datetime import datetime
 from pathlib import Path
 from traceback import print_exc
@@ -11,6 +10,7 @@ from pyrogram.client import Client as TelegramClient
 from pyrogram import filters
 
 from logspyq.api import LogseqPlugin, settings_schema, setting
+from logspyq.api.linker import PageLinker, page_names
 
 logger = logging.getLogger(__name__)
 WORK_DIR = click.get_app_dir("logspyq-telegram-agent")
@@ -129,6 +129,9 @@ logseq.settings = Settings()
 telegram = TelegramAgent(
     logseq.name, bot_admin=logseq.settings.bot_admin, work_dir=WORK_DIR
 )
+page_linker = PageLinker()
+# Set once every page is loaded; an empty graph still counts as loaded.
+page_linker_loaded = False
 
 
 def timestamped_text(text: str) -> str:
@@ -142,45 +145,27 @@ async def link_page_names(text: str) -> str:
     """
     Converts page names in the format [[Page Name]] to links.
     """
-    skip_names = {
-        "to",
-        "do",
-        "this",
-        "here",
-        "now",
-        "later",
-        "soon",
-        "todo",
-        "doing",
-        "done",
-        "link",
-        "page",
-        "pages",
-    }
-    all_pages = await logseq.Editor.getAllPages()
-    # collect all page names
-    page_names = [page.name for page in all_pages]
-    # collect all aliases from page properties
-    aliases = []
-    for page in all_pages:
-        if "properties" in page:
-            if "aliases" in page.properties:
-                aliases.extend(page.properties.aliases)
-    page_names.extend(aliases)
-    page_names = sorted(page_names, key=lambda x: len(x), reverse=True)
-    for page_name in page_names:
-        if "[" in page_name or "]" in page_name:
-            continue
-        if page_name.lower() in skip_names:
-            continue
-        text = re.sub(
-            r"\b" + page_name + r"\b",
-            f"[[{page_name.replace(' ', '___')}]]",
-            text,
-            flags=re.IGNORECASE,
-        )
-    text = text.replace("___", " ")
-    return text
+    global page_linker_loaded
+    if not page_linker_loaded:
+        # First message: load all pages once, then follow DB changes.
+        async for page in logseq.Editor.iterAllPages(chunk_size=500):
+            page_linker.update_pages([page])
+        page_linker_loaded = True
+    return page_linker.link(text)
+
+
+@logseq.DB.onChanged(debounce=1.0, coalesce="merge")
+async def update_page_linker(sid, event):
+    "Keep the page linker current as pages are created or renamed."
+    if not page_linker_loaded or not event:
+        return
+    for entity in event.get("blocks", []):
+        if "name" in entity and "page" not in entity:
+            page_linker.update_page(entity.id, page_names(entity))
+    for datom in event.get("txData", []):
+        # A retracted uuid means the entity (possibly a page) was deleted.
+        if len(datom) >= 5 and datom[1] in ("uuid", ":block/uuid") and not datom[4]:
+            page_linker.remove_page(datom[0])
 
 
 @logseq.on_ready()
@@ -1,6 +1,7 @@
 import '@logseq/libs'
 import { SettingSchemaDesc, SimpleCommandKeybinding } from '@logseq/libs/dist/LSPlugin';
 import * as io from 'socket.io-client'
+import * as msgpack from '@msgpack/msgpack'
 
 const delay = ms => new Promise(res => setTimeout(res, ms));
 
@@ -46,10 +47,60 @@ async function main() {
     transports: ['websocket'],
   })
 
+  // Payload codec agreed with the server on each connect. With msgpack,
+  // payloads travel as binary attachments instead of JSON text.
+  let codec = "json"
+
+  function decode(data) {
+    if (data instanceof ArrayBuffer || ArrayBuffer.isView(data)) {
+      return msgpack.decode(<ArrayBuffer>data)
+    }
+    return data
+  }
+
+  function encode(data) {
+    return codec === "msgpack" ? msgpack.encode(data) : data
+  }
+
+  // socket.on and socket.emit with payloads passed through the codec.
+  function on(event: string, handler: (data?: any, callback?: (result: any) => void) => any) {
+    socket.on(event, (data, callback) => handler(
+      decode(data),
+      callback && ((result) => callback(encode(result))),
+    ))
+  }
+
+  function send(event: string, data?: any) {
+    if (data === undefined) {
+      socket.emit(event)
+    } else {
+      socket.emit(event, encode(data))
+    }
+  }
+
+  function negotiateCodec(): Promise<string> {
+    // Servers without codec support never answer: stay on JSON.
+    return new Promise((resolve) => {
+      socket.timeout(2000).emit('codec', { codecs: ["msgpack", "json"] }, (err, reply) => {
+        resolve((!err && reply && reply.codec) || "json")
+      })
+    })
+  }
+
   socket.on('connect', async () => {
     console.log("Connected to plugin server.")
-    socket.emit('ready')
+    codec = await negotiateCodec()
+    console.log("Payload codec:", codec)
+    // The graph first: the server routes calls by connection and graph.
     socket.emit('graph', await logseq.App.getCurrentGraph())
+    socket.emit('ready')
+  })
+
+  // Keep the server's record of this window's graph current.
+  logseq.App.onCurrentGraphChanged(async () => {
+    if (socket.connected) {
+      socket.emit('graph', await logseq.App.getCurrentGraph())
+    }
   })
 
   socket.on('disconnect', async () => {
@@ -58,123 +109,170 @@ async function main() {
     logseq.useSettingsSchema(settingsSchema)
   })
 
-  socket.on("useSettingsSchema", async (settings) => {
+  // Logseq keeps hooks for the life of the plugin, across socket reconnects,
+  // and has no way to remove most of them; the server asks again on every
+  // connect, so install each event_name once. A full reload resets this set
+  // along with the hooks.
+  const registeredHooks = new Set<string>()
+
+  function registerOnce(method: string, event_name: string): boolean {
+    const key = `${method}:${event_name}`
+    if (registeredHooks.has(key)) {
+      console.log("Already registered:", key)
+      return false
+    }
+    registeredHooks.add(key)
+    return true
+  }
+
+  on("useSettingsSchema", async (settings) => {
     const settings_schema = <SettingSchemaDesc[]>settings
     logseq.useSettingsSchema(settings_schema);
     console.log("SettingsSchema applied:", settings_schema)
   })
 
-  socket.on("Editor.registerSlashCommand", async (data) => {
+  on("Editor.registerSlashCommand", async (data) => {
     const command = <string>data.command
     const event_name = <string>data.event_name
+    if (!registerOnce("Editor.registerSlashCommand", event_name)) {
+      return
+    }
 
     logseq.Editor.registerSlashCommand(command, async (_) => {
-      socket.emit(event_name)
+      send(event_name)
     })
     console.log("Registered slash command:", command, event_name)
   })
 
-  socket.on("Editor.registerBlockContextMenuItem", async (data) => {
+  on("Editor.registerBlockContextMenuItem", async (data) => {
     const tag = <string>data.tag
     const event_name = <string>data.event_name
+    if (!registerOnce("Editor.registerBlockContextMenuItem", event_name)) {
+      return
+    }
 
     logseq.Editor.registerBlockContextMenuItem(tag, async (...args) => {
       console.log("Block context menu item clicked:", tag, event_name, args)
-      socket.emit(event_name)
+      send(event_name)
     })
     console.log("Registered block context menu item:", tag, event_name)
   })
 
-  socket.on("Editor.onInputSelectionEnd", async (data) => {
+  on("Editor.onInputSelectionEnd", async (data) => {
     const event_name = <string>data.event_name
+    if (!registerOnce("Editor.onInputSelectionEnd", event_name)) {
+      return
+    }
 
     logseq.Editor.onInputSelectionEnd(async (e) => {
       console.log("Input selection end:", event_name, e)
-      socket.emit(event_name, e)
+      send(event_name, e)
     })
     console.log("Registered input selection end:", event_name)
   })
 
-  socket.on("Editor.getAllPages", async (data, callback) => {
+  async function getAllPages(data) {
     const all_pages = await logseq.Editor.getAllPages()
     console.log("All pages:", all_pages)
-    callback(all_pages)
+    return all_pages
+  }
+
+  on("Editor.getAllPages", async (data, callback) => {
+    callback(await getAllPages(data))
   })
     
-  socket.on("App.onBlockRendererSlotted", async (data) => {
+  on("App.onBlockRendererSlotted", async (data) => {
     const event_name = <string>data.event_name
+    if (!registerOnce("App.onBlockRendererSlotted", event_name)) {
+      return
+    }
 
     logseq.App.onBlockRendererSlotted(async (e) => {
       console.log("Block renderer slotted:", event_name, e)
-      socket.emit(event_name, e)
+      send(event_name, e)
     })
     console.log("Registered block renderer slotted:", event_name)
   })
 
-  socket.on("App.onCurrentGraphChanged", async (data) => {
+  on("App.onCurrentGraphChanged", async (data) => {
     const event_name = <string>data.event_name
+    if (!registerOnce("App.onCurrentGraphChanged", event_name)) {
+      return
+    }
     logseq.App.onCurrentGraphChanged(
       async (e) => {
         console.log("Current graph changed:", event_name, e)
         const graph = await logseq.App.getCurrentGraph()
-        socket.emit(event_name, graph)
+        send(event_name, graph)
       },
     )
     console.log("Registered current graph changed:", event_name)
   })
 
-  // socket.on("App.onMacroRendererSlotted", async (data) => {
+  // on("App.onMacroRendererSlotted", async (data) => {
   //   const event_name = <string>data.event_name
 
   //   // @ts-ignore
   //   logseq.App.onMacroRendererSlotted(async ({ slot, payload: { arguments } }) => {
   //     console.log("Macro renderer slotted:", event_name, slot, arguments)
-  //     socket.emit(event_name, { slot, arguments })
+  //     send(event_name, { slot, arguments })
   //   })
   //   console.log("Registered macro renderer slotted:", event_name)
   // })
 
-  socket.on("App.onPageHeadActionsSlotted", async (data) => {
+  on("App.onPageHeadActionsSlotted", async (data) => {
     const event_name = <string>data.event_name
+    if (!registerOnce("App.onPageHeadActionsSlotted", event_name)) {
+      return
+    }
 
     logseq.App.onPageHeadActionsSlotted(async (e) => {
       console.log("Page head actions slotted:", event_name, e)
-      socket.emit(event_name, e)
+      send(event_name, e)
     })
     console.log("Registered page head actions slotted:", event_name)
   })
 
-  socket.on("App.onRouteChanged", async (data) => {
+  on("App.onRouteChanged", async (data) => {
     const event_name = <string>data.event_name
+    if (!registerOnce("App.onRouteChanged", event_name)) {
+      return
+    }
 
     logseq.App.onRouteChanged(async (e) => {
       console.log("Route changed:", event_name, e)
-      socket.emit(event_name, e)
+      send(event_name, e)
     })
     console.log("Registered route changed:", event_name)
   })
 
-  socket.on("App.onSidebarVisibleChanged", async (data) => {
+  on("App.onSidebarVisibleChanged", async (data) => {
     const event_name = <string>data.event_name
+    if (!registerOnce("App.onSidebarVisibleChanged", event_name)) {
+      return
+    }
 
     logseq.App.onSidebarVisibleChanged(async (e) => {
       console.log("Sidebar visible changed:", event_name, e)
-      socket.emit(event_name, e)
+      send(event_name, e)
     })
     console.log("Registered sidebar visible changed:", event_name)
   })
 
-  socket.on("App.onThemeModeChanged", async (data) => {
+  on("App.onThemeModeChanged", async (data) => {
     const event_name = <string>data.event_name
+    if (!registerOnce("App.onThemeModeChanged", event_name)) {
+      return
+    }
 
     logseq.App.onThemeModeChanged(async (e) => {
       console.log("Theme mode changed:", event_name, e)
-      socket.emit(event_name, e)
+      send(event_name, e)
     })
     console.log("Registered theme mode changed:", event_name)
   })
 
-  socket.on("App.registerCommand", async (data) => {
+  on("App.registerCommand", async (data) => {
     // registerCommand(type: string, opts: { desc?: string; key: string; keybinding?: SimpleCommandKeybinding; label: string; palette?: boolean }, action: SimpleCommandCallback): void
     const type = <string>data.type
     const desc = <string>data.desc
@@ -183,52 +281,64 @@ async function main() {
     const label = <string>data.label
     const palette = <boolean>data.palette
     const event_name = <string>data.event_name
+    if (!registerOnce("App.registerCommand", event_name)) {
+      return
+    }
 
     logseq.App.registerCommand(type, { desc, key, keybinding, label, palette }, async (e) => {
       console.log("Command registered:", type, desc, key, keybinding, label, palette, event_name, e)
-      socket.emit(event_name, e)
+      send(event_name, e)
     })
     console.log("Registered command:", type, desc, key, keybinding, label, palette, event_name)
   })
   
-  socket.on("App.registerCommandPalette", async (data) => {
+  on("App.registerCommandPalette", async (data) => {
     // registerCommandPalette(opts: { key: string; keybinding?: SimpleCommandKeybinding; label: string }, action: SimpleCommandCallback): void
     const key = <string>data.key
     const keybinding = <SimpleCommandKeybinding>data.keybinding
     const label = <string>data.label
     const event_name = <string>data.event_name
+    if (!registerOnce("App.registerCommandPalette", event_name)) {
+      return
+    }
 
     logseq.App.registerCommandPalette({ key, keybinding, label }, async (e) => {
       console.log("Command palette registered:", key, keybinding, label, event_name, e)
-      socket.emit(event_name, e)
+      send(event_name, e)
     })
     console.log("Registered command palette:", key, keybinding, label, event_name)
   })
   
-  // socket.on("DB.onBlockChanged", async (data) => {
-  //   // onBlockChanged(uuid: string, callback: (block: BlockEntity, txData: IDatom[], txMeta?: { outlinerOp: string }) => void): IUserOffHook
-  //   const event_name = <string>data.event_name
-  //   const uuid = <string>data.uuid
+  on("DB.onBlockChanged", async (data) => {
+    // onBlockChanged(uuid: string, callback: (block: BlockEntity, txData: IDatom[], txMeta?: { outlinerOp: string }) => void): IUserOffHook
+    const event_name = <string>data.event_name
+    const uuid = <string>data.uuid
+    if (!registerOnce("DB.onBlockChanged", event_name)) {
+      return
+    }
 
-  //   logseq.DB.onBlockChanged(uuid, async (block, txData, txMeta) => {
-  //     console.log("Block changed:", event_name, {"uuid":uuid, "block":block, "txData":txData, "txMeta":txMeta})
-  //     socket.emit(event_name, {"uuid":uuid, "block":block, "txData":txData, "txMeta":txMeta})
-  //   })
-  //   console.log("Registered block changed:", event_name, uuid)
-  // })
+    logseq.DB.onBlockChanged(uuid, async (block, txData, txMeta) => {
+      console.log("Block changed:", event_name, {"uuid":uuid, "block":block, "txData":txData, "txMeta":txMeta})
+      send(event_name, {"uuid":uuid, "block":block, "txData":txData, "txMeta":txMeta})
+    })
+    console.log("Registered block changed:", event_name, uuid)
+  })
 
-  // socket.on("DB.onChanged", async (data) => {
-  //   // onChanged: IUserHook<{ blocks: BlockEntity[]; txData: IDatom[]; txMeta?: { outlinerOp: string } }, IUserOffHook>
-  //   const event_name = <string>data.event_name
+  on("DB.onChanged", async (data) => {
+    // onChanged: IUserHook<{ blocks: BlockEntity[]; txData: IDatom[]; txMeta?: { outlinerOp: string } }, IUserOffHook>
+    const event_name = <string>data.event_name
+    if (!registerOnce("DB.onChanged", event_name)) {
+      return
+    }
 
-  //   logseq.DB.onChanged(async (e) => {
-  //     console.log("DB changed:", event_name, e)
-  //     socket.emit(event_name, e)
-  //   })
-  //   console.log("Registered DB changed:", event_name)
-  // })
+    logseq.DB.onChanged(async (e) => {
+      console.log("DB changed:", event_name, e)
+      send(event_name, e)
+    })
+    console.log("Registered DB changed:", event_name)
+  })
 
-  socket.on("DB.datascriptQuery", async (data, callback) => {
+  async function datascriptQuery(data) {
     // datascriptQuery<T>(query: string, ...inputs: any[]): Promise<T>
     const query = <string>data.query
     const inputs = <any[]>data.inputs
@@ -237,9 +347,19 @@ async function main() {
     console.log("DB.datascriptQuery:", data, query, inputs)
     const result = await logseq.DB.datascriptQuery(query)
     console.log("DB datascript query:", query, inputs, result)
-    callback(result)
+    return result
+  }
+
+  on("DB.datascriptQuery", async (data, callback) => {
+    callback(await datascriptQuery(data))
   })
 
+  // Requests with dedicated handlers, reused by the batch dispatcher.
+  const requestHandlers = {
+    "Editor.getAllPages": getAllPages,
+    "DB.datascriptQuery": datascriptQuery,
+  }
+
   async function executeFunctionByName(functionName, context, args) {
     var namespaces = functionName.split(".");
     var func = namespaces.pop();
@@ -267,12 +387,107 @@ async function main() {
     }
   }
 
-  socket.onAny(async (event, data, callback) => {
+  // Streams: large results held here and handed out in chunks on demand.
+  const STREAM_IDLE_MS = 60000
+  const streams = new Map<string, { items: any[], offset: number, timer: any }>()
+
+  function flattenBlocks(blocks: any[], out: any[] = []) {
+    for (const block of blocks || []) {
+      const { children, ...rest } = block
+      out.push(rest)
+      flattenBlocks((children || []).filter((child) => !Array.isArray(child)), out)
+    }
+    return out
+  }
+
+  const streamSources = {
+    "Editor.getAllPages": async (args) => await logseq.Editor.getAllPages(),
+    "Editor.getPageBlocksTree": async (args) => flattenBlocks(await logseq.Editor.getPageBlocksTree(args[0])),
+  }
+
+  function closeStream(stream_id: string) {
+    const stream = streams.get(stream_id)
+    if (stream) {
+      clearTimeout(stream.timer)
+      streams.delete(stream_id)
+    }
+  }
+
+  on("stream.open", async (data, callback) => {
+    const stream_id = <string>data.stream
+    const source = streamSources[data.source]
+    if (!source) {
+      callback({ error: `Unknown stream source: ${data.source}` })
+      return
+    }
+    const items = (await source(data.args || [])) || []
+    streams.set(stream_id, {
+      items,
+      offset: 0,
+      timer: setTimeout(() => closeStream(stream_id), STREAM_IDLE_MS),
+    })
+    console.log("Stream opened:", stream_id, data.source, items.length)
+    callback({ stream: stream_id, total: items.length })
+  })
+
+  on("stream.next", async (data, callback) => {
+    const stream_id = <string>data.stream
+    const stream = streams.get(stream_id)
+    if (!stream) {
+      callback({ items: [], done: true })
+      return
+    }
+    const items = stream.items.slice(stream.offset, stream.offset + data.chunk_size)
+    stream.offset += items.length
+    const done = stream.offset >= stream.items.length
+    if (done) {
+      closeStream(stream_id)
+    } else {
+      clearTimeout(stream.timer)
+      stream.timer = setTimeout(() => closeStream(stream_id), STREAM_IDLE_MS)
+    }
+    callback({ items, done })
+  })
+
+  on("stream.close", async (data) => {
+    closeStream(<string>data.stream)
+  })
+
+  async function callMethod(event, data) {
+    if (event in requestHandlers) {
+      return await requestHandlers[event](data)
+    }
     var args = <string[]>data.args
     // take all key, value pairs in data except args
     var opts = Object.assign({}, data)
     delete opts.args
     args.push(opts)
+    console.log("Executing event:", event, args)
+    return await executeFunctionByName(event, logseq, args)
+  }
+
+  on("batch", async (data, callback) => {
+    // Run calls in order; one reply carries every result.
+    const calls = <any[]>data.calls
+    const results: any[] = []
+    console.log("Batch:", calls.length, "calls")
+    for (const call of calls) {
+      try {
+        const result = await callMethod(call.name, call.data)
+        results.push({ result: (result === undefined || result === null) ? "null" : result })
+      } catch (e) {
+        console.error("Error executing batched function:", call.name, e)
+        results.push({ error: String(e) })
+      }
+    }
+    if (callback) {
+      callback(results)
+    }
+  })
+
+  socket.onAny(async (event, rawData, rawCallback) => {
+    const data = decode(rawData)
+    const callback = rawCallback && ((result) => rawCallback(encode(result)))
 
     // Skip existing handlers
     if ([
@@ -291,19 +506,22 @@ async function main() {
       "DB.onChanged",
       "DB.onBlockChanged",
       "DB.datascriptQuery",
+      "batch",
+      "stream.open",
+      "stream.next",
+      "stream.close",
     ].includes(event)) {
       console.log("Skipping event:", event)
       return
     }
     const current_page = await logseq.App.getCurrentPage()
     console.log({current_page})
-    console.log("Received event:", event, args)
+    console.log("Received event:", event, data.args)
     var result: any
     try {
-      console.log("Executing event:", event, args)
-      result = await executeFunctionByName(event, logseq, args)
+      result = await callMethod(event, data)
       console.log("Result:", result)
-      if (callback && result) {
+      if (callback && result !== undefined && result !== null) {
         console.log("Calling callback with result:", result)
         callback(result)
       } else if (callback) {
@@ -51,6 +51,9 @@ setup(
         'uvicorn[standard]',
         'uvloop',
     ],
+    extras_require={
+        'msgpack': ['msgpack'],
+    },
     dev_requires=[
         'pytest',
         'pytest-asyncio',
@@ -1,11 +1,20 @@
 import time
-from logspyq.api import LogseqPlugin
+from logspyq.api import LogseqPlugin, setting, settings_schema
 from .lib import shellcheck_command, execute_command_async
 
 
+@settings_schema
+class Settings:
+    timeout: int = setting(30, "Seconds before the command is killed")
+    update_interval: float = setting(1.0, "Seconds between updates of the output block")
+    max_output_bytes: int = setting(100_000, "Bytes of stdout/stderr kept; the rest is truncated")
+    max_output_lines: int = setting(2000, "Lines of stdout/stderr kept; the rest is truncated")
+
+
 logseq = LogseqPlugin(
     name="UNIX Shell", description="Execute a UNIX shell command from Logseq"
 )
+logseq.settings = Settings()
 
 
 @logseq.App.registerCommandPalette(
@@ -34,38 +43,58 @@ async def execute_command_in_shell(sid, event):
             current_block.uuid, f"```stderr\n{results}\n```", sibling=False
         )
         return
-    # Execute command
+    # Execute command, showing its output in a block as it arrives
     start_time = time.time()
-    result = await execute_command_async(command, timeout=30)
+    output_uuid = None
+
+    async def show_output(partial):
+        nonlocal output_uuid
+        content = render_output(partial, running=True)
+        if output_uuid is None:
+            output_uuid = (await logseq.Editor.insertBlocks(current_block.uuid, [content]))[0]
+        else:
+            await logseq.Editor.updateBlock(output_uuid, content)
+
+    result = await execute_command_async(
+        command,
+        timeout=logseq.settings.timeout,
+        on_output=show_output,
+        update_interval=logseq.settings.update_interval,
+        max_bytes=logseq.settings.max_output_bytes,
+        max_lines=logseq.settings.max_output_lines,
+    )
     duration = time.time() - start_time
     if result.timeout:
         await logseq.App.showMsg(
             f"Command timed out. Exit code: {result.returncode}", "warning", timeout=3000
         )
-        return
-    # Insert stdout and stderr as new blocks
     properties = {
         "exit_code": result.returncode,
         "start_time": time.strftime("%Y-%m-%d %H:%M", time.localtime(start_time)),
         "duration": f"{duration:.3f}",
     }
-    if result.stderr:
-        await logseq.Editor.insertBlock(
-            current_block.uuid,
-            "```stderr\n" + result.stderr + "\n```",
-            sibling=False,
-            properties=properties,
-        )
-    if result.stdout:
-        await logseq.Editor.insertBlock(
-            current_block.uuid,
-            "```stdout\n" + result.stdout + "\n```",
-            sibling=False,
-            properties=properties,
-        )
-    if not any([result.stdout, result.stderr]):
+    content = render_output(result)
+    if output_uuid is not None:
+        await logseq.Editor.updateBlock(output_uuid, content, **properties)
+    elif content:
+        await logseq.Editor.insertBlocks(current_block.uuid, [{"content": content, "properties": properties}])
+    else:
         await logseq.App.showMsg("Command executed successfully.", timeout=3000)
 
 
+def render_output(result, running: bool = False) -> str:
+    """
+    Block content for a (partial) command result: stderr and stdout fences.
+    """
+    sections = [
+        f"```{name}\n{output}\n```"
+        for name, output in (("stderr", result.stderr), ("stdout", result.stdout))
+        if output
+    ]
+    if running:
+        sections.append("Running...")
+    return "\n".join(sections)
+
+
 if __name__ == "__main__":
     logseq.run(host="localhost", port=8484, debug=True)
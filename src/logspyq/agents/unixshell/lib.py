@@ -1,8 +1,12 @@
 import asyncio
+import codecs
+import contextlib
+import hashlib
 import logging
 import os
 import subprocess
-from typing import List, Optional
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
 from box import Box
 from ftfy import fix_text
 
@@ -10,6 +14,119 @@ logger = logging.getLogger(__name__)
 SHELLCHECK_PATH = os.environ.get("SHELLCHECK_PATH", "shellcheck")
 
 
+class SubprocessPool:
+    """
+    Caps how many subprocesses the agent runs at once; the rest wait their
+    turn, so a burst of shortcut presses does not fork a process each.
+
+    Usage:
+        async with PROCESSES.slot():
+            process = await asyncio.create_subprocess_exec(...)
+    """
+
+    def __init__(self, max_processes: int = 4) -> None:
+        self.max_processes = max_processes
+        self.running = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_processes)
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+
+
+class ShellcheckCache:
+    """
+    LRU cache of shellcheck results keyed by a hash of the command and the
+    shellcheck options. Identical checks running at the same time share one
+    shellcheck process.
+
+    Examples:
+        >>> cache = ShellcheckCache(max_size=1)
+        >>> key = cache.make_key("ls", "bash", [])
+        >>> cache.get(key) is None
+        True
+        >>> cache.set(key, ["issue"])
+        >>> cache.get(key), cache.hits, cache.misses
+        (['issue'], 1, 1)
+    """
+
+    def __init__(self, max_size: int = 256) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._results: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._running: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def make_key(command: str, shell: str, extra_args: List[str]) -> str:
+        options = "\0".join([SHELLCHECK_PATH, shell, *extra_args])
+        return hashlib.sha256(f"{options}\0\0{command}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        results = self._results.get(key)
+        if results is None:
+            self.misses += 1
+            return None
+        self._results.move_to_end(key)
+        self.hits += 1
+        return list(results)
+
+    def set(self, key: str, results: List[str]) -> None:
+        self._results[key] = list(results)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+
+    async def get_or_run(self, key: str, run: Callable[[], Awaitable[List[str]]]) -> List[str]:
+        results = self.get(key)
+        if results is not None:
+            return results
+        while True:
+            running = self._running.get(key)
+            if running is None:
+                break
+            try:
+                return list(await asyncio.shield(running))
+            except asyncio.CancelledError:
+                if not running.cancelled():
+                    raise
+                # The caller running shellcheck was cancelled, not this one:
+                # the first waiter to wake up runs it again, the rest wait.
+        future = self._running[key] = asyncio.get_running_loop().create_future()
+        try:
+            results = await run()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; don't warn about an unretrieved exception.
+            future.exception()
+            raise
+        else:
+            self.set(key, results)
+            future.set_result(results)
+            return list(results)
+        finally:
+            del self._running[key]
+
+
+# Shared by every command run from this agent.
+PROCESSES = SubprocessPool(int(os.environ.get("LOGSPYQ_SHELL_MAX_PROCESSES", "4")))
+SHELLCHECK_CACHE = ShellcheckCache()
+
+
 async def shellcheck_command(
     command: str,
     shell: str = "bash",
@@ -17,21 +134,29 @@ async def shellcheck_command(
 ) -> List[str]:
     """
     Run shellcheck on a given string.
+
+    Results are cached by content, so re-running a command skips linting.
     """
+    extra_args = list(extra_args or [])
+    key = SHELLCHECK_CACHE.make_key(command, shell, extra_args)
+    return await SHELLCHECK_CACHE.get_or_run(key, lambda: _run_shellcheck(command, shell, extra_args))
+
+
+async def _run_shellcheck(command: str, shell: str, extra_args: List[str]) -> List[str]:
     # Setup shellcheck command
     shellcheck_command = [SHELLCHECK_PATH, "-s", shell, "-x", "-"]
-    if extra_args:
-        shellcheck_command.extend(extra_args)
+    shellcheck_command.extend(extra_args)
 
     # Run shellcheck
     logger.debug(f"Running shellcheck command: {shellcheck_command}")
-    process = await asyncio.create_subprocess_exec(
-        *shellcheck_command,
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-    stdout, stderr = await process.communicate(command.encode("utf-8"))
+    async with PROCESSES.slot():
+        process = await asyncio.create_subprocess_exec(
+            *shellcheck_command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        stdout, stderr = await process.communicate(command.encode("utf-8"))
     logger.debug(f"Shellcheck stdout: {stdout}")
     logger.debug(f"Shellcheck stderr: {stderr}")
 
@@ -46,33 +171,166 @@ async def shellcheck_command(
     return shellcheck_results
 
 
-async def execute_command_async(command: str, timeout: float = 10) -> Box:
+class OutputBuffer:
     """
-    Execute a command asynchronously.
+    Keeps the start of a command's output, up to `max_bytes` and
+    `max_lines`, and only counts the rest, so memory stays bounded however
+    much the command prints.
+
+    Examples:
+        >>> buffer = OutputBuffer(max_bytes=100, max_lines=2)
+        >>> buffer.write(b"one\\ntwo\\nthree\\nfour\\n")
+        >>> print(buffer.text)
+        one
+        two
+        [... output truncated: 11 more bytes, 2 more lines]
+    """
+
+    def __init__(self, max_bytes: int = 100_000, max_lines: int = 2000) -> None:
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+        self.size = 0
+        self.lines = 0
+        self.dropped_bytes = 0
+        self.dropped_lines = 0
+        self.truncated = False
+        self._parts: List[str] = []
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+
+    def write(self, data: bytes) -> None:
+        if self.truncated:
+            self._drop(data)
+            return
+        keep = data[: self.max_bytes - self.size]
+        newline = -1
+        for _ in range(self.max_lines - self.lines):
+            newline = keep.find(b"\n", newline + 1)
+            if newline == -1:
+                break
+        else:
+            # The line cap is reached within this chunk.
+            keep = keep[: newline + 1]
+        self.size += len(keep)
+        self.lines += keep.count(b"\n")
+        self._parts.append(self._decoder.decode(keep))
+        if len(keep) < len(data):
+            self.truncated = True
+            self._parts.append(self._decoder.decode(b"", final=True))
+            self._drop(data[len(keep) :])
+
+    def _drop(self, data: bytes) -> None:
+        self.dropped_bytes += len(data)
+        self.dropped_lines += data.count(b"\n")
+
+    @property
+    def text(self) -> str:
+        text = fix_text("".join(self._parts)).strip()
+        if self.truncated:
+            text += (
+                f"\n[... output truncated: {self.dropped_bytes} more bytes, "
+                f"{self.dropped_lines} more lines]"
+            )
+        return text
+
+
+async def execute_command_async(
+    command: str,
+    timeout: float = 10,
+    on_output: Optional[Callable[[Box], Awaitable[None]]] = None,
+    update_interval: float = 1.0,
+    max_bytes: int = 100_000,
+    max_lines: int = 2000,
+) -> Box:
     """
+    Execute a command asynchronously, reading its output as it arrives.
+
+    Each of stdout and stderr keeps at most `max_bytes` and `max_lines`;
+    the rest is counted and replaced by a truncation marker.
+
+    Args:
+        on_output: Awaited with the partial result (see below) at most once
+            per `update_interval` seconds while output arrives.
+
+    Returns:
+        Box with stdout, stderr, returncode, timeout and truncated.
+    """
+    async with PROCESSES.slot():
+        return await _execute_command(command, timeout, on_output, update_interval, max_bytes, max_lines)
+
+
+async def _execute_command(command, timeout, on_output, update_interval, max_bytes, max_lines) -> Box:
     command = command.split(" ")  # type: ignore
 
     logger.debug(f"Running command: {command}")
     process = await asyncio.create_subprocess_exec(
         *command,
-        stdin=subprocess.PIPE,
+        stdin=subprocess.DEVNULL,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
     )
-    result = Box()
+    stdout = OutputBuffer(max_bytes, max_lines)
+    stderr = OutputBuffer(max_bytes, max_lines)
+    changed = asyncio.Event()
+    finished = asyncio.Event()
+
+    def snapshot(**extra) -> Box:
+        return Box(
+            stdout=stdout.text,
+            stderr=stderr.text,
+            truncated=stdout.truncated or stderr.truncated,
+            **extra,
+        )
+
+    async def pump(stream, buffer):
+        while True:
+            data = await stream.read(65536)
+            if not data:
+                return
+            buffer.write(data)
+            changed.set()
+
+    async def publish():
+        while True:
+            await changed.wait()
+            if finished.is_set():
+                return
+            changed.clear()
+            try:
+                await on_output(snapshot(returncode=None, timeout=False))
+            except Exception:
+                logger.exception("Error publishing command output")
+            try:
+                await asyncio.wait_for(finished.wait(), update_interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+    def run():
+        return asyncio.gather(pump(process.stdout, stdout), pump(process.stderr, stderr), process.wait())
+
+    publisher = asyncio.ensure_future(publish()) if on_output is not None else None
+    timed_out = False
     try:
-        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
-        result.timeout = False
+        await asyncio.wait_for(run(), timeout)
     except asyncio.TimeoutError:
         logger.debug(f"Command timed out: {command}")
+        timed_out = True
         process.kill()
-        stdout, stderr = await process.communicate()
-        result.timeout = True
-    logger.debug(f"Command stdout: {stdout}")
-    logger.debug(f"Command stderr: {stderr}")
-
-    # Parse output
-    result.stdout = fix_text(stdout.decode("utf-8", errors="ignore").strip())
-    result.stderr = fix_text(stderr.decode("utf-8", errors="ignore").strip())
-    result.returncode = process.returncode
+        # The process only counts as exited once its pipes are drained.
+        await run()
+    finally:
+        if process.returncode is None:
+            # The handler was cancelled: do not leave the command running.
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+        # Let an update in progress finish, so the caller knows its block.
+        finished.set()
+        changed.set()
+        if publisher is not None:
+            await publisher
+    result = snapshot(returncode=process.returncode, timeout=timed_out)
+    logger.debug(f"Command stdout: {result.stdout}")
+    logger.debug(f"Command stderr: {result.stderr}")
     return result
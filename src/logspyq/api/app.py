@@ -2,41 +2,44 @@ from re import A
 from box import Box
 from typing import Optional, List
 from logspyq.api.proxy import LogseqProxy
+from .executor import call_handler, check_executor
 from .utils import mkbox
 
 
 class App(LogseqProxy):
-    def onBlockRendererSlotted(self):
+    def onBlockRendererSlotted(self, executor: Optional[str] = None):
         def decorator(func):
+            check_executor(func, executor)
             event_name = f"block-render-slotted"
 
             async def _async_inner(*args):
-                args = [mkbox(a) for a in args]
-                return await func(*args)
+                args = [self.wrap(a) for a in args]
+                return await call_handler(func, args, executor)
 
             self.register_callback(
                 "onBlockRendererSlotted",
                 event_name=event_name,
                 func=_async_inner,
             )
-            return _async_inner
+            return func if executor == "process" else _async_inner
 
         return decorator
 
-    def onCurrentGraphChanged(self):
+    def onCurrentGraphChanged(self, executor: Optional[str] = None):
         def decorator(func):
+            check_executor(func, executor)
             event_name = f"current-graph-changed"
 
             async def _async_inner(*args):
-                args = [mkbox(a) for a in args]
-                return await func(*args)
+                args = [self.wrap(a) for a in args]
+                return await call_handler(func, args, executor)
 
             self.register_callback(
                 "onCurrentGraphChanged",
                 event_name=event_name,
                 func=_async_inner,
             )
-            return _async_inner
+            return func if executor == "process" else _async_inner
 
         return decorator
 
@@ -45,7 +48,7 @@ class App(LogseqProxy):
     #         event_name = f"macro-render-slotted"
 
     #         async def _async_inner(*args):
-    #             args = [mkbox(a) for a in args]
+    #             args = [self.wrap(a) for a in args]
     #             return await func(*args)
 
     #         self.register_callback(
@@ -57,71 +60,101 @@ class App(LogseqProxy):
 
     #     return decorator
 
-    def onPageHeadActionsSlotted(self):
+    def onPageHeadActionsSlotted(self, executor: Optional[str] = None):
         def decorator(func):
+            check_executor(func, executor)
             event_name = f"page-head-actions-slotted"
 
             async def _async_inner(*args):
-                args = [mkbox(a) for a in args]
-                return await func(*args)
+                args = [self.wrap(a) for a in args]
+                return await call_handler(func, args, executor)
 
             self.register_callback(
                 "onPageHeadActionsSlotted",
                 event_name=event_name,
                 func=_async_inner,
             )
-            return _async_inner
+            return func if executor == "process" else _async_inner
 
         return decorator
 
-    def onRouteChanged(self):
+    def onRouteChanged(
+        self,
+        debounce: Optional[float] = None,
+        throttle: Optional[float] = None,
+        coalesce: Optional[str] = None,
+        executor: Optional[str] = None,
+    ):
+        """
+        See EventGate for debounce, throttle and coalesce. executor="thread"
+        or "process" runs the handler in a shared pool (see logspyq.api.executor).
+        """
         def decorator(func):
+            check_executor(func, executor)
             event_name = f"route-changed"
 
             async def _async_inner(*args):
-                args = [mkbox(a) for a in args]
-                return await func(*args)
+                args = [self.wrap(a) for a in args]
+                return await call_handler(func, args, executor)
 
             self.register_callback(
                 "onRouteChanged",
                 event_name=event_name,
                 func=_async_inner,
+                debounce=debounce,
+                throttle=throttle,
+                coalesce=coalesce,
             )
-            return _async_inner
+            return func if executor == "process" else _async_inner
 
         return decorator
 
-    def onSidebarVisibleChanged(self):
+    def onSidebarVisibleChanged(
+        self,
+        debounce: Optional[float] = None,
+        throttle: Optional[float] = None,
+        coalesce: Optional[str] = None,
+        executor: Optional[str] = None,
+    ):
+        """
+        See EventGate for debounce, throttle and coalesce. executor="thread"
+        or "process" runs the handler in a shared pool (see logspyq.api.executor).
+        """
         def decorator(func):
+            check_executor(func, executor)
             event_name = f"sidebar-visible-changed"
 
             async def _async_inner(*args):
-                args = [mkbox(a) for a in args]
-                return await func(*args)
+                args = [self.wrap(a) for a in args]
+                return await call_handler(func, args, executor)
 
             self.register_callback(
                 "onSidebarVisibleChanged",
                 event_name=event_name,
                 func=_async_inner,
+                debounce=debounce,
+                throttle=throttle,
+                coalesce=coalesce,
             )
-            return _async_inner
+            return func if executor == "process" else _async_inner
 
         return decorator
 
-    def onThemeModeChanged(self):
+    def onThemeModeChanged(self, executor: Optional[str] = None):
         def decorator(func):
+            check_executor(func, executor)
             event_name = f"theme-mode-changed"
 
             async def _async_inner(*args):
-                args = [mkbox(a) for a in args]
-                return await func(*args)
+                args = [self.wrap(a) for a in args]
+                return await call_handler(func, args, executor)
 
             self.register_callback(
                 "onThemeModeChanged",
                 event_name=event_name,
                 func=_async_inner,
             )
-            return _async_inner
+            return func if executor == "process" else _async_inner
 
         return decorator
 
@@ -134,8 +167,10 @@ class App(LogseqProxy):
         keybinding: Optional[dict] = None,
         label: Optional[str] = None,
         palette: bool = False,
+        executor: Optional[str] = None,
     ):
         def decorator(func):
+            check_executor(func, executor)
             event_name = f"command-{key}"
             # Gather all opts
             opts = {
@@ -147,8 +182,8 @@ class App(LogseqProxy):
             }
 
             async def _async_inner(*args):
-                args = [mkbox(a) for a in args]
-                return await func(*args)
+                args = [self.wrap(a) for a in args]
+                return await call_handler(func, args, executor)
 
             self.register_callback(
                 "registerCommand",
@@ -157,20 +192,25 @@ class App(LogseqProxy):
                 opts=opts,
                 func=_async_inner,
             )
-            return _async_inner
+            return func if executor == "process" else _async_inner
 
         return decorator
 
-    def registerCommandPalette(self, key: str, binding: str, label: str, mac: Optional[str]=None, mode: Optional[str]=None):
-        """registerCommandPalette(opts: { key: string; keybinding?: SimpleCommandKeybinding; label: string }, action: SimpleCommandCallback): void"""
+    def registerCommandPalette(self, key: str, binding: str, label: str, mac: Optional[str]=None, mode: Optional[str]=None, executor: Optional[str]=None):
+        """registerCommandPalette(opts: { key: string; keybinding?: SimpleCommandKeybinding; label: string }, action: SimpleCommandCallback): void
+
+        The handler may be a coroutine or a plain function; executor="thread"
+        or "process" runs it in a shared pool (see logspyq.api.executor).
+        """
         def decorator(func):
+            check_executor(func, executor)
             event_name = f"command-{key}"
             keybinding = {"mac": mac, "mode": mode, "binding": binding}
 
 
             async def _async_inner(*args):
-                args = [mkbox(a) for a in args]
-                return await func(*args)
+                args = [self.wrap(a) for a in args]
+                return await call_handler(func, args, executor)
 
             self.register_callback(
                 "registerCommand",
@@ -180,17 +220,18 @@ class App(LogseqProxy):
                 label=label,
                 func=_async_inner,
             )
-            return _async_inner
+            return func if executor == "process" else _async_inner
 
         return decorator
         
-    def registerCommandShortcut(self, keybinding: dict):
+    def registerCommandShortcut(self, keybinding: dict, executor: Optional[str] = None):
         """registerCommandShortcut(keybinding: SimpleCommandKeybinding, action: SimpleCommandCallback): void"""
         def decorator(func):
+            check_executor(func, executor)
             event_name = f"command-{keybinding['binding']}"
             async def _async_inner(*args):
-                args = [mkbox(a) for a in args]
-                return await func(*args)
+                args = [self.wrap(a) for a in args]
+                return await call_handler(func, args, executor)
 
             self.register_callback(
                 "registerCommandShortcut",
@@ -198,17 +239,18 @@ class App(LogseqProxy):
                 keybinding=keybinding,
                 func=_async_inner,
             )
-            return _async_inner
+            return func if executor == "process" else _async_inner
 
         return decorator
     
-    def registerPageMenuItem(self, tag: str):
+    def registerPageMenuItem(self, tag: str, executor: Optional[str] = None):
         """registerPageMenuItem(tag: string, action: (e: IHookEvent & { page: string }) => void): void"""
         def decorator(func):
+            check_executor(func, executor)
             event_name = f"page-menu-item-{tag}"
             async def _async_inner(*args):
-                args = [mkbox(a) for a in args]
-                return await func(*args)
+                args = [self.wrap(a) for a in args]
+                return await call_handler(func, args, executor)
 
             self.register_callback(
                 "registerPageMenuItem",
@@ -216,17 +258,18 @@ class App(LogseqProxy):
                 tag=tag,
                 func=_async_inner,
             )
-            return _async_inner
+            return func if executor == "process" else _async_inner
 
         return decorator
 
-    def registerUIItem(self, type: str, key: str, template: str):
+    def registerUIItem(self, type: str, key: str, template: str, executor: Optional[str] = None):
         """registerUIItem(type: string, key: string, template: string): void"""
         def decorator(func):
+            check_executor(func, executor)
             event_name = f"ui-item-{key}"
             async def _async_inner(*args):
-                args = [mkbox(a) for a in args]
-                return await func(*args)
+                args = [self.wrap(a) for a in args]
+                return await call_handler(func, args, executor)
 
             self.register_callback(
                 "registerUIItem",
@@ -235,7 +278,7 @@ class App(LogseqProxy):
                 opts={"key": key, "template": template},
                 func=_async_inner,
             )
-            return _async_inner
+            return func if executor == "process" else _async_inner
 
         return decorator
 
@@ -0,0 +1,93 @@
+"""
+Block specs for bulk inserts with Editor.insertBlocks.
+
+A spec is either a string (the block content) or a mapping with
+"content" and optional "properties" and "children" (a list of specs).
+Logseq calls the normalized form an IBatchBlock.
+"""
+import json
+from collections.abc import Mapping
+from typing import List, Sequence
+
+from .utils import unwrap
+
+# One insertBatchBlock call carries at most this many blocks / JSON bytes.
+MAX_BATCH_BLOCKS = 200
+MAX_BATCH_BYTES = 256 * 1024
+
+
+def block_spec(spec) -> dict:
+    """
+    Normalize a spec into Logseq's IBatchBlock shape.
+
+    Examples:
+        >>> block_spec("Hello")
+        {'content': 'Hello'}
+        >>> block_spec({"content": "Parent", "properties": {"a": 1}, "children": ["Child"]})
+        {'content': 'Parent', 'properties': {'a': 1}, 'children': [{'content': 'Child'}]}
+    """
+    if isinstance(spec, str):
+        return {"content": spec}
+    if not isinstance(spec, Mapping) or "content" not in spec:
+        raise ValueError(f"A block spec is a string or a mapping with 'content', got {spec!r}")
+    block = {"content": str(spec["content"])}
+    if spec.get("properties"):
+        block["properties"] = unwrap(spec["properties"])
+    if spec.get("children"):
+        block["children"] = [block_spec(child) for child in spec["children"]]
+    return block
+
+
+def count_blocks(block: dict) -> int:
+    return 1 + sum(count_blocks(child) for child in block.get("children", ()))
+
+
+def chunk_blocks(
+    blocks: Sequence[dict], max_blocks: int = MAX_BATCH_BLOCKS, max_bytes: int = MAX_BATCH_BYTES
+) -> List[List[dict]]:
+    """
+    Split top-level blocks into chunks within both limits. A subtree is
+    never split; one larger than the limits gets a chunk of its own.
+
+    Examples:
+        >>> [len(chunk) for chunk in chunk_blocks([{"content": str(i)} for i in range(5)], max_blocks=2)]
+        [2, 2, 1]
+    """
+    chunks: List[List[dict]] = []
+    chunk: List[dict] = []
+    total_blocks, total_bytes = 0, 0
+    for block in blocks:
+        size = count_blocks(block)
+        nbytes = len(json.dumps(block, separators=(",", ":"), default=str))
+        if chunk and (total_blocks + size > max_blocks or total_bytes + nbytes > max_bytes):
+            chunks.append(chunk)
+            chunk, total_blocks, total_bytes = [], 0, 0
+        chunk.append(block)
+        total_blocks += size
+        total_bytes += nbytes
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def inserted_uuids(chunk: Sequence[dict], reply) -> List[str]:
+    """
+    Uuids of the blocks created for `chunk`, in the order of the specs
+    (depth first). insertBatchBlock replies with every created block in
+    that order; a reply with one entry per top-level block is accepted too.
+    """
+    uuids = [entity["uuid"] for entity in (reply or ()) if entity and "uuid" in entity]
+    expected = sum(count_blocks(block) for block in chunk)
+    if len(uuids) not in (expected, len(chunk)):
+        raise ValueError(f"insertBatchBlock created {len(uuids)} blocks, expected {expected}")
+    return uuids
+
+
+def last_top_level_uuid(chunk: Sequence[dict], uuids: Sequence[str]) -> str:
+    """
+    Uuid of the last top-level block of a chunk, to anchor the next chunk.
+    """
+    if len(uuids) == len(chunk):
+        return uuids[-1]
+    return uuids[len(uuids) - count_blocks(chunk[-1])]
+
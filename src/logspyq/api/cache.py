@@ -0,0 +1,102 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, Tuple
+
+# Tags used to group cached responses for invalidation.
+TAG_PAGES = "pages"
+TAG_TREES = "trees"
+TAG_QUERIES = "queries"
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache with TTL for read-only proxy calls.
+
+    Entries are keyed by proxy method plus arguments and carry a set of tags
+    (block uuids, or one of the TAG_* groups) so change events can drop only
+    what they affect. Cached values are shared between callers; treat them
+    as read-only.
+
+    Examples:
+        >>> cache = ResponseCache(max_size=2, ttl=60)
+        >>> key = cache.make_key("Editor.getBlock", ("abc",), {})
+        >>> cache.get(key)
+        (False, None)
+        >>> cache.set(key, {"uuid": "abc"}, tags=("abc",))
+        >>> cache.get(key)
+        (True, {'uuid': 'abc'})
+        >>> cache.invalidate(["abc"])
+        1
+        >>> cache.stats()["hits"], cache.stats()["misses"]
+        (1, 1)
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 30.0) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, frozenset]]" = OrderedDict()
+        # Bumped on every invalidation so in-flight misses don't store stale data.
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(method: str, args: tuple, kwargs: dict) -> Hashable:
+        return (method, json.dumps([args, kwargs], sort_keys=True, default=str))
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        expires, value, _tags = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            self.evictions += 1
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = ()) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value, frozenset(tags))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        """
+        Drop every entry carrying any of the given tags.
+        """
+        tags = set(tags)
+        stale = [key for key, (_e, _v, entry_tags) in self._entries.items() if entry_tags & tags]
+        for key in stale:
+            del self._entries[key]
+        self.generation += 1
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self.generation += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -2,63 +2,85 @@ from re import A
 from box import Box
 from typing import Optional, List
 from logspyq.api.proxy import LogseqProxy
+from .cache import TAG_QUERIES
+from .executor import call_handler, check_executor
 from .utils import mkbox
 
 class DB(LogseqProxy):
     async def datascriptQuery(self, query: str, inputs: List[str] = None):  # type: ignore
-        return await self.request("datascriptQuery", query=query, inputs=inputs)
+        return await self.cached_request(
+            "datascriptQuery", query=query, inputs=inputs, tags=(TAG_QUERIES,)
+        )
 
     async def q(self, dsl: str):
         return await self.request("q", dsl)
     
-    def onBlockRendererSlotted(self):
+    def onBlockRendererSlotted(self, executor: Optional[str] = None):
         def decorator(func):
+            check_executor(func, executor)
             event_name = f"block-render-slotted"
 
             async def _async_inner(*args):
-                args = [mkbox(a) for a in args]
-                return await func(*args)
+                args = [self.wrap(a) for a in args]
+                return await call_handler(func, args, executor)
 
             self.register_callback(
                 "onBlockRendererSlotted",
                 event_name=event_name,
                 func=_async_inner,
             )
-            return _async_inner
+            return func if executor == "process" else _async_inner
 
         return decorator
     
-    def onChanged(self):
+    def onChanged(
+        self,
+        debounce: Optional[float] = None,
+        throttle: Optional[float] = None,
+        coalesce: Optional[str] = None,
+        executor: Optional[str] = None,
+    ):
+        """
+        See EventGate for debounce, throttle and coalesce. executor="thread"
+        or "process" runs the handler in a shared pool (see logspyq.api.executor).
+        """
         def decorator(func):
+            check_executor(func, executor)
             event_name = f"changed"
 
             async def _async_inner(*args):
-                args = [mkbox(a) for a in args]
-                return await func(*args)
+                args = [self.wrap(a) for a in args]
+                return await call_handler(func, args, executor)
 
             self.register_callback(
                 "onChanged",
                 event_name=event_name,
                 func=_async_inner,
+                debounce=debounce,
+                throttle=throttle,
+                coalesce=coalesce,
             )
-            return _async_inner
+            return func if executor == "process" else _async_inner
 
         return decorator
     
-    def onBlockChanged(self, uuid: str):
+    def onBlockChanged(self, uuid: str, executor: Optional[str] = None):
         def decorator(func):
+            check_executor(func, executor)
             event_name = f"block-changed-{uuid}"
 
             async def _async_inner(*args):
-                args = [mkbox(a) for a in args]
-                return await func(*args)
+                self.invalidate_cache(uuid)
+                args = [self.wrap(a) for a in args]
+                return await call_handler(func, args, executor)
 
             self.register_callback(
                 "onBlockChanged",
                 event_name=event_name,
+                uuid=uuid,
                 func=_async_inner,
             )
-            return _async_inner
+            return func if executor == "process" else _async_inner
 
         return decorator
     
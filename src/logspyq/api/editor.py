@@ -2,16 +2,81 @@ from datetime import datetime
 from box import Box
 from typing import Optional, List
 from logspyq.api.proxy import LogseqProxy
+from .blocks import MAX_BATCH_BLOCKS, MAX_BATCH_BYTES, block_spec, chunk_blocks, inserted_uuids, last_top_level_uuid
+from .cache import TAG_PAGES, TAG_QUERIES, TAG_TREES
+from .executor import call_handler, check_executor
 from .utils import mkbox
+from .writes import WriteBehindQueue
 
 class Editor(LogseqProxy):
-    def registerSlashCommand(self, command: str):
+    def __init__(self, logseq, name: str) -> None:
+        super().__init__(logseq, name)
+        self.write_behind: Optional[WriteBehindQueue] = None
+
+    def enable_write_behind(self, interval: Optional[float] = 0.25) -> WriteBehindQueue:
+        """
+        Hold back updateBlock, upsertBlockProperty and removeBlockProperty
+        and send them coalesced per block, `interval` seconds after the
+        first pending write (None: only on `flush()`).
+
+        Reads may see the old content until the writes are flushed, and
+        updateBlock goes out before pending property writes to the same
+        block (see logspyq.api.writes).
+        """
+        self.write_behind = WriteBehindQueue(self._send_write, batch=self.batch, interval=interval)
+        return self.write_behind
+
+    async def _send_write(self, method: str, uuid: str, *args):
+        await self.emit(method, uuid, *args)
+        await self._wrote(uuid)
+
+    async def flush(self) -> int:
+        """
+        Send pending write-behind mutations now; returns how many were sent.
+        """
+        if self.write_behind is None:
+            return 0
+        return await self._on_loop(self.write_behind.flush())
+
+    async def _on_loop(self, coro):
+        # The write-behind queue is not thread-safe; use it from the server loop.
+        on_loop = getattr(self.logseq, "on_loop", None)
+        return await (on_loop(coro) if on_loop is not None else coro)
+
+    async def _queue_write(self, record, *args):
+        async def queue():
+            record(*args)
+
+        await self._on_loop(queue())
+
+    async def _wrote(self, *targets):
+        """
+        Drop cached reads that a write to `targets` (block uuids or page
+        names) may have changed, without waiting for DB.onChanged.
+        """
+        if getattr(self.logseq, "cache", None) is None:
+            return
+
+        async def invalidate():
+            self.invalidate_cache(*targets, TAG_PAGES, TAG_TREES, TAG_QUERIES)
+
+        await self._on_loop(invalidate())
+
+    def registerSlashCommand(self, command: str, executor: Optional[str] = None):
+        """
+        Register a slash command.
+
+        The handler may be a coroutine or a plain function. executor="thread"
+        or "process" runs it in a shared pool instead of on the event loop
+        (see logspyq.api.executor).
+        """
         def decorator(func):
+            check_executor(func, executor)
             event_name = f"slash-command-{command.replace('/', '')}"
 
             async def _async_inner(*args):
-                args = [mkbox(a) for a in args]
-                return await func(*args)
+                args = [self.wrap(a) for a in args]
+                return await call_handler(func, args, executor)
 
             self.register_callback(
                 "registerSlashCommand",
@@ -19,15 +84,17 @@ class Editor(LogseqProxy):
                 command=command,
                 func=_async_inner,
             )
-            return _async_inner
+            # Process pools pickle functions by name; keep the module attribute intact.
+            return func if executor == "process" else _async_inner
 
         return decorator
 
-    def registerBlockContextMenuItem(self, tag: str):
+    def registerBlockContextMenuItem(self, tag: str, executor: Optional[str] = None):
         def decorator(func):
+            check_executor(func, executor)
             async def _async_inner(*args):
-                args = [mkbox(a) for a in args]
-                return await func(*args)
+                args = [self.wrap(a) for a in args]
+                return await call_handler(func, args, executor)
 
             self.register_callback(
                 "registerBlockContextMenuItem",
@@ -35,25 +102,43 @@ class Editor(LogseqProxy):
                 tag=tag,
                 func=_async_inner,
             )
-            return _async_inner
+            return func if executor == "process" else _async_inner
 
         return decorator
 
-    def onInputSelectionEnd(self):
+    def onInputSelectionEnd(
+        self,
+        debounce: Optional[float] = None,
+        throttle: Optional[float] = None,
+        coalesce: Optional[str] = None,
+        executor: Optional[str] = None,
+    ):
+        """
+        See EventGate for debounce, throttle and coalesce. executor="thread"
+        or "process" runs the handler in a shared pool (see logspyq.api.executor).
+        """
         def decorator(func):
+            check_executor(func, executor)
             async def _async_inner(*args):
-                args = [mkbox(a) for a in args]
-                return await func(*args)
+                args = [self.wrap(a) for a in args]
+                return await call_handler(func, args, executor)
 
             self.register_callback(
-                "onInputSelectionEnd", event_name="input-selection-end", func=_async_inner
+                "onInputSelectionEnd",
+                event_name="input-selection-end",
+                func=_async_inner,
+                debounce=debounce,
+                throttle=throttle,
+                coalesce=coalesce,
             )
-            return _async_inner
+            return func if executor == "process" else _async_inner
 
         return decorator
 
     async def appendBlockInPage(self, page: str, content: str, **opts):
-        return await self.request("appendBlockInPage", page, content, **opts)
+        block = await self.request("appendBlockInPage", page, content, **opts)
+        await self._wrote(page)
+        return block
 
     async def checkEditing(self) -> bool:
         return await self.request("checkEditing")
@@ -86,10 +171,13 @@ class Editor(LogseqProxy):
             "journal": journal,
             "redirect": redirect,
         }
-        return await self.request("createPage", pageName, properties, **opts)
+        page = await self.request("createPage", pageName, properties, **opts)
+        await self._wrote(pageName)
+        return page
 
     async def deletePage(self, page: str):
         await self.emit("deletePage", page)
+        await self._wrote(page)
 
     async def editBlock(self, srcBlock: str, pos: Optional[int] = None):
         """
@@ -107,15 +195,28 @@ class Editor(LogseqProxy):
 
     async def getAllPages(self, repo: Optional[str] = None) -> List[Box]:
         if repo:
-            return await self.request("getAllPages", {"repo": repo})
+            return await self.cached_request("getAllPages", {"repo": repo}, tags=(TAG_PAGES,))
         else:
-            return await self.request("getAllPages")
+            return await self.cached_request("getAllPages", tags=(TAG_PAGES,))
     
+    def iterAllPages(self, chunk_size: int = 100):
+        """
+        Stream all pages in chunks of `chunk_size`.
+
+        Usage:
+            async for page in logseq.Editor.iterAllPages(chunk_size=200):
+                ...
+        """
+        return self.stream("getAllPages", chunk_size=chunk_size)
+
     async def getBlock(self, srcBlock: str, includeChildren: bool = False) -> Box:
         """
         getBlock(srcBlock: number | BlockIdentity, opts?: Partial<{ includeChildren: boolean }>)
         """
-        return await self.request("getBlock", srcBlock, {"includeChildren": includeChildren})
+        tags = (srcBlock, TAG_TREES) if includeChildren else (srcBlock,)
+        return await self.cached_request(
+            "getBlock", srcBlock, {"includeChildren": includeChildren}, tags=tags
+        )
 
     async def getBlockProperties(self, block: str) -> Box:
         return await self.request("getBlockProperties", block)
@@ -142,11 +243,22 @@ class Editor(LogseqProxy):
         return await self.request("getNextSiblingBlock", srcBlock)
     
     async def getPage(self, srcPage: str, includeChildren: bool = False) -> Box:
-        return await self.request("getPage", srcPage, {"includeChildren": includeChildren})
+        return await self.cached_request(
+            "getPage", srcPage, {"includeChildren": includeChildren}, tags=(TAG_PAGES,)
+        )
 
     async def getPageBlocksTree(self, page: str) -> Box:
-        return await self.request("getPageBlocksTree", page)
+        return await self.cached_request("getPageBlocksTree", page, tags=(TAG_TREES,))
     
+    def iterPageBlocksTree(self, page: str, chunk_size: int = 100):
+        """
+        Stream the blocks of a page in outline (pre-)order, in chunks.
+
+        Blocks are flat: `children` is removed and nesting is given by
+        `parent`/`left` and `level`.
+        """
+        return self.stream("getPageBlocksTree", page, chunk_size=chunk_size)
+
     async def getPageLinkedReferences(self, page: str) -> Box:
         return await self.request("getPageLinkedReferences", page)
 
@@ -171,7 +283,50 @@ class Editor(LogseqProxy):
             opts.update({"before": before})
         if sibling:
             opts.update({"sibling": sibling})
-        return await self.request("insertBatchBlock", srcBlock, batch, opts)
+        reply = await self.request("insertBatchBlock", srcBlock, batch, opts)
+        await self._wrote(srcBlock)
+        return reply
+
+    async def insertBlocks(
+        self,
+        srcBlock: str,
+        blocks: list,
+        sibling: bool = False,
+        before: bool = False,
+        max_batch_blocks: int = MAX_BATCH_BLOCKS,
+        max_batch_bytes: int = MAX_BATCH_BYTES,
+    ) -> List[str]:
+        """
+        Insert many blocks, with properties and nested children, in as few
+        insertBatchBlock calls as the size limits allow.
+
+        Args:
+            srcBlock: Block to insert under (or next to, with sibling=True).
+            blocks: Block specs: strings, or mappings with "content" and
+                optional "properties" and "children".
+            sibling: Insert next to srcBlock instead of as its children.
+            before: Insert before srcBlock.
+            max_batch_blocks: Most blocks per insertBatchBlock call.
+            max_batch_bytes: Most JSON bytes per insertBatchBlock call.
+
+        Returns:
+            Uuids of the created blocks, depth first in the order given.
+
+        Usage:
+            await logseq.Editor.insertBlocks(block.uuid, [
+                {"content": "Result", "properties": {"link": url}, "children": ["Details"]},
+                "Another block",
+            ])
+        """
+        specs = [block_spec(spec) for spec in blocks]
+        uuids: List[str] = []
+        for chunk in chunk_blocks(specs, max_batch_blocks, max_batch_bytes):
+            reply = await self.insertBatchBlock(srcBlock, chunk, before=before, sibling=sibling)
+            created = inserted_uuids(chunk, reply)
+            uuids.extend(created)
+            # Later chunks follow the previous chunk's last top-level block.
+            srcBlock, sibling, before = last_top_level_uuid(chunk, created), True, False
+        return uuids
 
     async def insertBlock(
         self,
@@ -185,7 +340,9 @@ class Editor(LogseqProxy):
         opts["sibling"] = sibling
         opts["isPageBlock"] = isPageBlock
         opts["before"] = before
-        return await self.request("insertBlock", srcBlk, content, **opts)
+        block = await self.request("insertBlock", srcBlk, content, **opts)
+        await self._wrote(srcBlk)
+        return block
 
     async def moveBlock(self, srcBlock: str, targetBlock: str, before: bool = False, children: bool = False):
         opts = {}
@@ -194,21 +351,31 @@ class Editor(LogseqProxy):
         if children:
             opts.update({"children": children})
         await self.emit("moveBlock", srcBlock, targetBlock, opts)
+        await self._wrote(srcBlock, targetBlock)
     
     async def openInRightSidebar(self, uuid: str):
         await self.emit("openInRightSidebar", uuid)
     
     async def prependBlockInPage(self, page: str, content: str, **opts) -> Box:
-        return await self.request("prependBlockInPage", page, content, **opts)
+        block = await self.request("prependBlockInPage", page, content, **opts)
+        await self._wrote(page)
+        return block
     
     async def removeBlock(self, srcBlock: str):
+        if self.write_behind is not None:
+            await self._queue_write(self.write_behind.discard, srcBlock)
         await self.emit("removeBlock", srcBlock)
+        await self._wrote(srcBlock)
     
     async def removeBlockProperty(self, block: str, key: str):
+        if self.write_behind is not None:
+            return await self._queue_write(self.write_behind.remove_property, block, key)
         await self.emit("removeBlockProperty", block, key)
+        await self._wrote(block)
     
     async def renamePage(self, oldName: str, newName: str):
         await self.emit("renamePage", oldName, newName)
+        await self._wrote(oldName, newName)
     
     async def restoreEditingCursor(self):
         await self.emit("restoreEditingCursor")
@@ -225,7 +392,16 @@ class Editor(LogseqProxy):
         await self.emit("setBlockCollapsed", uuid, opts)
     
     async def updateBlock(self, srcBlock: str, content: str, **properties):
+        if self.write_behind is not None:
+            return await self._queue_write(self.write_behind.update_block, srcBlock, content, properties)
         await self.emit("updateBlock", srcBlock, content, {"properties": properties})
+        await self._wrote(srcBlock)
+
+    async def upsertBlockProperty(self, block: str, key: str, value):
+        if self.write_behind is not None:
+            return await self._queue_write(self.write_behind.upsert_property, block, key, value)
+        await self.emit("upsertBlockProperty", block, key, value)
+        await self._wrote(block)
 
     async def appendBlockToJournalInbox(self, inboxName: str, block: Box):
         today = datetime.now().strftime("%Y%m%d")
@@ -0,0 +1,145 @@
+"""
+Debounce, throttle and coalesce high-frequency event handlers.
+"""
+import asyncio
+import logging
+import time
+from itertools import zip_longest
+from typing import Any, Callable, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+COALESCE_MODES = ("latest", "merge")
+
+
+def merge_payloads(old: Any, new: Any) -> Any:
+    """
+    Combine two event payloads: dicts key by key, lists concatenated, any
+    other value replaced. Lists of entities with a uuid keep only the
+    newest copy of each entity.
+
+    Examples:
+        >>> merge_payloads({"blocks": [{"uuid": "a", "v": 1}], "txData": [1]},
+        ...                {"blocks": [{"uuid": "a", "v": 2}, {"uuid": "b"}], "txData": [2]})
+        {'blocks': [{'uuid': 'a', 'v': 2}, {'uuid': 'b'}], 'txData': [1, 2]}
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        merged = dict(old)
+        for key, value in new.items():
+            merged[key] = merge_payloads(merged[key], value) if key in merged else value
+        return merged
+    if isinstance(old, list) and isinstance(new, list):
+        combined = old + new
+        if combined and all(isinstance(item, dict) and "uuid" in item for item in combined):
+            latest = {}
+            for item in combined:
+                latest.pop(item["uuid"], None)
+                latest[item["uuid"]] = item
+            return list(latest.values())
+        return combined
+    return new
+
+
+def coalesce_args(old: Tuple, new: Tuple, mode: str) -> Tuple:
+    if mode == "merge" and len(old) == len(new):
+        return tuple(merge_payloads(o, n) for o, n in zip_longest(old, new))
+    return new
+
+
+class EventGate:
+    """
+    Wrap an event handler so bursts of events cost fewer handler runs.
+
+    - debounce: run once the events have stopped for this many seconds.
+    - throttle: run at most once per this many seconds; the first event runs
+      right away, later ones in the window are folded into one run at its end.
+    - coalesce: how skipped events are folded in. "latest" (default) passes
+      the arguments of the newest event, "merge" combines the payloads (see
+      `merge_payloads`). With coalesce alone, the handler never runs
+      concurrently with itself; events arriving meanwhile are folded into
+      the next run.
+
+    Calls return immediately; handler errors are logged. `on_run`, if set,
+    is called with (seconds, failed) after each run of the handler.
+    """
+
+    def __init__(
+        self,
+        func: Callable,
+        debounce: Optional[float] = None,
+        throttle: Optional[float] = None,
+        coalesce: Optional[str] = None,
+    ) -> None:
+        if debounce is not None and throttle is not None:
+            raise ValueError("Use either debounce or throttle, not both")
+        if coalesce not in (None, *COALESCE_MODES):
+            raise ValueError(f"coalesce must be one of {COALESCE_MODES}, got {coalesce!r}")
+        self._func = func
+        self.debounce = debounce
+        self.throttle = throttle
+        self.coalesce = coalesce or "latest"
+        self.received = 0
+        self.runs = 0
+        self._pending: Optional[Tuple] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Optional[asyncio.Task] = None
+        self._last_run = float("-inf")
+        self.on_run: Optional[Callable[[float, bool], None]] = None
+
+    @classmethod
+    def wrap(cls, func: Callable, debounce=None, throttle=None, coalesce=None) -> Callable:
+        """
+        Gate `func` if any option is set, otherwise return it unchanged.
+        """
+        if debounce is None and throttle is None and coalesce is None:
+            return func
+        return cls(func, debounce=debounce, throttle=throttle, coalesce=coalesce)
+
+    def __repr__(self) -> str:
+        return f"EventGate({getattr(self._func, '__qualname__', self._func)!r})"
+
+    async def __call__(self, *args) -> None:
+        self.received += 1
+        self._pending = args if self._pending is None else coalesce_args(self._pending, args, self.coalesce)
+        if self.debounce is not None:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = asyncio.get_running_loop().call_later(self.debounce, self._fire)
+        elif self._timer is None:
+            self._fire()
+
+    def cancel(self) -> None:
+        """
+        Drop pending events and stop a scheduled run.
+        """
+        self._pending = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _fire(self) -> None:
+        self._timer = None
+        if self._running is not None and not self._running.done():
+            # The current run picks up the pending events when it finishes.
+            return
+        self._running = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._pending is not None and self._timer is None:
+            if self.throttle is not None:
+                wait = self._last_run + self.throttle - loop.time()
+                if wait > 0:
+                    self._timer = loop.call_later(wait, self._fire)
+                    return
+            args, self._pending = self._pending, None
+            self._last_run = loop.time()
+            self.runs += 1
+            start, failed = time.perf_counter(), False
+            try:
+                await self._func(*args)
+            except Exception:
+                failed = True
+                log.exception(f"Error in gated handler {self!r}")
+            if self.on_run is not None:
+                self.on_run(time.perf_counter() - start, failed)
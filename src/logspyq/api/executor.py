@@ -0,0 +1,108 @@
+"""
+Run handler bodies off the event loop, in shared size-bounded pools.
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from .utils import unwrap
+
+EXECUTORS = (None, "thread", "process")
+
+pool_sizes = {
+    "thread": min(32, (os.cpu_count() or 1) + 4),
+    "process": os.cpu_count() or 1,
+}
+_pools: Dict[str, Executor] = {}
+_local = threading.local()
+
+
+def configure_executors(threads: Optional[int] = None, processes: Optional[int] = None) -> None:
+    """
+    Set the maximum number of handler threads and processes.
+
+    Pools are created on first use; call this before handlers run, or the
+    new sizes apply once the current pools have been shut down.
+    """
+    if threads is not None:
+        pool_sizes["thread"] = threads
+    if processes is not None:
+        pool_sizes["process"] = processes
+
+
+def get_pool(kind: str) -> Executor:
+    pool = _pools.get(kind)
+    if pool is None:
+        if kind == "thread":
+            pool = ThreadPoolExecutor(max_workers=pool_sizes["thread"], thread_name_prefix="logspyq-handler")
+        elif kind == "process":
+            # Spawn rather than fork: the parent runs an event loop and threads.
+            pool = ProcessPoolExecutor(
+                max_workers=pool_sizes["process"], mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            raise ValueError(f"Unknown executor: {kind!r}")
+        _pools[kind] = pool
+    return pool
+
+
+def shutdown_executors(wait: bool = False) -> None:
+    for kind in list(_pools):
+        _pools.pop(kind).shutdown(wait=wait)
+
+
+def check_executor(func: Callable, executor: Optional[str]) -> None:
+    """
+    Validate a decorator's `executor=` option for a handler.
+
+    Raises:
+        ValueError: for an unknown executor.
+        TypeError: for a coroutine function with executor="process"; process
+            handlers cannot reach the Logseq API.
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f"executor must be one of {EXECUTORS}, got {executor!r}")
+    if executor == "process" and inspect.iscoroutinefunction(func):
+        raise TypeError(f"{func.__name__}: handlers with executor='process' must be plain functions")
+
+
+async def call_handler(func: Callable, args: Sequence, executor: Optional[str] = None) -> Any:
+    """
+    Call a sync or async handler, on the loop or in an executor pool.
+
+    - None: on the event loop; sync functions are simply called.
+    - "thread": in the thread pool, with a copy of the caller's context
+      variables. Coroutine functions run on a per-thread event loop; their
+      Logseq API calls are sent back to the main loop by LogseqPlugin.
+    - "process": in the process pool. Arguments are converted to plain
+      values so they can be pickled.
+    """
+    if executor is None:
+        result = func(*args)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+    loop = asyncio.get_running_loop()
+    if executor == "process":
+        call = functools.partial(func, *[unwrap(arg) for arg in args])
+    elif inspect.iscoroutinefunction(func):
+        call = functools.partial(_run_coroutine, func, args)
+    else:
+        call = functools.partial(func, *args)
+    if executor == "thread":
+        # Keeps e.g. the priority class of the calls the handler makes.
+        call = functools.partial(contextvars.copy_context().run, call)
+    return await loop.run_in_executor(get_pool(executor), call)
+
+
+def _run_coroutine(func: Callable, args: Sequence) -> Any:
+    loop = getattr(_local, "loop", None)
+    if loop is None:
+        loop = _local.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(func(*args))
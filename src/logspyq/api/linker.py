@@ -0,0 +1,236 @@
+from collections import deque
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+# Common words that are also page names in most graphs.
+DEFAULT_SKIP_NAMES = {
+    "to",
+    "do",
+    "this",
+    "here",
+    "now",
+    "later",
+    "soon",
+    "todo",
+    "doing",
+    "done",
+    "link",
+    "page",
+    "pages",
+}
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def page_names(page) -> List[str]:
+    """
+    Name and aliases of a page entity, as returned by Editor.getAllPages.
+    """
+    names = []
+    if page.get("name"):
+        names.append(page["name"])
+    properties = page.get("properties") or {}
+    for key in ("alias", "aliases"):
+        aliases = properties.get(key) or []
+        if isinstance(aliases, str):
+            aliases = [aliases]
+        names.extend(aliases)
+    return names
+
+
+class PageLinker:
+    """
+    Wrap page names found in text with [[links]] in a single pass.
+
+    Names are matched case-insensitively on word boundaries with an
+    Aho-Corasick automaton, so the cost per message is linear in the text
+    length regardless of how many pages the graph has. Overlapping
+    matches resolve leftmost-longest, and text already inside [[...]] is
+    left alone. Pages can be added, renamed or removed without rebuilding
+    the whole automaton.
+
+    Examples:
+        >>> linker = PageLinker()
+        >>> linker.update_page(1, ["python"])
+        >>> linker.update_page(2, ["python plugin"])
+        >>> linker.link("A Python plugin for python")
+        'A [[python plugin]] for [[python]]'
+    """
+
+    def __init__(self, skip_names: Iterable[str] = DEFAULT_SKIP_NAMES) -> None:
+        self.skip_names = {name.lower() for name in skip_names}
+        self._names_by_page: Dict[Hashable, List[str]] = {}
+        # Reference count per lowercased name; aliases may be shared.
+        self._name_refs: Dict[str, int] = {}
+        # Trie: transitions, terminal name per node, depth per node.
+        self._goto: List[Dict[str, int]] = [{}]
+        self._terminal: List[Optional[str]] = [None]
+        self._depth: List[int] = [0]
+        # Failure and output links, rebuilt lazily after changes.
+        self._fail: List[int] = [0]
+        self._output: List[int] = [-1]
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._name_refs)
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self._name_refs
+
+    # --- Maintenance ---
+
+    def update_page(self, page_id: Hashable, names: Iterable[str]) -> None:
+        """
+        Set the names (name plus aliases) linked for a page; replaces the
+        names previously registered under the same id, so renames work.
+        """
+        names = [name for name in names if self._linkable(name)]
+        for name in self._names_by_page.pop(page_id, []):
+            self._release(name)
+        self._names_by_page[page_id] = names
+        for name in names:
+            self._acquire(name)
+
+    def remove_page(self, page_id: Hashable) -> None:
+        for name in self._names_by_page.pop(page_id, []):
+            self._release(name)
+
+    def update_pages(self, pages: Iterable) -> None:
+        """
+        Register page entities (dicts with id/uuid, name and properties).
+        """
+        for page in pages:
+            self.update_page(page.get("id", page.get("uuid")), page_names(page))
+
+    def _linkable(self, name: str) -> bool:
+        return bool(name) and "[" not in name and "]" not in name and name.lower() not in self.skip_names
+
+    def _acquire(self, name: str) -> None:
+        key = name.lower()
+        self._name_refs[key] = self._name_refs.get(key, 0) + 1
+        if self._name_refs[key] == 1:
+            self._insert(name)
+
+    def _release(self, name: str) -> None:
+        key = name.lower()
+        refs = self._name_refs.get(key, 0) - 1
+        if refs > 0:
+            self._name_refs[key] = refs
+            return
+        self._name_refs.pop(key, None)
+        node = self._walk(name)
+        if node is not None:
+            # Nodes stay in the trie; they just stop producing matches.
+            self._terminal[node] = None
+            self._dirty = True
+
+    def _insert(self, name: str) -> None:
+        node = 0
+        for char in name:
+            char = char.lower()
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._terminal.append(None)
+                self._depth.append(self._depth[node] + 1)
+                self._fail.append(0)
+                self._output.append(-1)
+            node = nxt
+        self._terminal[node] = name
+        self._dirty = True
+
+    def _walk(self, name: str) -> Optional[int]:
+        node = 0
+        for char in name:
+            node = self._goto[node].get(char.lower())
+            if node is None:
+                return None
+        return node
+
+    def _build_links(self) -> None:
+        # Breadth-first so every node's failure target is already final.
+        queue = deque()
+        for nxt in self._goto[0].values():
+            self._fail[nxt] = 0
+            self._output[nxt] = -1
+            queue.append(nxt)
+        while queue:
+            node = queue.popleft()
+            for char, nxt in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                fail_node = self._fail[nxt]
+                self._output[nxt] = fail_node if self._terminal[fail_node] else self._output[fail_node]
+                queue.append(nxt)
+        self._dirty = False
+
+    # --- Matching ---
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        Return non-overlapping (start, end, name) matches, leftmost-longest.
+        """
+        if self._dirty:
+            self._build_links()
+        candidates = []
+        node = 0
+        for end, char in enumerate(text, start=1):
+            char = char.lower()
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            match = node if self._terminal[node] else self._output[node]
+            while match > 0:
+                start = end - self._depth[match]
+                if self._on_boundary(text, start, end):
+                    candidates.append((start, end, self._terminal[match]))
+                match = self._output[match]
+        excluded = self._existing_links(text)
+        candidates.sort(key=lambda m: (m[0], -m[1]))
+        matches, last_end = [], 0
+        for start, end, name in candidates:
+            if start < last_end or any(s < end and start < e for s, e in excluded):
+                continue
+            matches.append((start, end, name))
+            last_end = end
+        return matches
+
+    def link(self, text: str) -> str:
+        """
+        Replace page names in text with [[page name]] links.
+        """
+        parts, position = [], 0
+        for start, end, name in self.find(text):
+            parts.append(text[position:start])
+            parts.append(f"[[{name}]]")
+            position = end
+        parts.append(text[position:])
+        return "".join(parts)
+
+    @staticmethod
+    def _on_boundary(text: str, start: int, end: int) -> bool:
+        # Same rule as regex \b around a name.
+        if _is_word_char(text[start]) and start > 0 and _is_word_char(text[start - 1]):
+            return False
+        if _is_word_char(text[end - 1]) and end < len(text) and _is_word_char(text[end]):
+            return False
+        return True
+
+    @staticmethod
+    def _existing_links(text: str) -> Set[Tuple[int, int]]:
+        spans, position = set(), 0
+        while True:
+            start = text.find("[[", position)
+            if start < 0:
+                return spans
+            end = text.find("]]", start + 2)
+            if end < 0:
+                return spans
+            spans.add((start, end + 2))
+            position = end + 2
@@ -1,12 +1,22 @@
+import asyncio
+import functools
 import logging
 from dataclasses import asdict
 from typing import Optional, Any 
+
+from apscheduler.jobstores.base import JobLookupError
+
 from logspyq.api.app import App
+from logspyq.api.cache import TAG_PAGES, TAG_QUERIES, TAG_TREES, ResponseCache
 from logspyq.api.db import DB
 from logspyq.api.editor import Editor
+from logspyq.api.events import EventGate
+from logspyq.api.executor import call_handler, check_executor
 from logspyq.api.ui import UI
-from logspyq.server.server import PluginServer
 from logspyq.api.settings import schema_as_dict
+from logspyq.api.utils import convert_response
+from logspyq.server.connections import BROADCAST, current_sid, routing
+from logspyq.server.outbound import BACKGROUND, INTERACTIVE, prioritized, scheduling
 
 log = logging.getLogger(__name__)
 
@@ -18,12 +28,18 @@ class LogseqPlugin:
         server=None,
         log_level=logging.INFO,
         log_format="%(asctime)-15s %(levelname)-8s %(message)s",
+        response_mode: Optional[str] = None,
     ) -> None:
         self.name = name
         self.description = description
         self.enabled = False
         self.running = False
+        # Seconds spent importing the agent module, set by discovery.
+        self.import_seconds: Optional[float] = None
         self.settings: Optional[Any] = None
+        self.cache: Optional[ResponseCache] = None
+        # "lazy", "box" or "raw"; None follows the server.
+        self.response_mode = response_mode
         self._register_callbacks = {
             # "Editor.registerSlashCommand", "slash-command-COMMAND-NAME"
         }
@@ -38,6 +54,18 @@ class LogseqPlugin:
         self.log = logging.getLogger(__name__)
         self._schedules = {}
         self._events = {}
+        self._stop_hooks = []
+        # Loop the server runs on; handlers running in executor threads
+        # send their Logseq API calls back to it.
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def mirror(self):
+        """
+        Local, incrementally updated copy of the graph (see GraphMirror).
+        """
+        assert self._server
+        return self._server.mirror
 
     @property
     def settings_as_dict(self):
@@ -49,74 +77,320 @@ class LogseqPlugin:
 
     def _set_server(self, server):
         self._server = server
-        self.emit = self._server.emit
-        self.request = self._server.request
+
+    def on_server_loop(self) -> bool:
+        """
+        Whether the caller runs on the server's event loop (and not in an
+        executor thread).
+        """
+        try:
+            return self._loop is None or asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    async def on_loop(self, coro):
+        """
+        Await a coroutine on the server's event loop, from any thread.
+        """
+        if self.on_server_loop():
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    def call_sync(self, coro, timeout: Optional[float] = None):
+        """
+        Run a Logseq API call from a plain function in an executor thread.
+
+        Usage:
+            @logseq.Editor.registerSlashCommand("Count words", executor="thread")
+            def count_words(sid, event):
+                block = logseq.call_sync(logseq.Editor.getBlock(event.uuid))
+                ...
+        """
+        if self.on_server_loop():
+            coro.close()
+            raise RuntimeError("call_sync() is for handlers running in an executor thread; await instead")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    async def request(self, name: str, *args, **kwargs):
+        assert self._server
+        with scheduling(agent=self.name):
+            return await self.on_loop(
+                self._server.request(name, *args, response_mode=self.response_mode, **kwargs)
+            )
+
+    async def emit(self, name: str, *args, **kwargs):
+        assert self._server
+        with scheduling(agent=self.name):
+            return await self.on_loop(self._server.emit(name, *args, **kwargs))
+
+    def priority(self, priority: str):
+        """
+        Send the Logseq API calls made inside the block with another
+        priority class: "interactive", "background" or "bulk".
+
+        Handlers run as interactive, jobs and ready handlers as background
+        (see logspyq.server.outbound).
+
+        Usage:
+            with logseq.priority("bulk"):
+                pages = await logseq.Editor.getAllPages()
+        """
+        return scheduling(priority, self.name)
+
+    def stream(self, source: str, *args, **kwargs):
+        assert self._server
+        kwargs.setdefault("response_mode", self.response_mode)
+        stream = self._server.stream(source, *args, **kwargs)
+        if self.on_server_loop():
+            return stream
+        return self._stream_from_thread(stream)
+
+    async def _stream_from_thread(self, stream):
+        # Each step of the server's generator runs on the server loop.
+        try:
+            while True:
+                try:
+                    item = await self.on_loop(stream.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            await self.on_loop(stream.aclose())
+
+    def convert_response(self, value):
+        """
+        Convert a raw payload from Logseq according to `response_mode`.
+        """
+        mode = self.response_mode
+        if mode is None:
+            mode = self._server.response_mode if self._server else "box"
+        return convert_response(value, mode)
+
+    def enable_cache(self, max_size: int = 1024, ttl: float = 30.0) -> ResponseCache:
+        """
+        Cache Editor/DB getter responses for this agent.
+
+        Entries are dropped when Logseq reports changes (DB.onChanged),
+        when the current graph changes, and on every (re)connect.
+        """
+        self.cache = ResponseCache(max_size=max_size, ttl=ttl)
+        return self.cache
+
+    async def _register_cache_invalidation(self):
+        assert self._server and self.cache is not None
+        # Changes may have happened while we were disconnected.
+        self.cache.clear()
+        self._server.add_listener("changed", self._invalidate_on_change, key=("cache", self.name))
+        self._server.add_listener(
+            "current-graph-changed", self._invalidate_on_graph_change, key=("cache", self.name)
+        )
+        await self.emit("DB.onChanged", event_name="changed")
+        await self.emit("App.onCurrentGraphChanged", event_name="current-graph-changed")
+
+    async def _invalidate_on_change(self, sid, event=None, *args):
+        if self.cache is None:
+            return
+        blocks = event.get("blocks", []) if isinstance(event, dict) else []
+        uuids = [block["uuid"] for block in blocks if isinstance(block, dict) and "uuid" in block]
+        # Trees, pages and queries may contain any changed block.
+        dropped = self.cache.invalidate([*uuids, TAG_PAGES, TAG_TREES, TAG_QUERIES])
+        log.debug(f"{self.name!r} cache: dropped {dropped} entries on change")
+
+    async def _invalidate_on_graph_change(self, sid, *args):
+        if self.cache is not None:
+            self.cache.clear()
+
+    def batch(self, timeout: float = 10):
+        """
+        Coalesce proxy calls made inside the block into one round trip.
+
+        Usage:
+            async with logseq.batch() as batch:
+                block = batch.add(logseq.Editor.getBlock(uuid))
+                await logseq.Editor.updateBlock(uuid, "Updated")
+            print(block.result())
+        """
+        assert self._server
+        return self._server.batch(timeout=timeout)
 
     async def register_callbacks_with_logseq(self, fire_ready_now=False):
+        """
+        Register hooks with Logseq and install handlers and jobs.
+
+        Safe to call on every (re)connect: handlers and jobs that are
+        already installed are skipped. Returns the SyncReport, or None if
+        the agent is disabled.
+        """
         if self.enabled:
-            await self.App.register_callbacks_with_logseq()
-            await self.DB.register_callbacks_with_logseq()
-            await self.Editor.register_callbacks_with_logseq()
-            await self.UI.register_callbacks_with_logseq()
+            self._loop = asyncio.get_running_loop()
             assert self._server
-            for func, kwargs in self._schedules.items():
-                self._server._scheduler.add_job(func, **kwargs)
-            for func, event in self._events.items():
-                if event == "ready" and not fire_ready_now:
-                    self._server._signal_ready.connect(func)
-                elif event == "ready" and fire_ready_now:
-                    await func()
-                else:
-                    self._server._sio.on(event)(func)
-            log.debug(f"Registered callbacks for {self.name!r}")
+            # Hooks go to the window that became ready, else to all windows.
+            with routing(current_sid.get() or BROADCAST):
+                for proxy in (self.App, self.DB, self.Editor, self.UI):
+                    await proxy.register_callbacks_with_logseq()
+                if self.cache is not None:
+                    await self._register_cache_invalidation()
+            report = self._server.registrations.sync(self.name, self._desired_registrations())
+            if report.skipped:
+                log.info(f"Registered callbacks for {report}")
+            else:
+                log.debug(f"Registered callbacks for {report}")
+            if fire_ready_now:
+                for func, event in self._events.items():
+                    if event == "ready":
+                        await prioritized(func, BACKGROUND, self.name)()
             self.running = True
+            return report
         else:
             log.debug(f"Skipping {self.name!r}")
 
-    def on_cron(self, **kwargs):
+    async def stop(self):
+        """
+        Undo `register_callbacks_with_logseq`: remove this agent's jobs,
+        listeners and ready receivers, drop events held back by debounce or
+        throttle, send queued writes, then await the on_stop hooks.
+
+        Hooks Logseq installed stay in place; their events are ignored
+        until the agent is registered again. Returns the SyncReport of what
+        was removed.
+        """
+        if self._server is None:
+            return None
+        self.running = False
+        report = self._server.registrations.clear(self.name)
+        for gate in self._gates():
+            gate.cancel()
+        if self.cache is not None:
+            self._server.remove_listener("changed", ("cache", self.name))
+            self._server.remove_listener("current-graph-changed", ("cache", self.name))
+            self.cache.clear()
+        if self.Editor.write_behind is not None:
+            try:
+                await self.Editor.flush()
+            except Exception:
+                log.exception(f"Error flushing writes of {self.name!r}")
+        for hook in self._stop_hooks:
+            try:
+                await hook()
+            except Exception:
+                log.exception(f"Error in on_stop hook of {self.name!r}")
+        log.info(f"Stopped {report}")
+        return report
+
+    def _gates(self):
+        funcs = list(self._events)
+        for proxy in (self.App, self.DB, self.Editor, self.UI):
+            funcs.extend(func for _event, func in proxy.callback_listeners())
+        return [func for func in funcs if isinstance(func, EventGate)]
+
+    def _desired_registrations(self):
+        """
+        Everything this agent installs on the server, keyed by
+        (kind, event or trigger, callback), with a function installing it.
+        """
+        desired = {}
+        for proxy in (self.App, self.DB, self.Editor, self.UI):
+            for event, func in proxy.callback_listeners():
+                desired[("listener", event, func)] = functools.partial(self._install_listener, event, func)
+        for func, event in self._events.items():
+            if event == "ready":
+                desired[("ready", event, func)] = functools.partial(self._install_ready, func)
+            else:
+                desired[("listener", event, func)] = functools.partial(self._install_listener, event, func)
+        for func, kwargs in self._schedules.items():
+            desired[("job", kwargs["trigger"], func)] = functools.partial(self._install_job, func, kwargs)
+        return desired
+
+    def _install_listener(self, event, func):
+        key = (self.name, event, func)
+        self._server.add_listener(event, prioritized(func, INTERACTIVE, self.name), key=key)
+        return lambda: self._server.remove_listener(event, key)
+
+    def _install_ready(self, func):
+        signal, uid = self._server._signal_ready, (self.name, func)
+        receiver = prioritized(func, BACKGROUND, self.name)
+        signal.connect(receiver, weak=False, dispatch_uid=uid)
+        return lambda: signal.disconnect(receiver, dispatch_uid=uid)
+
+    def _install_job(self, func, kwargs):
+        job = self._server._scheduler.add_job(prioritized(func, BACKGROUND, self.name), **kwargs)
+
+        def remove():
+            try:
+                job.remove()
+            except JobLookupError:
+                pass
+
+        return remove
+
+    def on_cron(self, executor: Optional[str] = None, **kwargs):
         """
         Run a function on a cron schedule.
+
+        The function may be a coroutine or a plain function; executor="thread"
+        or "process" runs it in a shared pool (see logspyq.api.executor).
         """
 
         def outer(func):
+            check_executor(func, executor)
+
             async def async_inner(*args):
-                return await func(*args)
+                return await call_handler(func, args, executor)
 
             kwargs.update({"trigger": "cron"})
             self._schedules.update({async_inner: kwargs})
-            return async_inner
+            return func if executor == "process" else async_inner
 
         return outer
 
-    def on_interval(self, **kwargs):
+    def on_interval(self, executor: Optional[str] = None, **kwargs):
         """
         Run a function at an interval.
+
+        The function may be a coroutine or a plain function; executor="thread"
+        or "process" runs it in a shared pool (see logspyq.api.executor).
         """
 
         def outer(func):
+            check_executor(func, executor)
+
             async def async_inner(*args):
-                return await func(*args)
+                return await call_handler(func, args, executor)
 
             kwargs.update({"trigger": "interval"})
             self._schedules.update({async_inner: kwargs})
-            return async_inner
+            return func if executor == "process" else async_inner
 
         return outer
 
-    def on(self, event: str):
+    def on(
+        self,
+        event: str,
+        debounce: Optional[float] = None,
+        throttle: Optional[float] = None,
+        coalesce: Optional[str] = None,
+        executor: Optional[str] = None,
+    ):
         """
         Decorator for handling socket.io events.
+
+        debounce/throttle (seconds) and coalesce ("latest" or "merge") limit
+        how often the handler runs during bursts of events (see EventGate).
+        The handler may be a coroutine or a plain function; executor="thread"
+        or "process" runs it in a shared pool (see logspyq.api.executor).
         """
 
         def outer(func):
+            check_executor(func, executor)
+
             async def async_inner(*args):
                 if len(args) == 1 and args[0] == "null":
-                    return await func(None)
-                else:
-                    return await func(*args)
+                    args = (None,)
+                return await call_handler(func, args, executor)
 
-            self._events.update({async_inner: event})
-            return async_inner
+            handler = EventGate.wrap(async_inner, debounce=debounce, throttle=throttle, coalesce=coalesce)
+            self._events.update({handler: event})
+            return func if executor == "process" else async_inner
 
         return outer
 
@@ -134,12 +408,26 @@ class LogseqPlugin:
 
         return outer
 
+    def on_stop(self):
+        """
+        Decorator for a coroutine awaited when the agent is disabled or the
+        server shuts down, e.g. to close connections the agent opened.
+        """
+
+        def outer(func):
+            self._stop_hooks.append(func)
+            return func
+
+        return outer
+
     def run(self, host="localhost", port=0, debug=False):
         # Attach to or start a plugin server
         if self._server:
             log.info("Using provided PluginServer")
             self._set_server(self._server)
         else:
+            from logspyq.server.server import PluginServer
+
             log.warning("No server provided, creating a new one")
             self._set_server(
                 PluginServer(
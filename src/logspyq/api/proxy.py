@@ -1,5 +1,7 @@
 import logging
-from typing import Callable
+from typing import Callable, Optional
+
+from .events import EventGate
 
 log = logging.getLogger(__name__)
 
@@ -10,23 +12,87 @@ class LogseqProxy(object):
         self.logseq = logseq
         self.name = name
 
-    def register_callback(self, method: str, **data):
-        self._register_callbacks[method] = data
+    def register_callback(
+        self,
+        method: str,
+        debounce: Optional[float] = None,
+        throttle: Optional[float] = None,
+        coalesce: Optional[str] = None,
+        **data,
+    ):
+        """
+        Remember a Logseq hook to register once connected.
+
+        debounce, throttle and coalesce rate-limit the handler (see EventGate).
+        """
+        if "func" in data:
+            data["func"] = EventGate.wrap(data["func"], debounce=debounce, throttle=throttle, coalesce=coalesce)
+        # Keyed by event name too: an agent may register several slash commands.
+        self._register_callbacks[(method, data.get("event_name"))] = data
         return method
 
+    def callback_listeners(self):
+        """
+        Yield (event_name, func) for every registered callback.
+        """
+        for (method, event_name), data in self._register_callbacks.items():
+            func = data.get("func")
+            if not (func and event_name):
+                raise Exception(f"Invalid callback: {method} => {data} (func={func}, event_name={event_name})")
+            yield event_name, func
+
     async def register_callbacks_with_logseq(self):
-        for method, data in self._register_callbacks.items():
-            func = data["func"]
-            event_name = data["event_name"]
+        """
+        Ask Logseq to install its hooks. Sent on every (re)connect, since the
+        server cannot tell a reloaded window from a reconnected one; the
+        plugin installs each event_name once per page load. The handlers
+        themselves are installed once by LogseqPlugin.
+        """
+        for (method, _event_name), data in self._register_callbacks.items():
             data_minus_func = {k: v for k, v in data.items() if k != "func"}
-            if func and event_name:
-                self.logseq.on(event_name)(func)
-                await self.emit(method, **data_minus_func)
-            else:
-                raise Exception(f"Invalid callback: {method} => {data} (func={func}, event_name={event_name})")
+            await self.emit(method, **data_minus_func)
 
     async def request(self, method: str, *args, **kwargs):
         return await self.logseq.request(f"{self.name}.{method}", *args, **kwargs)
 
+    def stream(self, method: str, *args, **kwargs):
+        return self.logseq.stream(f"{self.name}.{method}", *args, **kwargs)
+
+    async def cached_request(self, method: str, *args, tags=(), **kwargs):
+        """
+        Like `request()`, but served from the plugin's response cache when
+        caching is enabled (see `LogseqPlugin.enable_cache`).
+        """
+        cache = getattr(self.logseq, "cache", None)
+        if cache is None:
+            return await self.request(method, *args, **kwargs)
+        on_server_loop = getattr(self.logseq, "on_server_loop", None)
+        if on_server_loop is not None and not on_server_loop():
+            # The cache is not thread-safe; use it from the server loop only.
+            return await self.logseq.on_loop(self.cached_request(method, *args, tags=tags, **kwargs))
+        key = cache.make_key(f"{self.name}.{method}", args, kwargs)
+        found, value = cache.get(key)
+        if found:
+            return value
+        generation = cache.generation
+        value = await self.request(method, *args, **kwargs)
+        if cache.generation == generation:
+            cache.set(key, value, tags=tags)
+        return value
+
+    def invalidate_cache(self, *tags):
+        cache = getattr(self.logseq, "cache", None)
+        if cache is not None:
+            cache.invalidate(tags)
+
     async def emit(self, method: str, *args, **kwargs):
         return await self.logseq.emit(f"{self.name}.{method}", *args, **kwargs)
+
+    def wrap(self, value):
+        """
+        Convert an event payload using the plugin's response mode.
+        """
+        return self.logseq.convert_response(value)
+
+    def batch(self, **kwargs):
+        return self.logseq.batch(**kwargs)
@@ -1,5 +1,10 @@
+import re
+from collections.abc import Mapping
+
 from box import Box, BoxList
 
+RESPONSE_MODES = ("lazy", "box", "raw")
+
 
 def mkbox(arg):
     """
@@ -27,3 +32,184 @@ def mkbox(arg):
         return BoxList(arg)
     else:
         return arg
+
+
+def _safe_attr(key) -> str:
+    # Same attribute names Box derives from keys like "journal?" or "original-name".
+    return re.sub(r"\W", "_", str(key)).strip("_")
+
+
+class LazyBox(Mapping):
+    """
+    Attribute-access view over a dict, without copying it.
+
+    Nested dicts and lists are wrapped only when they are accessed, so
+    reading `.uuid` from a large block tree costs one lookup instead of a
+    full conversion. Writes go through to the underlying dict.
+
+    A LazyBox is a Mapping, not a dict, and a LazyList keeps the views it
+    hands out: `unwrap()` them before `json.dumps` or `isinstance(value, dict)`.
+
+    Examples:
+        >>> block = LazyBox({"uuid": "abc", "page": {"id": 1}, "journal?": False})
+        >>> block.uuid, block.page.id, block.journal
+        ('abc', 1, False)
+        >>> block.content = "hello"
+        >>> block.to_dict()["content"]
+        'hello'
+    """
+
+    __slots__ = ("_data", "_wrapped")
+
+    def __init__(self, data: dict) -> None:
+        object.__setattr__(self, "_data", data)
+        object.__setattr__(self, "_wrapped", {})
+
+    def __getitem__(self, key):
+        try:
+            return self._wrapped[key]
+        except KeyError:
+            pass
+        value = self._data[key]
+        if isinstance(value, (dict, list)):
+            value = lazy(value)
+            self._wrapped[key] = value
+        return value
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        if name in self._data:
+            return self[name]
+        for key in self._data:
+            if isinstance(key, str) and _safe_attr(key) == name:
+                return self[key]
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def __setitem__(self, key, value) -> None:
+        self._wrapped.pop(key, None)
+        self._data[key] = unwrap(value)
+
+    def __delitem__(self, key) -> None:
+        self._wrapped.pop(key, None)
+        del self._data[key]
+
+    def __setattr__(self, name, value) -> None:
+        self[name] = value
+
+    def __delattr__(self, name) -> None:
+        try:
+            del self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def __eq__(self, other) -> bool:
+        return self._data == unwrap(other)
+
+    def __repr__(self) -> str:
+        return f"LazyBox({self._data!r})"
+
+    def __dir__(self):
+        return [*super().__dir__(), *[k for k in self._data if isinstance(k, str)]]
+
+    def to_dict(self) -> dict:
+        """
+        The underlying dict (shared, not copied).
+        """
+        return self._data
+
+
+class LazyList(list):
+    """
+    List whose dict/list items are wrapped on first access.
+
+    Only the top-level item pointers are copied; nested structures are
+    untouched until read.
+
+    Examples:
+        >>> blocks = LazyList([{"uuid": "a"}, {"uuid": "b"}])
+        >>> [b.uuid for b in blocks]
+        ['a', 'b']
+        >>> blocks[-1].uuid
+        'b'
+    """
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return LazyList(list.__getitem__(self, index))
+        value = list.__getitem__(self, index)
+        if isinstance(value, (dict, list)) and not isinstance(value, LazyList):
+            value = lazy(value)
+            list.__setitem__(self, index, value)
+        return value
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self) -> str:
+        return f"LazyList({list.__repr__(self)})"
+
+    def to_list(self) -> list:
+        return [unwrap(value) for value in list.__iter__(self)]
+
+
+def lazy(value):
+    """
+    Wrap a dict or list in a lazy view; other values are returned as-is.
+    """
+    if isinstance(value, dict):
+        return LazyBox(value)
+    elif isinstance(value, list):
+        return LazyList(value)
+    else:
+        return value
+
+
+def unwrap(value):
+    """
+    Return plain dicts/lists for lazy views (e.g. before sending to Logseq).
+
+    Examples:
+        >>> unwrap([LazyBox({"a": 1}), (2, LazyList([{"b": 3}]))])
+        [{'a': 1}, [2, [{'b': 3}]]]
+    """
+    if isinstance(value, LazyBox):
+        return value.to_dict()
+    elif isinstance(value, LazyList):
+        return value.to_list()
+    elif isinstance(value, (list, tuple)):
+        return [unwrap(v) for v in value]
+    elif isinstance(value, dict):
+        return {k: unwrap(v) for k, v in value.items()}
+    else:
+        return value
+
+
+def convert_response(value, mode: str = "box"):
+    """
+    Convert a raw reply or event payload from Logseq.
+
+    Args:
+        value: The decoded JSON value.
+        mode: "box" (eager Box/BoxList, the default), "lazy"
+            (LazyBox/LazyList views) or "raw" (plain dicts and lists).
+    """
+    if isinstance(value, str) and value == "null":
+        return None
+    if mode == "lazy":
+        return lazy(value)
+    elif mode == "box":
+        return mkbox(value)
+    elif mode == "raw":
+        return value
+    raise ValueError(f"Unknown response mode: {mode!r}, expected one of {RESPONSE_MODES}")
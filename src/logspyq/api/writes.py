@@ -0,0 +1,203 @@
+"""
+Write-behind queue for block mutations.
+
+Agents that keep updating a status or progress block send one emit per
+change, though only the last one matters. With the queue enabled
+(`logseq.Editor.enable_write_behind()`), updateBlock, upsertBlockProperty
+and removeBlockProperty are held back and folded per block uuid, then sent
+together on an interval or on `flush()`.
+
+Within a block, updateBlock is always sent before the property writes
+still pending for it, whatever order they were made in. If the new content
+drops a property that was upserted before updateBlock, the property comes
+back after the flush, which sending the writes one by one would not do.
+Pass the property to updateBlock instead to have it folded in.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+_REMOVE = object()
+
+
+class BlockWrites:
+    """
+    Pending writes to one block: the latest content (with the properties
+    passed to updateBlock), and the latest write per property key.
+    """
+
+    def __init__(self) -> None:
+        self.content: Optional[Tuple[str, Dict[str, Any]]] = None
+        self.properties: "OrderedDict[str, Any]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return (self.content is not None) + len(self.properties)
+
+    def update(self, content: str, properties: Dict[str, Any]) -> int:
+        """
+        Record an updateBlock; returns how many pending writes it replaced.
+        """
+        replaced = 0
+        merged: Dict[str, Any] = {}
+        if self.content is not None:
+            merged.update(self.content[1])
+            replaced += 1
+        for key in properties:
+            if key in self.properties:
+                del self.properties[key]
+                replaced += 1
+        merged.update(properties)
+        self.content = (content, merged)
+        return replaced
+
+    def set_property(self, key: str, value: Any) -> int:
+        """
+        Record an upsert (or removal, with `_REMOVE`) of one property.
+        """
+        replaced = 0
+        if key in self.properties:
+            del self.properties[key]
+            replaced = 1
+        if self.content is not None:
+            # A later property write wins over updateBlock's properties.
+            self.content[1].pop(key, None)
+        self.properties[key] = value
+        return replaced
+
+    def merge(self, later: "BlockWrites") -> None:
+        """
+        Apply writes recorded after these on top of them.
+        """
+        if later.content is not None:
+            self.update(*later.content)
+        for key, value in later.properties.items():
+            self.set_property(key, value)
+
+    def calls(self, uuid: str):
+        """
+        The emits that bring the block up to date: updateBlock first, then
+        property writes in the order their keys were last written.
+        """
+        if self.content is not None:
+            content, properties = self.content
+            yield "updateBlock", (uuid, content, {"properties": properties})
+        for key, value in self.properties.items():
+            if value is _REMOVE:
+                yield "removeBlockProperty", (uuid, key)
+            else:
+                yield "upsertBlockProperty", (uuid, key, value)
+
+
+class WriteBehindQueue:
+    """
+    Pending block mutations of one agent, coalesced per uuid.
+
+    Blocks are flushed in the order they were first written since the last
+    flush, so writes to different blocks keep their relative order. Within a
+    block, a later write replaces an earlier one to the same content or
+    property. Flushes never overlap, and a flush sends everything in one
+    batch frame. Writes from a flush that fails stay queued, under any newer
+    writes to the same blocks, and go out with the next flush.
+
+    Args:
+        send: Coroutine function sending one mutation, e.g. proxy.emit.
+        batch: Returns the context manager that groups the sends.
+        interval: Seconds after the first pending write to flush; None
+            flushes only on `flush()`.
+    """
+
+    def __init__(self, send, batch=None, interval: Optional[float] = 0.25) -> None:
+        self._send = send
+        self._batch = batch
+        self.interval = interval
+        self._pending: "OrderedDict[str, BlockWrites]" = OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._lock = asyncio.Lock()
+        self.queued = 0
+        self.coalesced = 0
+        self.sent = 0
+
+    @property
+    def depth(self) -> int:
+        """
+        Mutations waiting to be sent.
+        """
+        return sum(len(writes) for writes in self._pending.values())
+
+    def stats(self) -> dict:
+        return {"depth": self.depth, "queued": self.queued, "coalesced": self.coalesced, "sent": self.sent}
+
+    def update_block(self, uuid: str, content: str, properties: Dict[str, Any]) -> None:
+        self.coalesced += self._writes(uuid).update(content, properties)
+
+    def upsert_property(self, uuid: str, key: str, value: Any) -> None:
+        self.coalesced += self._writes(uuid).set_property(key, value)
+
+    def remove_property(self, uuid: str, key: str) -> None:
+        self.coalesced += self._writes(uuid).set_property(key, _REMOVE)
+
+    def discard(self, uuid: str) -> None:
+        """
+        Drop pending writes to a block, e.g. because it is being removed.
+        """
+        self._pending.pop(uuid, None)
+
+    def _writes(self, uuid: str) -> BlockWrites:
+        writes = self._pending.get(uuid)
+        if writes is None:
+            writes = self._pending[uuid] = BlockWrites()
+        self.queued += 1
+        self._schedule()
+        return writes
+
+    def _schedule(self) -> None:
+        if self._timer is None and self.interval is not None:
+            self._timer = asyncio.get_running_loop().call_later(self.interval, self._flush_soon)
+
+    def _flush_soon(self) -> None:
+        self._timer = None
+        asyncio.ensure_future(self._flush_quietly())
+
+    async def _flush_quietly(self) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            pass  # Logged by flush().
+
+    def _requeue(self, pending: "OrderedDict[str, BlockWrites]") -> None:
+        newer, self._pending = self._pending, pending
+        for uuid, writes in newer.items():
+            if uuid in self._pending:
+                self._pending[uuid].merge(writes)
+            else:
+                self._pending[uuid] = writes
+
+    async def flush(self) -> int:
+        """
+        Send every pending mutation now; returns how many were sent.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        async with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+            calls = [call for uuid, writes in pending.items() for call in writes.calls(uuid)]
+            if not calls:
+                return 0
+            try:
+                if len(calls) > 1 and self._batch is not None:
+                    async with self._batch():
+                        for method, args in calls:
+                            await self._send(method, *args)
+                else:
+                    for method, args in calls:
+                        await self._send(method, *args)
+            except Exception:
+                log.exception(f"Error flushing {len(calls)} block writes; keeping them for the next flush")
+                self._requeue(pending)
+                raise
+            self.sent += len(calls)
+            return len(calls)
@@ -0,0 +1,193 @@
+"""
+Batched requests: coalesce many proxy calls into a single round trip.
+"""
+import asyncio
+import contextvars
+import logging
+from typing import List, Optional, Union
+
+from logspyq.server.rpc import RequestError
+
+log = logging.getLogger(__name__)
+
+current_batch: contextvars.ContextVar[Optional["RequestBatch"]] = contextvars.ContextVar(
+    "logspyq_current_batch", default=None
+)
+# Position reserved by `RequestBatch.add()` for the first call of its task.
+_reserved_slot: contextvars.ContextVar[Optional[object]] = contextvars.ContextVar(
+    "logspyq_batch_slot", default=None
+)
+
+
+class BatchCall:
+    def __init__(
+        self, name: str, data: dict, expect_reply: bool, response_mode: Optional[str] = None
+    ) -> None:
+        self.name = name
+        self.data = data
+        self.expect_reply = expect_reply
+        self.response_mode = response_mode
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def as_dict(self) -> dict:
+        return {"name": self.name, "data": self.data, "reply": self.expect_reply}
+
+
+class RequestBatch:
+    """
+    Async context manager that buffers `request()`/`emit()` calls and sends
+    them to Logseq as one "batch" frame.
+
+    Emits made inside the batch return immediately. Requests that need a
+    result should be started with `batch.add(coro)`; they are resolved
+    together once the batch is flushed on exit. A request awaited directly
+    by the task that opened the batch flushes everything queued so far,
+    so code that depends on a result never deadlocks.
+
+    Example:
+        async with logseq.batch() as batch:
+            page = batch.add(logseq.Editor.getPage("TODO"))
+            await logseq.Editor.updateBlock(uuid, "Done")
+        print(page.result())
+    """
+
+    def __init__(self, server, timeout: float = 10) -> None:
+        self._server = server
+        self._timeout = timeout
+        self._calls: List[Union[BatchCall, object]] = []
+        self._tasks: List[asyncio.Task] = []
+        self._owner: Optional[asyncio.Task] = None
+        self._token = None
+        self._queued = asyncio.Event()
+        self.active = False
+
+    async def __aenter__(self) -> "RequestBatch":
+        self._owner = asyncio.current_task()
+        self._token = current_batch.set(self)
+        self.active = True
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        current_batch.reset(self._token)
+        try:
+            if exc_type is None:
+                await self._drain()
+        finally:
+            self.active = False
+            for task in self._tasks:
+                if not task.done():
+                    task.cancel()
+            self._fail_queued(RequestError("Batch closed before call was sent"))
+
+    def add(self, coro) -> asyncio.Task:
+        """
+        Start a proxy call inside the batch; returns a task holding its result.
+        """
+        # Reserve a place in the buffer so calls keep the order they were
+        # written in, even though the task only runs at the next await.
+        slot = object()
+        self._calls.append(slot)
+
+        async def run():
+            _reserved_slot.set(slot)
+            return await coro
+
+        task = asyncio.ensure_future(run())
+        self._tasks.append(task)
+        return task
+
+    def is_owner(self) -> bool:
+        return asyncio.current_task() is self._owner
+
+    def queue(
+        self, name: str, data: dict, expect_reply: bool, response_mode: Optional[str] = None
+    ) -> asyncio.Future:
+        """
+        Buffer a call; the returned future resolves when the batch is flushed.
+        """
+        call = BatchCall(name, data, expect_reply, response_mode)
+        slot = _reserved_slot.get()
+        _reserved_slot.set(None)
+        if slot is not None and slot in self._calls:
+            self._calls[self._calls.index(slot)] = call
+        else:
+            self._calls.append(call)
+        self._queued.set()
+        log.debug(f"Batched: {name!r} ({len(self._calls)} queued)")
+        return call.future
+
+    async def flush(self) -> None:
+        """
+        Send all buffered calls as one frame and resolve their futures.
+        """
+        calls = [call for call in self._calls if isinstance(call, BatchCall)]
+        self._calls = []
+        if not calls:
+            return
+        frame = {"calls": [call.as_dict() for call in calls]}
+        log.debug(f"Batch: sending {len(calls)} calls")
+        if not any(call.expect_reply for call in calls):
+            await self._server.emit_raw("batch", frame)
+            for call in calls:
+                call.future.set_result(None)
+            return
+        try:
+            replies = await self._server.request_raw("batch", frame, timeout=self._timeout)
+        except BaseException as e:
+            for call in calls:
+                self._fail(call, e)
+            raise
+        if not isinstance(replies, list) or len(replies) != len(calls):
+            error = RequestError(f"Malformed batch reply: {replies!r}")
+            for call in calls:
+                self._fail(call, error)
+            raise error
+        for call, reply in zip(calls, replies):
+            if call.future.done():
+                continue
+            if isinstance(reply, dict) and "error" in reply:
+                self._fail(call, RequestError(f"{call.name}: {reply['error']}"))
+            else:
+                result = reply.get("result") if isinstance(reply, dict) else reply
+                call.future.set_result(self._server.convert_response(result, call.response_mode))
+
+    async def _drain(self) -> None:
+        """
+        Flush until every task started with `add()` has finished; tasks may
+        queue further calls after receiving earlier results.
+        """
+        while True:
+            # Let freshly started tasks run up to their first call.
+            await asyncio.sleep(0)
+            if any(isinstance(call, BatchCall) for call in self._calls):
+                await self.flush()
+                continue
+            pending = [task for task in self._tasks if not task.done()]
+            if not pending:
+                break
+            self._queued.clear()
+            waiter = asyncio.ensure_future(self._queued.wait())
+            await asyncio.wait([*pending, waiter], return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+        results = await asyncio.gather(*self._tasks, return_exceptions=True)
+        for result in results:
+            # Surface the first error from any call made inside the batch.
+            if isinstance(result, BaseException):
+                raise result
+
+    def _fail_queued(self, exc: BaseException) -> None:
+        calls, self._calls = self._calls, []
+        for call in calls:
+            if isinstance(call, BatchCall):
+                self._fail(call, exc)
+
+    @staticmethod
+    def _fail(call: BatchCall, exc: BaseException) -> None:
+        if call.future.done():
+            return
+        if call.expect_reply:
+            call.future.set_exception(exc)
+        else:
+            # Nobody awaits an emit; log instead of leaving an unretrieved error.
+            log.warning(f"Batched emit failed: {call.name!r}: {exc}")
+            call.future.set_result(None)
@@ -1,4 +1,5 @@
 import click
+from .codec import DEFAULT_PREFERENCE
 from .server import PluginServer
 
 
@@ -6,6 +7,8 @@ from .server import PluginServer
 @click.option("--host", default="localhost", help="Host to bind to")
 @click.option("--port", default=8484, help="Port to bind to")
 @click.option("--debug", default=False, is_flag=True, help="Enable debug mode")
-def main(host, port, debug):
-    server = PluginServer()
+@click.option("--isolate-agents", default=False, is_flag=True, help="Run each agent in its own process")
+@click.option("--json-only", default=False, is_flag=True, help="Never switch Logseq connections to msgpack")
+def main(host, port, debug, isolate_agents, json_only):
+    server = PluginServer(isolate_agents=isolate_agents, codecs=("json",) if json_only else DEFAULT_PREFERENCE)
     server.run(host=host, port=port, debug=debug)
@@ -0,0 +1,140 @@
+"""
+Wire codecs for payloads exchanged with Logseq.
+
+JSON is socket.io's own encoding and always works. With the optional
+`msgpack` package installed, a connection can switch to msgpack: payloads
+then travel as socket.io binary attachments, which are smaller than JSON
+text and cheaper to parse on both ends for large block trees.
+
+The codec is negotiated per connection: the client sends the codecs it
+supports in a "codec" event, and the server answers with the first of its
+own preferences the client offered. Clients that never ask stay on JSON.
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PREFERENCE = ("msgpack", "json")
+
+
+class Codec:
+    """
+    Plain JSON: payloads are handed to socket.io unchanged.
+    """
+
+    name = "json"
+    binary = False
+
+    def encode(self, data: Any) -> Any:
+        return data
+
+    def decode(self, data: Any) -> Any:
+        return data
+
+    def __repr__(self) -> str:
+        return f"<Codec {self.name}>"
+
+
+class MsgpackCodec(Codec):
+    """
+    msgpack, sent as one binary attachment per payload.
+
+    Examples:
+        >>> codec = MsgpackCodec()
+        >>> codec.decode(codec.encode({"uuid": "a", "children": [["uuid", "b"]]}))
+        {'uuid': 'a', 'children': [['uuid', 'b']]}
+    """
+
+    name = "msgpack"
+    binary = True
+
+    def encode(self, data: Any) -> bytes:
+        return msgpack.packb(data, use_bin_type=True)
+
+    def decode(self, data: Any) -> Any:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return msgpack.unpackb(data, raw=False, strict_map_key=False)
+        return data
+
+
+JSON = Codec()
+CODECS: Dict[str, Codec] = {"json": JSON}
+if msgpack is not None:
+    CODECS["msgpack"] = MsgpackCodec()
+
+
+def negotiate(offered: Iterable[str], preference: Sequence[str] = DEFAULT_PREFERENCE) -> Codec:
+    """
+    Pick the first codec in `preference` that the client offered and this
+    process supports; JSON otherwise.
+
+    Examples:
+        >>> negotiate(["json"]).name
+        'json'
+        >>> negotiate(["brotli"]).name
+        'json'
+    """
+    offered = set(offered or ())
+    for name in preference:
+        if name in offered and name in CODECS:
+            return CODECS[name]
+    return JSON
+
+
+def decode(data: Any) -> Any:
+    """
+    Decode a payload from any connection. Binary payloads are msgpack;
+    everything else came as JSON and is returned as-is.
+    """
+    if isinstance(data, (bytes, bytearray)) and "msgpack" in CODECS:
+        return CODECS["msgpack"].decode(data)
+    return data
+
+
+class ConnectionCodecs:
+    """
+    The codec each connected Logseq instance negotiated.
+
+    `groups()` returns None while every connection uses JSON, so the server
+    can keep broadcasting one payload; otherwise it maps each codec to its
+    connections and the payload is encoded once per codec.
+    """
+
+    def __init__(self, preference: Sequence[str] = DEFAULT_PREFERENCE) -> None:
+        self.preference = tuple(preference)
+        self._by_sid: Dict[str, Codec] = {}
+
+    def connect(self, sid: str) -> None:
+        self._by_sid[sid] = JSON
+
+    def disconnect(self, sid: str) -> None:
+        self._by_sid.pop(sid, None)
+
+    def negotiate(self, sid: str, offered: Iterable[str]) -> Codec:
+        codec = negotiate(offered, self.preference)
+        self._by_sid[sid] = codec
+        log.info(f"Logseq instance {sid!r} uses {codec.name} payloads")
+        return codec
+
+    def get(self, sid: str) -> Codec:
+        return self._by_sid.get(sid, JSON)
+
+    def groups(self) -> Optional[Dict[Codec, List[str]]]:
+        if not any(codec.binary for codec in self._by_sid.values()):
+            return None
+        return self.group(self._by_sid)
+
+    def group(self, sids: Iterable[str]) -> Dict[Codec, List[str]]:
+        """
+        Map each codec to those of `sids` that use it.
+        """
+        groups: Dict[Codec, List[str]] = {}
+        for sid in sids:
+            groups.setdefault(self.get(sid), []).append(sid)
+        return groups
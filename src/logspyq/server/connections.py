@@ -0,0 +1,182 @@
+"""
+Connected Logseq windows, and which of them a call is sent to.
+
+Each Logseq window (or graph) opens its own socket.io connection. Sending
+every request to all of them makes each window do the work while only the
+first reply is used, so calls are routed instead:
+
+- calls made while handling an event go to the window that sent it;
+- everything else (jobs, the graph mirror) goes to the primary window:
+  the one chosen with `PluginServer.set_primary()` (or on the debug
+  page), else the longest-connected
+  ready one.
+
+Handlers of an event see its sid in `current_sid`; `routing()` overrides
+it, and `routing(BROADCAST)` sends to every window, e.g. to install
+slash commands in all of them.
+"""
+import asyncio
+import contextlib
+import contextvars
+import logging
+import time
+from typing import Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+BROADCAST = "*"
+
+current_sid: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("logspyq_sid", default=None)
+
+
+@contextlib.contextmanager
+def routing(sid: Optional[str]):
+    """
+    Send the calls made inside the block to `sid` (None: the primary).
+    """
+    token = current_sid.set(sid)
+    try:
+        yield
+    finally:
+        current_sid.reset(token)
+
+
+class Connection:
+    def __init__(self, sid: str) -> None:
+        self.sid = sid
+        self.graph: Optional[dict] = None
+        self.ready = False
+        self.connected_at = time.monotonic()
+
+    @property
+    def graph_name(self) -> Optional[str]:
+        return (self.graph or {}).get("name")
+
+    def __repr__(self) -> str:
+        return f"<Connection {self.sid!r} graph={self.graph_name!r} ready={self.ready}>"
+
+
+class ConnectionRegistry:
+    """
+    Every connected Logseq window by sid, with its graph and readiness.
+
+    Examples:
+        >>> connections = ConnectionRegistry()
+        >>> connections.route(None) is None  # Nothing known: broadcast.
+        True
+        >>> connections.connect("a"); connections.connect("b")
+        >>> connections.set_ready("b")
+        >>> connections.route("a"), connections.route(None), connections.route(BROADCAST)
+        (['a'], ['b'], ['a', 'b'])
+        >>> connections.disconnect("b")
+        >>> connections.route("b")
+        ['a']
+    """
+
+    def __init__(self) -> None:
+        self._connections: Dict[str, Connection] = {}
+        self._chosen: Optional[str] = None
+        # Whether Logseq has ever connected; until then nothing is "lost".
+        self.was_connected = False
+        self._ready_waiters: List[asyncio.Future] = []
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def __contains__(self, sid: str) -> bool:
+        return sid in self._connections
+
+    def get(self, sid: str) -> Optional[Connection]:
+        return self._connections.get(sid)
+
+    def all(self) -> List[Connection]:
+        return list(self._connections.values())
+
+    def connect(self, sid: str) -> None:
+        self._connections[sid] = Connection(sid)
+        self.was_connected = True
+
+    def disconnect(self, sid: str) -> None:
+        self._connections.pop(sid, None)
+
+    def set_ready(self, sid: str) -> None:
+        self._connection(sid).ready = True
+        waiters, self._ready_waiters = self._ready_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(sid)
+
+    def has_ready(self) -> bool:
+        return any(connection.ready for connection in self._connections.values())
+
+    @property
+    def disconnected(self) -> bool:
+        """
+        Whether Logseq was connected before but no window is ready now,
+        e.g. while the frontend reloads.
+        """
+        return self.was_connected and not self.has_ready()
+
+    async def wait_ready(self, timeout: Optional[float]) -> bool:
+        """
+        Wait until some window is ready; False if none is within `timeout`.
+        """
+        if self.has_ready():
+            return True
+        waiter = asyncio.get_running_loop().create_future()
+        self._ready_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if waiter in self._ready_waiters:
+                self._ready_waiters.remove(waiter)
+
+    def set_graph(self, sid: str, graph: Optional[dict]) -> None:
+        self._connection(sid).graph = graph
+
+    def _connection(self, sid: str) -> Connection:
+        if sid not in self._connections:
+            self.connect(sid)
+        return self._connections[sid]
+
+    def choose_primary(self, sid: Optional[str]) -> None:
+        """
+        Send background calls to this window while it is connected; None
+        goes back to the longest-connected ready window.
+        """
+        self._chosen = sid
+
+    def primary(self) -> Optional[Connection]:
+        if self._chosen in self._connections:
+            return self._connections[self._chosen]
+        # Dicts keep insertion order: the first entries connected first.
+        ready = [connection for connection in self._connections.values() if connection.ready]
+        candidates = ready or list(self._connections.values())
+        return candidates[0] if candidates else None
+
+    def route(self, sid: Optional[str]) -> Optional[List[str]]:
+        """
+        The sids a call made in the context of `sid` goes to; None when no
+        connection is known yet, so the caller falls back to broadcasting.
+        """
+        if not self._connections:
+            return None
+        if sid == BROADCAST:
+            return list(self._connections)
+        if sid in self._connections:
+            return [sid]
+        return [self.primary().sid]
+
+    def as_dict(self) -> dict:
+        primary = self.primary()
+        return {
+            connection.sid: {
+                "graph": connection.graph_name,
+                "ready": connection.ready,
+                "primary": connection is primary,
+            }
+            for connection in self._connections.values()
+        }
@@ -0,0 +1,369 @@
+"""
+Runtime metrics for the plugin server: RPC latency, payload sizes, handler
+runtimes and event loop lag, exported as Prometheus text or JSON.
+"""
+import asyncio
+import bisect
+import json
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+log = logging.getLogger(__name__)
+
+# Seconds; Logseq round trips are usually a few milliseconds, but timeouts
+# derived from them go up to a minute (see TimeoutPolicy).
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Bytes of compact JSON, whichever codec actually carries the payload.
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+
+Labels = Tuple[str, ...]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram per label set, as Prometheus expects.
+
+    Examples:
+        >>> h = Histogram("latency_seconds", "Latency", ("method",), buckets=(0.1, 1))
+        >>> h.observe(0.05, "a"); h.observe(0.5, "a"); h.observe(5, "a")
+        >>> h.count("a"), h.quantile(0.5, "a"), h.quantile(0.99, "a")
+        (3, 0.55, 5)
+    """
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # Per label set: non-cumulative bucket counts (+Inf last), sum, max.
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = {}
+        self._maxima: Dict[Labels, float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+            self._sums[labels] = 0.0
+            self._maxima[labels] = value
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[labels] += value
+        self._maxima[labels] = max(self._maxima[labels], value)
+
+    def count(self, *labels: str) -> int:
+        return sum(self._counts.get(labels, ()))
+
+    def total(self, *labels: str) -> float:
+        return self._sums.get(labels, 0.0)
+
+    def label_sets(self) -> List[Labels]:
+        return list(self._counts)
+
+    def quantile(self, q: float, *labels: str) -> Optional[float]:
+        """
+        Estimate a quantile by linear interpolation inside its bucket, like
+        Prometheus' histogram_quantile(), capped at the largest value seen.
+        None without observations.
+        """
+        counts = self._counts.get(labels)
+        if not counts:
+            return None
+        rank = q * sum(counts)
+        seen = 0
+        for i, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                if i == len(self.buckets):
+                    # Above the last bucket: the best estimate is the maximum.
+                    return self._maxima[labels]
+                lower = self.buckets[i - 1] if i else 0.0
+                estimate = lower + (self.buckets[i] - lower) * (rank - seen) / bucket_count
+                return min(estimate, self._maxima[labels])
+            seen += bucket_count
+        return self._maxima[labels]
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, counts in self._counts.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_labels(self.label_names, labels, le=bound)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {self._sums[labels]}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+
+class Gauge:
+    """
+    A single value, either set directly or read from a callable on export.
+    With `label_names`, `read` returns a value per label tuple instead.
+    """
+
+    def __init__(self, name: str, help: str, read=None, label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.value = 0.0
+        self._read = read
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def get(self, *labels: str) -> float:
+        if self.label_names:
+            return self._values().get(labels, 0)
+        return self._read() if self._read is not None else self.value
+
+    def _values(self) -> Dict[Labels, float]:
+        return self._read() if self._read is not None else {}
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        if not self.label_names:
+            yield f"{self.name} {self.get()}"
+            return
+        for labels, value in self._values().items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+
+def _labels(names: Sequence[str], values: Sequence[str], le=None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def payload_size(data) -> int:
+    """
+    Size of a payload as compact JSON. This is the wire size under the
+    JSON codec only; msgpack frames are smaller.
+    """
+    try:
+        return len(json.dumps(data, separators=(",", ":"), default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class ServerMetrics:
+    """
+    Everything the plugin server measures about itself.
+
+    Payload sizes cost a JSON encode each, so only every `size_sample`-th
+    payload is measured; the byte histograms are a sample, the latency
+    histograms and counters are complete.
+    """
+
+    def __init__(
+        self, size_sample: int = 10, lag_interval: float = 0.5, in_flight=None, outbound=None, buffered=None
+    ) -> None:
+        self.size_sample = max(1, size_sample)
+        self.lag_interval = lag_interval
+        self.rpc_latency = Histogram(
+            "logspyq_rpc_latency_seconds", "Round trip time of requests to Logseq.", ("method",)
+        )
+        self.rpc_timeouts = Counter("logspyq_rpc_timeouts_total", "Requests to Logseq that timed out.", ("method",))
+        self.rpc_errors = Counter("logspyq_rpc_errors_total", "Requests to Logseq that failed.", ("method",))
+        self.rpc_retries = Counter(
+            "logspyq_rpc_retries_total", "Read-only requests sent again after a timeout.", ("method",)
+        )
+        self.rpc_interrupted = Counter(
+            "logspyq_rpc_interrupted_total", "Requests cut off by a closed connection.", ("method",)
+        )
+        self.rpc_replays = Counter(
+            "logspyq_rpc_replays_total", "Requests sent again after a reconnect.", ("method",)
+        )
+        self.payload_bytes = Histogram(
+            "logspyq_payload_bytes",
+            "Sampled size of payloads exchanged with Logseq, as compact JSON whatever the codec.",
+            ("method", "direction"),
+            buckets=SIZE_BUCKETS,
+        )
+        self.handler_runtime = Histogram(
+            "logspyq_handler_seconds", "Runtime of event handlers.", ("event",)
+        )
+        self.handler_errors = Counter("logspyq_handler_errors_total", "Event handlers that raised.", ("event",))
+        self.loop_lag = Histogram(
+            "logspyq_event_loop_lag_seconds", "Delay of a periodic timer on the event loop.", ()
+        )
+        self.loop_lag_last = Gauge("logspyq_event_loop_lag_last_seconds", "Most recent event loop lag.")
+        self.in_flight = Gauge(
+            "logspyq_requests_in_flight", "Requests waiting for a reply from Logseq.", read=in_flight
+        )
+        self.emits_buffered = Gauge(
+            "logspyq_emits_buffered", "Emits held while Logseq is disconnected.", read=buffered
+        )
+        self.emits_dropped = Counter(
+            "logspyq_emits_dropped_total", "Buffered emits dropped because the buffer was full."
+        )
+        # Outbound scheduler (see logspyq.server.outbound), if any.
+        self.outbound = outbound
+        self.outbound_queued = Gauge(
+            "logspyq_outbound_queued",
+            "Calls to Logseq waiting for a slot, per priority class.",
+            read=lambda: self._outbound_values("queued"),
+            label_names=("priority",),
+        )
+        self.outbound_active = Gauge(
+            "logspyq_outbound_active",
+            "Calls to Logseq holding a slot, per priority class.",
+            read=lambda: self._outbound_values("active"),
+            label_names=("priority",),
+        )
+        self.outbound_wait = Histogram(
+            "logspyq_outbound_wait_seconds", "Time calls waited for a slot.", ("priority",)
+        )
+        self._payloads_seen = 0
+        self._lag_task: Optional[asyncio.Task] = None
+
+    # --- Recording ---
+
+    def observe_request(self, method: str, seconds: float) -> None:
+        self.rpc_latency.observe(seconds, method)
+
+    def observe_payload(self, method: str, direction: str, data) -> None:
+        self._payloads_seen += 1
+        if self._payloads_seen % self.size_sample == 0:
+            self.payload_bytes.observe(payload_size(data), method, direction)
+
+    def observe_outbound_wait(self, priority: str, seconds: float) -> None:
+        self.outbound_wait.observe(seconds, priority)
+
+    def _outbound_values(self, key: str) -> Dict[Labels, float]:
+        if self.outbound is None:
+            return {}
+        return {(priority,): stats[key] for priority, stats in self.outbound.stats().items()}
+
+    def observe_handler(self, event: str, seconds: float, failed: bool = False) -> None:
+        self.handler_runtime.observe(seconds, event)
+        if failed:
+            self.handler_errors.inc(event)
+
+    # --- Event loop lag ---
+
+    def start(self) -> None:
+        if self._lag_task is None:
+            self._lag_task = asyncio.ensure_future(self._measure_lag())
+
+    def stop(self) -> None:
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+
+    async def _measure_lag(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.lag_interval)
+            lag = max(0.0, time.perf_counter() - start - self.lag_interval)
+            self.loop_lag.observe(lag)
+            self.loop_lag_last.set(lag)
+            if lag > 0.25:
+                log.warning(f"Event loop lagged {lag * 1000:.0f} ms")
+
+    # --- Export ---
+
+    def _metrics(self):
+        return (
+            self.rpc_latency,
+            self.rpc_timeouts,
+            self.rpc_errors,
+            self.rpc_retries,
+            self.rpc_interrupted,
+            self.rpc_replays,
+            self.payload_bytes,
+            self.handler_runtime,
+            self.handler_errors,
+            self.loop_lag,
+            self.loop_lag_last,
+            self.in_flight,
+            self.emits_buffered,
+            self.emits_dropped,
+            self.outbound_queued,
+            self.outbound_active,
+            self.outbound_wait,
+        )
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in self._metrics():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def as_dict(self) -> dict:
+        """
+        Summary for the debug page: counts, mean and percentiles per method
+        and per event, in milliseconds.
+        """
+
+        def summary(histogram: Histogram, labels: Labels, scale: float = 1000) -> dict:
+            count = histogram.count(*labels)
+            return {
+                "count": count,
+                "mean": histogram.total(*labels) / count * scale if count else None,
+                "p50": _scaled(histogram.quantile(0.5, *labels), scale),
+                "p90": _scaled(histogram.quantile(0.9, *labels), scale),
+                "p99": _scaled(histogram.quantile(0.99, *labels), scale),
+            }
+
+        methods = {}
+        for (method,) in sorted(self.rpc_latency.label_sets()):
+            methods[method] = summary(self.rpc_latency, (method,))
+            methods[method]["timeouts"] = self.rpc_timeouts.get(method)
+            methods[method]["errors"] = self.rpc_errors.get(method)
+            methods[method]["retries"] = self.rpc_retries.get(method)
+            methods[method]["interrupted"] = self.rpc_interrupted.get(method)
+            methods[method]["replays"] = self.rpc_replays.get(method)
+        for (method,) in self.rpc_timeouts._values:
+            methods.setdefault(method, {"count": 0, "timeouts": self.rpc_timeouts.get(method)})
+        payloads = {
+            f"{method} {direction}": summary(self.payload_bytes, (method, direction), scale=1)
+            for method, direction in sorted(self.payload_bytes.label_sets())
+        }
+        handlers = {}
+        for (event,) in sorted(self.handler_runtime.label_sets()):
+            handlers[event] = summary(self.handler_runtime, (event,))
+            handlers[event]["errors"] = self.handler_errors.get(event)
+        outbound = {}
+        if self.outbound is not None:
+            for priority, stats in self.outbound.stats().items():
+                wait = summary(self.outbound_wait, (priority,))
+                outbound[priority] = {**stats, "p50": wait["p50"], "p99": wait["p99"]}
+        return {
+            "requests": methods,
+            "payload_bytes": payloads,
+            "handlers": handlers,
+            "loop_lag": {**summary(self.loop_lag, ()), "last": self.loop_lag_last.get() * 1000},
+            "in_flight": self.in_flight.get(),
+            "emits_buffered": self.emits_buffered.get(),
+            "emits_dropped": self.emits_dropped.get(),
+            "outbound": outbound,
+        }
+
+
+def _scaled(value: Optional[float], scale: float) -> Optional[float]:
+    return value * scale if value is not None else None
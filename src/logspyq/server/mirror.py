@@ -0,0 +1,299 @@
+"""
+In-process mirror of the Logseq graph, kept current by DB.onChanged.
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+
+from box import Box, BoxList
+
+from logspyq.server.connections import current_sid
+from logspyq.server.outbound import BULK, current_agent, current_priority
+
+log = logging.getLogger(__name__)
+
+UUID_ATTRIBUTES = ("uuid", ":block/uuid")
+
+
+class GraphMirror:
+    """
+    Pages and blocks of the current graph, indexed by uuid, name and parent.
+
+    The mirror bootstraps once (pages streamed in chunks, then page block
+    trees with one batched round trip per chunk of pages) and afterwards applies the `changed`
+    events from DB.onChanged, so agents can query the graph locally.
+
+    Usage:
+        mirror = await logseq.mirror.ready()
+        page = mirror.get_page("TODO")
+        for block in mirror.page_blocks("TODO"):
+            ...
+    """
+
+    def __init__(self, server, chunk_size: int = 50) -> None:
+        self._server = server
+        self.chunk_size = chunk_size
+        self.started = False
+        self._loaded = False
+        self._loading: Optional[asyncio.Task] = None
+        self._backlog: List[dict] = []
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pages: Dict[int, dict] = {}
+        self._page_ids_by_uuid: Dict[str, int] = {}
+        self._page_ids_by_name: Dict[str, int] = {}
+        self._blocks: Dict[int, dict] = {}
+        self._block_ids_by_uuid: Dict[str, int] = {}
+        self._children: Dict[int, Set[int]] = {}
+        self._page_blocks: Dict[int, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pages) + len(self._blocks)
+
+    # --- Lifecycle ---
+
+    async def ready(self) -> "GraphMirror":
+        """
+        Start the mirror on first use and wait until it is loaded.
+        """
+        if not self.started:
+            await self.start()
+        elif self._loading is not None:
+            if not self._loading.done():
+                await self._wait_loaded()
+            elif self._loading.cancelled() or self._loading.exception() is not None:
+                # Previous load failed; try again.
+                await self.refresh()
+        return self
+
+    async def start(self) -> None:
+        self.started = True
+        self._server.add_listener("changed", self._on_changed, key="mirror")
+        self._server.add_listener("current-graph-changed", self._on_graph_changed, key="mirror")
+        await self.refresh()
+
+    async def refresh(self) -> None:
+        """
+        Reload the whole graph, e.g. after a reconnect or graph switch.
+
+        A load still running is cancelled; whoever waits for it follows the
+        new one instead.
+        """
+        if self._loading and not self._loading.done():
+            self._loading.cancel()
+        self._loading = asyncio.ensure_future(self._bootstrap())
+        await self._wait_loaded()
+
+    async def _wait_loaded(self) -> None:
+        while True:
+            loading = self._loading
+            try:
+                await asyncio.shield(loading)
+                return
+            except asyncio.CancelledError:
+                # Only swallowed when refresh() replaced the load; not when
+                # the caller itself is being cancelled.
+                if not loading.cancelled() or self._loading is loading:
+                    raise
+
+    async def _bootstrap(self) -> None:
+        # Runs in its own task: the class applies to the whole load, which
+        # goes to the primary window whichever window triggered it.
+        current_priority.set(BULK)
+        current_agent.set("mirror")
+        current_sid.set(None)
+        self._loaded = False
+        self._backlog = []
+        await self._server.emit("DB.onChanged", event_name="changed")
+        await self._server.emit("App.onCurrentGraphChanged", event_name="current-graph-changed")
+        log.info("Graph mirror: loading pages")
+        self._reset()
+        names = []
+        async for page in self._server.stream("Editor.getAllPages", chunk_size=500, response_mode="raw"):
+            self._put_page(page)
+            if page.get("name"):
+                names.append(page["name"])
+        for offset in range(0, len(names), self.chunk_size):
+            chunk = names[offset : offset + self.chunk_size]
+            async with self._server.batch(timeout=30) as batch:
+                trees = [
+                    batch.add(self._server.request("Editor.getPageBlocksTree", name, response_mode="raw"))
+                    for name in chunk
+                ]
+            for tree in trees:
+                for block in tree.result() or []:
+                    self._put_tree(block)
+        backlog, self._backlog = self._backlog, []
+        for event in backlog:
+            self.apply_change(event)
+        log.info(f"Graph mirror: loaded {len(self._pages)} pages, {len(self._blocks)} blocks")
+        self._loaded = True
+
+    async def _on_changed(self, sid, event=None, *args):
+        if not isinstance(event, dict):
+            return
+        if not self._loaded:
+            self._backlog.append(event)
+            return
+        self.apply_change(event)
+
+    async def _on_graph_changed(self, sid, *args):
+        log.info("Graph mirror: graph changed, reloading")
+        await self.refresh()
+
+    # --- Indexing ---
+
+    def apply_change(self, event: dict) -> None:
+        """
+        Apply one DB.onChanged payload: {blocks, txData, txMeta}.
+        """
+        for entity in event.get("blocks") or []:
+            if self._is_page(entity):
+                self._put_page(entity)
+            else:
+                self._put_block(entity)
+        retracted, asserted = set(), set()
+        for datom in event.get("txData") or []:
+            if len(datom) < 5 or datom[1] not in UUID_ATTRIBUTES:
+                continue
+            (asserted if datom[4] else retracted).add(datom[0])
+        for entity_id in retracted - asserted:
+            self._remove(entity_id)
+
+    @staticmethod
+    def _is_page(entity: dict) -> bool:
+        return "name" in entity and "page" not in entity
+
+    def _put_page(self, page: dict) -> None:
+        page = dict(page)
+        page_id = page.get("id")
+        if page_id is None:
+            return
+        old = self._pages.get(page_id)
+        if old is not None and old.get("name"):
+            self._page_ids_by_name.pop(old["name"].lower(), None)
+        self._pages[page_id] = page
+        if page.get("uuid"):
+            self._page_ids_by_uuid[page["uuid"]] = page_id
+        if page.get("name"):
+            self._page_ids_by_name[page["name"].lower()] = page_id
+
+    def _put_tree(self, block: dict) -> None:
+        self._put_block(block)
+        for child in block.get("children") or []:
+            if isinstance(child, dict):
+                self._put_tree(child)
+
+    def _put_block(self, block: dict) -> None:
+        block_id = block.get("id")
+        if block_id is None:
+            return
+        # Nested children are indexed separately; keep the entity flat.
+        block = {k: v for k, v in block.items() if k != "children"}
+        self._unlink(block_id)
+        self._blocks[block_id] = block
+        if block.get("uuid"):
+            self._block_ids_by_uuid[block["uuid"]] = block_id
+        parent_id = _ref_id(block.get("parent"))
+        if parent_id is not None:
+            self._children.setdefault(parent_id, set()).add(block_id)
+        page_id = _ref_id(block.get("page"))
+        if page_id is not None:
+            self._page_blocks.setdefault(page_id, set()).add(block_id)
+
+    def _unlink(self, block_id: int) -> None:
+        old = self._blocks.get(block_id)
+        if old is None:
+            return
+        parent_id = _ref_id(old.get("parent"))
+        if parent_id is not None:
+            self._children.get(parent_id, set()).discard(block_id)
+        page_id = _ref_id(old.get("page"))
+        if page_id is not None:
+            self._page_blocks.get(page_id, set()).discard(block_id)
+
+    def _remove(self, entity_id: int) -> None:
+        if entity_id in self._blocks:
+            self._unlink(entity_id)
+            block = self._blocks.pop(entity_id)
+            self._block_ids_by_uuid.pop(block.get("uuid"), None)
+            self._children.pop(entity_id, None)
+        elif entity_id in self._pages:
+            page = self._pages.pop(entity_id)
+            self._page_ids_by_uuid.pop(page.get("uuid"), None)
+            if page.get("name"):
+                self._page_ids_by_name.pop(page["name"].lower(), None)
+            for block_id in self._page_blocks.pop(entity_id, set()):
+                self._remove(block_id)
+            self._children.pop(entity_id, None)
+
+    # --- Queries ---
+
+    def _page_id(self, name_or_uuid: str) -> Optional[int]:
+        page_id = self._page_ids_by_uuid.get(name_or_uuid)
+        if page_id is None:
+            page_id = self._page_ids_by_name.get(name_or_uuid.lower())
+        return page_id
+
+    def get_page(self, name_or_uuid: str) -> Optional[Box]:
+        page_id = self._page_id(name_or_uuid)
+        page = self._pages.get(page_id) if page_id is not None else None
+        return Box(page) if page is not None else None
+
+    def get_block(self, uuid: str) -> Optional[Box]:
+        block_id = self._block_ids_by_uuid.get(uuid)
+        block = self._blocks.get(block_id) if block_id is not None else None
+        return Box(block) if block is not None else None
+
+    def all_pages(self) -> BoxList:
+        return BoxList(self._pages.values())
+
+    def children(self, uuid: str) -> BoxList:
+        """
+        Direct children of a block or page, in outline order.
+        """
+        parent_id = self._block_ids_by_uuid.get(uuid)
+        if parent_id is None:
+            parent_id = self._page_ids_by_uuid.get(uuid)
+        if parent_id is None:
+            return BoxList()
+        return BoxList(self._ordered(parent_id))
+
+    def page_blocks(self, name_or_uuid: str) -> BoxList:
+        """
+        Top-level blocks of a page, in outline order.
+        """
+        page_id = self._page_id(name_or_uuid)
+        if page_id is None:
+            return BoxList()
+        return BoxList(self._ordered(page_id))
+
+    def blocks_in_page(self, name_or_uuid: str) -> BoxList:
+        """
+        Every block on a page, at any depth, in no particular order.
+        """
+        page_id = self._page_id(name_or_uuid)
+        if page_id is None:
+            return BoxList()
+        return BoxList(self._blocks[i] for i in self._page_blocks.get(page_id, ()))
+
+    def _ordered(self, parent_id: int) -> List[dict]:
+        # Siblings form a linked list through `left`: the first child points
+        # at its parent, every other block at its previous sibling.
+        children = [self._blocks[i] for i in self._children.get(parent_id, ()) if i in self._blocks]
+        by_left = {_ref_id(block.get("left")): block for block in children}
+        ordered, current = [], parent_id
+        while current in by_left and len(ordered) < len(children):
+            block = by_left.pop(current)
+            ordered.append(block)
+            current = block["id"]
+        # Anything not reachable (e.g. partially applied moves) goes last.
+        ordered.extend(by_left.values())
+        return ordered
+
+
+def _ref_id(ref) -> Optional[int]:
+    if isinstance(ref, dict):
+        return ref.get("id")
+    return ref if isinstance(ref, int) else None
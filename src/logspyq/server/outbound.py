@@ -0,0 +1,185 @@
+"""
+Priority classes for calls to Logseq.
+
+Every request and emit belongs to a class:
+
+- "interactive": triggered by the user, e.g. a slash command or a click.
+- "background": scheduled work, e.g. `on_interval`/`on_cron` jobs.
+- "bulk": large reads such as loading the graph mirror.
+
+The class and the agent making a call are carried in context variables, so
+handlers, jobs and everything they await are classified without passing
+arguments around. `OutboundScheduler` admits calls to the socket with a
+concurrency limit per class and takes turns between agents within a class,
+so an interval job issuing hundreds of getBlock calls cannot hold up a
+slash command the user is waiting on.
+"""
+import asyncio
+import contextlib
+import contextvars
+import functools
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+BULK = "bulk"
+# Highest priority first: freed slots go to the first class with waiters.
+PRIORITIES = (INTERACTIVE, BACKGROUND, BULK)
+
+# Calls in flight per class, and in total.
+DEFAULT_LIMITS = {INTERACTIVE: 16, BACKGROUND: 4, BULK: 2}
+DEFAULT_TOTAL = 16
+
+current_priority: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "logspyq_priority", default=INTERACTIVE
+)
+current_agent: contextvars.ContextVar[str] = contextvars.ContextVar("logspyq_agent", default="")
+
+
+def check_priority(priority: str) -> str:
+    if priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of {PRIORITIES}, got {priority!r}")
+    return priority
+
+
+@contextlib.contextmanager
+def scheduling(priority: Optional[str] = None, agent: Optional[str] = None):
+    """
+    Classify the calls made inside the block; None keeps the current value.
+
+    Examples:
+        >>> with scheduling(BULK, agent="mirror"):
+        ...     current_priority.get(), current_agent.get()
+        ('bulk', 'mirror')
+        >>> current_priority.get()
+        'interactive'
+    """
+    tokens = []
+    if priority is not None:
+        tokens.append((current_priority, current_priority.set(check_priority(priority))))
+    if agent is not None:
+        tokens.append((current_agent, current_agent.set(agent)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def prioritized(func, priority: str, agent: str):
+    """
+    Wrap a coroutine function (handler or job) so its calls are classified.
+    """
+
+    @functools.wraps(func)
+    async def inner(*args, **kwargs):
+        with scheduling(priority, agent):
+            return await func(*args, **kwargs)
+
+    return inner
+
+
+class OutboundScheduler:
+    """
+    Admission control for calls to Logseq.
+
+    A call is admitted while its class is below its limit and the total is
+    below `total`. Otherwise it waits in a queue per class and agent; when a
+    call finishes, waiters are admitted from the highest class first, taking
+    one call from each agent in turn.
+
+    Examples:
+        >>> async def demo():
+        ...     scheduler = OutboundScheduler(limits={BULK: 1})
+        ...     async with scheduler.slot(BULK, "a"):
+        ...         waiter = asyncio.ensure_future(scheduler.slot(BULK, "b").__aenter__())
+        ...         await asyncio.sleep(0)
+        ...         print(scheduler.queued(BULK), scheduler.active(BULK))
+        ...     await waiter
+        ...     print(scheduler.queued(BULK), scheduler.active(BULK))
+        >>> asyncio.run(demo())
+        1 1
+        0 1
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, total: int = DEFAULT_TOTAL) -> None:
+        self.limits = dict(DEFAULT_LIMITS)
+        for priority, limit in (limits or {}).items():
+            self.limits[check_priority(priority)] = max(1, limit)
+        self.total = max(1, total)
+        self._active = {priority: 0 for priority in PRIORITIES}
+        # Per class: agent -> waiting futures, in the order agents take turns.
+        self._queues: Dict[str, "OrderedDict[str, Deque[asyncio.Future]]"] = {
+            priority: OrderedDict() for priority in PRIORITIES
+        }
+
+    def active(self, priority: str) -> int:
+        return self._active[priority]
+
+    def queued(self, priority: str) -> int:
+        return sum(len(waiters) for waiters in self._queues[priority].values())
+
+    def stats(self) -> dict:
+        return {
+            priority: {
+                "active": self._active[priority],
+                "queued": self.queued(priority),
+                "limit": self.limits[priority],
+            }
+            for priority in PRIORITIES
+        }
+
+    def _can_admit(self, priority: str) -> bool:
+        return self._active[priority] < self.limits[priority] and sum(self._active.values()) < self.total
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: Optional[str] = None, agent: Optional[str] = None):
+        """
+        Hold one of the class's slots for the duration of a call.
+        """
+        priority = check_priority(priority or current_priority.get())
+        agent = current_agent.get() if agent is None else agent
+        if not self._queues[priority] and self._can_admit(priority):
+            self._active[priority] += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._queues[priority].setdefault(agent, deque()).append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Admitted just as we were cancelled: pass the slot on.
+                    self._release(priority)
+                else:
+                    self._forget(priority, agent, waiter)
+                raise
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    def _release(self, priority: str) -> None:
+        self._active[priority] -= 1
+        self._admit_waiters()
+
+    def _forget(self, priority: str, agent: str, waiter: asyncio.Future) -> None:
+        waiters = self._queues[priority].get(agent)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._queues[priority][agent]
+
+    def _admit_waiters(self) -> None:
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and self._can_admit(priority):
+                agent, waiters = queue.popitem(last=False)
+                waiter = waiters.popleft()
+                if waiters:
+                    # The agent goes to the back of the line.
+                    queue[agent] = waiters
+                if waiter.done():
+                    continue
+                self._active[priority] += 1
+                waiter.set_result(None)
@@ -1,5 +1,10 @@
 import importlib
+import logging
 import pkgutil
+import time
+from typing import Callable, Dict, Optional
+
+log = logging.getLogger(__name__)
 
 
 def _iter_namespace(ns_pkg):
@@ -11,31 +16,70 @@ def _iter_namespace(ns_pkg):
     return pkgutil.iter_modules(ns_pkg.__path__, ns_pkg.__name__ + ".")
 
 
-def discover_agents():
+class AgentSpec:
+    """
+    An agent that has been discovered but not imported yet.
+
+    Stands in for the LogseqPlugin in the web UI until the agent is
+    enabled or viewed; `load()` imports it and records the import time.
+    """
+
+    settings = None
+    settings_as_dict: dict = {}
+    settings_schema_as_dict: list = []
+    running = False
+    loaded = False
+
+    def __init__(
+        self,
+        key: str,
+        loader: Callable,
+        name: Optional[str] = None,
+        description: str = "",
+        import_seconds: Optional[float] = None,
+    ) -> None:
+        self.key = key
+        self.name = name or key
+        self.description = description
+        self.enabled = False
+        # Last measured import time, if the agent was ever imported.
+        self.import_seconds = import_seconds
+        self._loader = loader
+
+    def __repr__(self) -> str:
+        return f"AgentSpec({self.key!r}, name={self.name!r})"
+
+    def load(self):
+        """
+        Import the agent and return its LogseqPlugin.
+        """
+        start = time.perf_counter()
+        module = self._loader()
+        self.import_seconds = time.perf_counter() - start
+        # If 'logseq' exists in dir(agent), then extract that as the agent
+        # class. Otherwise, assume the module is the agent class.
+        agent = module.logseq if "logseq" in dir(module) else module
+        agent.import_seconds = self.import_seconds
+        log.info(f"Imported agent {agent.name!r} from {self.key} in {self.import_seconds * 1000:.1f} ms")
+        return agent
+
+
+def discover_agents() -> Dict[str, AgentSpec]:
+    """
+    Find built-in and installed agents without importing them.
+
+    Returns a dict of discovery key (module or entry point name) to spec.
+    """
     import logspyq.agents
 
-    built_in_agents = {
-        name: importlib.import_module(name)
+    agents = {
+        name: AgentSpec(name, lambda name=name: importlib.import_module(name))
         for _finder, name, _ispkg in _iter_namespace(logspyq.agents)
     }
 
     from importlib.metadata import entry_points
     agent_entry_points = entry_points(group='logspyq.agents')
-    installed_agents = {
-        ep.name: ep.load()
-        for ep in agent_entry_points
-    }
-    built_in_agents.update(installed_agents)
-
-    # If 'logseq' exists in dir(agent), then extract that as the agent
-    # class. Otherwise, assume the module is the agent class.
-    agents = {}
-    for name, agent in built_in_agents.items():
-        if 'logseq' in dir(agent):
-            name = agent.logseq.name
-            agents[name] = agent.logseq
-        else:
-            name = agent.name
-            agents[name] = agent
+    for ep in agent_entry_points:
+        agents[ep.name] = AgentSpec(ep.name, ep.load)
 
     return agents
@@ -0,0 +1,99 @@
+"""
+Track what each agent has installed on the server, so registering again
+(e.g. when Logseq reconnects) only installs what is missing.
+"""
+import logging
+from typing import Callable, Dict, Hashable, List
+
+log = logging.getLogger(__name__)
+
+# install() performs the registration and returns a function that undoes it.
+Install = Callable[[], Callable[[], None]]
+
+
+def describe(key: Hashable) -> str:
+    """
+    Readable form of a registration key such as ("job", "interval", func).
+    """
+    if isinstance(key, tuple):
+        return " ".join(getattr(part, "__qualname__", None) or str(part) for part in key)
+    return str(key)
+
+
+class SyncReport:
+    def __init__(self, agent: str) -> None:
+        self.agent = agent
+        self.installed: List[Hashable] = []
+        self.skipped: List[Hashable] = []
+        self.removed: List[Hashable] = []
+
+    def __str__(self) -> str:
+        return (
+            f"{self.agent!r}: {len(self.installed)} installed, "
+            f"{len(self.skipped)} already installed, {len(self.removed)} removed"
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "agent": self.agent,
+            "installed": [describe(key) for key in self.installed],
+            "skipped": [describe(key) for key in self.skipped],
+            "removed": [describe(key) for key in self.removed],
+        }
+
+
+class RegistrationRegistry:
+    """
+    Installed scheduler jobs, event listeners and ready receivers, keyed by
+    agent and then by (kind, event or trigger, callback).
+
+    `sync()` compares what an agent wants with what is installed: missing
+    entries are installed, present ones skipped, and stale ones removed.
+
+    Examples:
+        >>> registry = RegistrationRegistry()
+        >>> installs = []
+        >>> def install():
+        ...     installs.append(1)
+        ...     return lambda: installs.pop()
+        >>> print(registry.sync("agent", {("job", "tick"): install}))
+        'agent': 1 installed, 0 already installed, 0 removed
+        >>> print(registry.sync("agent", {("job", "tick"): install}))
+        'agent': 0 installed, 1 already installed, 0 removed
+        >>> print(registry.sync("agent", {}))
+        'agent': 0 installed, 0 already installed, 1 removed
+        >>> installs
+        []
+    """
+
+    def __init__(self) -> None:
+        self._installed: Dict[str, Dict[Hashable, Callable[[], None]]] = {}
+
+    def installed(self, agent: str) -> List[Hashable]:
+        return list(self._installed.get(agent, {}))
+
+    def sync(self, agent: str, desired: Dict[Hashable, Install]) -> SyncReport:
+        installed = self._installed.setdefault(agent, {})
+        report = SyncReport(agent)
+        for key, install in desired.items():
+            if key in installed:
+                report.skipped.append(key)
+                continue
+            installed[key] = install()
+            report.installed.append(key)
+        for key in [key for key in installed if key not in desired]:
+            uninstall = installed.pop(key)
+            try:
+                uninstall()
+            except Exception:
+                log.exception(f"Error removing {describe(key)} for {agent!r}")
+            report.removed.append(key)
+        if not installed:
+            self._installed.pop(agent, None)
+        return report
+
+    def clear(self, agent: str) -> SyncReport:
+        """
+        Remove everything an agent has installed.
+        """
+        return self.sync(agent, {})
@@ -0,0 +1,144 @@
+"""
+Request/response correlation for the plugin server.
+"""
+import asyncio
+import itertools
+import logging
+from typing import Any, Dict, Iterable, Optional, Set
+
+log = logging.getLogger(__name__)
+
+
+class RequestError(Exception):
+    """
+    Raised when Logseq reports an error for a request.
+    """
+
+
+class ConnectionLost(ConnectionError):
+    """
+    Raised for a request in flight when the Logseq connection it was sent
+    on closes, instead of letting it time out.
+    """
+
+
+class PendingRequests:
+    """
+    Map of in-flight request ids to the futures awaiting their replies.
+
+    Each outgoing request gets a fresh id and an `asyncio.Future`; the
+    socket.io ack callback resolves the future directly, so waiting for a
+    reply costs nothing until it arrives.
+
+    Requests can be bound to the connections they were sent on; when all of
+    those close, `fail_connection()` fails the request right away.
+    """
+
+    def __init__(self) -> None:
+        self._ids = itertools.count(1)
+        self._futures: Dict[int, asyncio.Future] = {}
+        self._sids: Dict[int, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._futures)
+
+    def __contains__(self, request_id: int) -> bool:
+        return request_id in self._futures
+
+    def create(self) -> int:
+        """
+        Register a new in-flight request and return its id.
+        """
+        request_id = next(self._ids)
+        self._futures[request_id] = asyncio.get_running_loop().create_future()
+        return request_id
+
+    def bind(self, request_id: int, sids: Optional[Iterable[str]]) -> None:
+        """
+        Record the connections a request was sent on (None: unknown).
+        """
+        if sids and request_id in self._futures:
+            self._sids[request_id] = set(sids)
+
+    def by_connection(self) -> Dict[str, int]:
+        """
+        Number of requests in flight on each connection.
+        """
+        counts: Dict[str, int] = {}
+        for sids in self._sids.values():
+            for sid in sids:
+                counts[sid] = counts.get(sid, 0) + 1
+        return counts
+
+    def fail_connection(self, sid: str, exc: BaseException) -> int:
+        """
+        Forget a closed connection; fail requests left without any.
+        """
+        failed = 0
+        for request_id, sids in list(self._sids.items()):
+            sids.discard(sid)
+            if not sids:
+                del self._sids[request_id]
+                failed += self.fail(request_id, exc)
+        return failed
+
+    def callback(self, request_id: int):
+        """
+        Return an ack callback that resolves the given request.
+        """
+
+        def ack(*args):
+            self.resolve(request_id, args[0] if args else None)
+
+        return ack
+
+    def resolve(self, request_id: int, response: Any) -> bool:
+        """
+        Resolve a request with its response.
+
+        Returns False if the request is unknown (already timed out or failed).
+        """
+        future = self._futures.get(request_id)
+        if future is None or future.done():
+            log.debug(f"Late or unknown reply for request {request_id}")
+            return False
+        future.set_result(response)
+        return True
+
+    def fail(self, request_id: int, exc: BaseException) -> bool:
+        """
+        Fail a request with an exception.
+        """
+        future = self._futures.get(request_id)
+        if future is None or future.done():
+            return False
+        future.set_exception(exc)
+        return True
+
+    def discard(self, request_id: int) -> None:
+        """
+        Forget a request without resolving it, e.g. after a timeout.
+        """
+        self._sids.pop(request_id, None)
+        future = self._futures.pop(request_id, None)
+        if future is not None and not future.done():
+            future.cancel()
+
+    def fail_all(self, exc: BaseException) -> int:
+        """
+        Fail every in-flight request, e.g. when the connection is lost.
+        """
+        failed = 0
+        for request_id in list(self._futures):
+            failed += self.fail(request_id, exc)
+        return failed
+
+    async def wait(self, request_id: int, timeout: float) -> Any:
+        """
+        Wait for the reply to a request, cleaning up on timeout.
+        """
+        future = self._futures[request_id]
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            self.discard(request_id)
@@ -2,9 +2,14 @@
 Socket.IO server for logspyq plugins.
 """
 import asyncio
-import dbm
+import contextlib
+import functools
 import logging
+import time
+import uuid
+from collections import deque
 from pathlib import Path
+from typing import Dict, Optional, Sequence
 
 import click
 import socketio
@@ -12,14 +17,31 @@ import uvicorn
 # import uvloop
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from async_signals.dispatcher import Signal
-from box import Box, BoxList
-from quart import Quart, render_template, request
+from box import Box
+from quart import Quart, Response, jsonify, render_template, request
 from quart_cors import cors
 
-from logspyq.server.plug import discover_agents
+from logspyq.api.events import EventGate
+from logspyq.api.executor import shutdown_executors
+from logspyq.api.utils import convert_response, unwrap
+from logspyq.server.batch import RequestBatch, current_batch
+from logspyq.server.codec import DEFAULT_PREFERENCE, ConnectionCodecs, decode
+from logspyq.server.connections import ConnectionRegistry, current_sid, routing
+from logspyq.server.metrics import ServerMetrics
+from logspyq.server.mirror import GraphMirror
+from logspyq.server.outbound import OutboundScheduler, current_agent, current_priority
+from logspyq.server.plug import AgentSpec, discover_agents
+from logspyq.server.registry import RegistrationRegistry
+from logspyq.server.rpc import ConnectionLost, PendingRequests, RequestError
+from logspyq.server.store import SettingsStore
+from logspyq.server.timeouts import TimeoutPolicy, is_replayable
 
 log = logging.getLogger(__name__)
 
+# Largest message accepted from Logseq. The engine.io default (1 MB) silently
+# drops large getAllPages/getPageBlocksTree replies.
+MAX_PAYLOAD_BYTES = 64 * 1024 * 1024
+
 
 class PluginServer:
     def __init__(
@@ -28,15 +50,38 @@ class PluginServer:
         log_format: str = "%(levelname)s %(name)35s:%(lineno)03d - %(funcName)-20s - %(message)s",
         agent_name = "",
         agent = None,
+        response_mode: str = "box",
+        isolate_agents: bool = False,
+        codecs: Sequence[str] = DEFAULT_PREFERENCE,
+        outbound_limits: Optional[Dict[str, int]] = None,
+        replay_requests: bool = True,
+        emit_buffer: int = 1000,
     ):
         self._log_level = log_level
         self._log_format = log_format
         self._graph = {}
-        self._db = None
-        self._db_path = Path(click.get_app_dir("logspyq")) / "logspyq.db"
+        self.response_mode = response_mode
+        # Run each agent in its own worker process (see logspyq.server.worker).
+        self.isolate_agents = isolate_agents
+        # Payload encodings offered to Logseq, most preferred first.
+        self.codecs = ConnectionCodecs(codecs)
+        # Connected Logseq windows; calls go to one of them, not to all.
+        self.connections = ConnectionRegistry()
+        # While Logseq reloads: requests wait up to `reconnect_grace`
+        # seconds for it, read-only ones cut off by the disconnect are sent
+        # again, and emits are held in a bounded buffer.
+        self.reconnect_grace = 10.0
+        self.replay_requests = replay_requests
+        self._outbox = deque(maxlen=emit_buffer)
+        self._db_path = Path(click.get_app_dir("logspyq")) / "logspyq.sqlite3"
         self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._store = SettingsStore(
+            self._db_path, legacy_dbm_path=self._db_path.with_name("logspyq.db")
+        )
         self._scheduler = AsyncIOScheduler()
-        self._sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*")
+        self._sio = socketio.AsyncServer(
+            async_mode="asgi", cors_allowed_origins="*", max_http_buffer_size=MAX_PAYLOAD_BYTES
+        )
         self._quart_app = Quart(__name__)
         self._quart_app = cors(self._quart_app)
         self._app = socketio.ASGIApp(self._sio, self._quart_app)
@@ -45,12 +90,30 @@ class PluginServer:
         self._quart_app.route("/agent/<name>")(self._agent)
         self._quart_app.route("/agent/<name>/enable/toggle", methods=["POST"])(self._agent_enable_toggle)
         self._quart_app.route("/agent/<name>/setting", methods=["POST"])(self._agent_settings_update)
+        self._quart_app.route("/metrics")(self._metrics)
+        self._quart_app.route("/debug")(self._debug)
+        self._quart_app.route("/debug/metrics.json")(self._debug_metrics)
+        self._quart_app.route("/debug/primary", methods=["POST"])(self._debug_primary)
         self._sio.on("connect")(self._on_connect)
         self._sio.on("disconnect")(self._on_disconnect)
         self._sio.on("ready")(self._on_ready)
         self._sio.on("graph")(self._on_graph)
+        self._sio.on("codec")(self._on_codec)
         self._sio.on("*")(self._on_any)
         self._signal_ready = Signal()
+        self.registrations = RegistrationRegistry()
+        self._pending = PendingRequests()
+        # Concurrency per priority class for calls to Logseq.
+        self.outbound = OutboundScheduler(limits=outbound_limits)
+        self.metrics = ServerMetrics(
+            in_flight=lambda: len(self._pending), outbound=self.outbound, buffered=lambda: len(self._outbox)
+        )
+        # Timeouts and retries of requests that do not pass a timeout.
+        self.timeouts = TimeoutPolicy(self.metrics.rpc_latency)
+        self._listeners = {}
+        # Serializes enabling, disabling and re-registering each agent.
+        self._agent_locks = {}
+        self.mirror = GraphMirror(self)
         if agent_name and agent:
             self._single_agent = True
             self._agents = {agent_name: agent}
@@ -86,9 +149,10 @@ class PluginServer:
         log.info(f"Starting server")
         try:
             log.info(f"Loading database from: {self._db_path}")
-            self._db = dbm.open(str(self._db_path), "c")
+            await self._store.open()
             log.info("Starting scheduler")
             self._scheduler.start()
+            self.metrics.start()
             asyncio.ensure_future(self._load_agents())
             log.info("Starting server")
             uvconfig = uvicorn.config.Config(
@@ -103,39 +167,55 @@ class PluginServer:
         except KeyboardInterrupt:
             log.info("Shutting down server")
         finally:
+            self.metrics.stop()
+            await self._stop_agents()
             log.info("Stopping scheduler")
             self._scheduler.shutdown()
+            shutdown_executors()
             await asyncio.sleep(0.2)
-            if self._db:
-                log.info("Closing database")
-                self._db.close()
-                log.info("Database closed")
+            log.info("Closing database")
+            await self._store.close()
+            log.info("Database closed")
             log.info("Bye!")
 
     async def _load_agents(self):
         """
         Load agents.
+
+        Discovery does not import agents; only enabled agents are imported
+        here, the rest when they are first viewed or enabled.
         """
-        assert self._db is not None
         if not self._agents:
             log.debug("Discovering agents")
-            self._agents = discover_agents()
-            for agent in self._agents.values():
-                log.debug(f"Loading agent: {agent.name}")
-                agent._set_server(self)
-                await self._load_agent_settings_from_db(agent)
-                enabled_key = f"agent:{agent.name}:enabled"
-                if enabled_key in self._db:
-                    enabled = self._db[enabled_key].decode("utf-8")
-                    if enabled == "True":
-                        log.info(f"  {agent.name} is enabled")
-                        agent.enabled = True
-                    else:
-                        log.info(f"  {agent.name} is disabled")
-                        agent.enabled = False
+            specs = discover_agents()
+            for spec in specs.values():
+                meta = self._store.get_agent_meta(spec.key)
+                if meta:
+                    spec.name = meta["name"]
+                    spec.description = meta["description"]
+                    spec.import_seconds = meta["import_seconds"]
+            # Agents enabled before their metadata was recorded (e.g. state
+            # migrated from an older version) can only be matched by importing.
+            known_names = {spec.name for spec in specs.values()}
+            unmatched = set(self._store.enabled_agents()) - known_names
+            for spec in specs.values():
+                enabled = self._store.is_enabled(spec.name)
+                unknown = self._store.get_agent_meta(spec.key) is None
+                if enabled or (unmatched and unknown):
+                    agent = await self._import_agent(spec)
+                    enabled = self._store.is_enabled(agent.name)
+                else:
+                    agent = spec
+                if enabled is True:
+                    log.info(f"  {agent.name} is enabled")
+                    agent.enabled = True
+                elif enabled is False:
+                    log.info(f"  {agent.name} is disabled")
+                    agent.enabled = False
                 else:
                     log.info(f"  {agent.name} is disabled by default")
                     agent.enabled = False
+                self._agents[agent.name] = agent
             log.info(f"Found {len(self._agents)} agents: {', '.join(self._agents.keys()) }")
         else:
             log.info("Skipping agent discovery")
@@ -144,51 +224,135 @@ class PluginServer:
                 log.warning(f"  {agent.name} is disabled, but single agent mode is enabled")
                 agent.enabled = True
 
-    
+    async def _import_agent(self, spec: AgentSpec):
+        """
+        Import a discovered agent and attach it to this server.
+        """
+        log.debug(f"Loading agent: {spec.key}")
+        if self.isolate_agents:
+            from logspyq.server.worker import WorkerAgent
+
+            agent = WorkerAgent(spec, self)
+            await agent.start()
+        else:
+            agent = spec.load()
+            agent._set_server(self)
+        await self._load_agent_settings_from_db(agent)
+        self._store.set_agent_meta(spec.key, agent.name, agent.description, spec.import_seconds)
+        return agent
+
+    async def _get_agent(self, name):
+        """
+        Look up an agent by name, importing it if it was not loaded yet.
+        """
+        agent = self._agents.get(name)
+        if isinstance(agent, AgentSpec):
+            spec = agent
+            agent = await self._import_agent(spec)
+            agent.enabled = spec.enabled
+            # The real name is only known after import.
+            self._agents = {
+                (agent.name if key == name else key): (agent if key == name else value)
+                for key, value in self._agents.items()
+            }
+        return agent
+
     async def _load_agent_settings_from_db(self, agent):
         """
         Load settings from database.
         """
-        assert self._db is not None
         if agent.settings is None:
             log.debug(f"  {agent.name} has no settings")
             return
         log.debug(f"  {agent.name} has settings")
-        for key, _value in agent.settings.__dataclass_fields__.items():
-            db_key = f"agent:{agent.name}:setting:{key}"
-            if db_key in self._db:
-                setattr(agent.settings, key, self._db[db_key].decode("utf-8"))
+        self._store.apply_settings(agent)
+        if self.isolate_agents:
+            await agent.push_settings()
+
+    async def _stop_agents(self):
+        """
+        Stop running agents (and agent worker processes) so their on_stop
+        hooks run before shutdown.
+        """
+        agents = [
+            agent
+            for agent in self._agents.values()
+            if not isinstance(agent, AgentSpec) and (agent.running or self.isolate_agents)
+        ]
+        if agents:
+            log.info(f"Stopping {len(agents)} agents")
+            await asyncio.gather(*[agent.stop() for agent in agents], return_exceptions=True)
+
+    def _agent_lock(self, name: str) -> asyncio.Lock:
+        return self._agent_locks.setdefault(name, asyncio.Lock())
 
     async def _register_agent_callbacks(self):
-        for _name, agent in self._agents.items():
-            await agent.register_callbacks_with_logseq()
+        for name, agent in list(self._agents.items()):
+            if agent.enabled and not isinstance(agent, AgentSpec):
+                async with self._agent_lock(name):
+                    if agent.enabled:
+                        await agent.register_callbacks_with_logseq()
+
+    def set_primary(self, sid: Optional[str]) -> None:
+        """
+        Send jobs, the graph mirror and other calls not made for a window
+        to the window `sid` while it is connected; None goes back to the
+        longest-connected ready window.
+
+        Raises:
+            ValueError: if no window with this sid is connected.
+        """
+        if sid is not None and sid not in self.connections:
+            raise ValueError(f"No Logseq window connected as {sid!r}")
+        self.connections.choose_primary(sid)
 
     async def _on_connect(self, sid, _environ):
         """
         Handle client connect.
         """
+        self.codecs.connect(sid)
+        self.connections.connect(sid)
         log.info(f"Logseq instance {sid!r} connected")
 
     async def _on_disconnect(self, sid):
         """
         Handle client disconnect.
         """
-        log.info(f"Logseq instance {sid!r} disconnected")
+        self.codecs.disconnect(sid)
+        self.connections.disconnect(sid)
+        failed = self._pending.fail_connection(sid, ConnectionLost(f"Logseq instance {sid!r} disconnected"))
+        log.info(f"Logseq instance {sid!r} disconnected ({failed} requests cut off)")
 
     async def _on_ready(self, sid):
         """
         Called when a client is ready to receive data.
         """
         log.info(f"Logseq instance {sid!r} ready")
-        await self._register_agent_callbacks()
-        await self._signal_ready.send(sid)
+        self.connections.set_ready(sid)
+        # Hooks are installed in, and ready handlers talk to, this window.
+        with routing(sid):
+            await self._register_agent_callbacks()
+            await self._flush_outbox()
+            if self.mirror.started:
+                # We may have missed changes while disconnected.
+                asyncio.ensure_future(self.mirror.refresh())
+            await self._signal_ready.send(sid)
 
     async def _on_graph(self, sid, data):
         """
-        Handle graph event.
+        Handle graph event, sent on connect and when the window switches
+        graphs.
         """
-        log.info(f"Logseq graph: {data!r}")
+        log.info(f"Logseq graph of {sid!r}: {data!r}")
         self._graph = Box(data)
+        self.connections.set_graph(sid, data)
+
+    async def _on_codec(self, sid, data):
+        """
+        Agree on a payload encoding; the reply names the chosen codec.
+        """
+        codec = self.codecs.negotiate(sid, (data or {}).get("codecs", ()))
+        return {"codec": codec.name}
 
     async def _on_any(self, sid, event: str, *args):
         """
@@ -196,58 +360,324 @@ class PluginServer:
         """
         log.warning(f"*** Unhandled Event: {sid} {event} {args}")
 
+    def add_listener(self, event: str, func, key=None):
+        """
+        Subscribe to a socket.io event without replacing other subscribers.
+
+        Args:
+            event: The name of the event.
+            func: Coroutine function called with (sid, *args).
+            key: Identifies the subscription; adding again with the same key
+                replaces the previous function. Defaults to `func` itself.
+        """
+        listeners = self._listeners.setdefault(event, {})
+        listeners[func if key is None else key] = func
+        if len(listeners) == 1:
+            self._sio.on(event)(self._make_dispatcher(event))
+
+    def remove_listener(self, event: str, key):
+        """
+        Remove a subscription added with `add_listener`.
+        """
+        self._listeners.get(event, {}).pop(key, None)
+
+    def _make_dispatcher(self, event: str):
+        async def timed(func, sid, *args):
+            # Calls the handler makes go back to the window that sent the event.
+            current_sid.set(sid)
+            # Agent listeners are wrapped (see `prioritized`); look through it.
+            gate = getattr(func, "__wrapped__", func)
+            if isinstance(gate, EventGate):
+                # The gate returns at once and runs the handler later; it
+                # reports each run's time itself.
+                gate.on_run = functools.partial(self.metrics.observe_handler, event)
+                return await func(sid, *args)
+            start = time.perf_counter()
+            failed = False
+            try:
+                return await func(sid, *args)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                self.metrics.observe_handler(event, time.perf_counter() - start, failed)
+
+        async def dispatch(sid, *args):
+            listeners = list(self._listeners.get(event, {}).values())
+            if not listeners:
+                # Every subscriber was removed, e.g. its agent was disabled.
+                return
+            args = [decode(arg) for arg in args]
+            results = await asyncio.gather(
+                *[timed(func, sid, *args) for func in listeners], return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    log.error(f"Error handling {event!r}", exc_info=result)
+
+        return dispatch
+
     async def emit(self, name: str, *args, **data):
         """
-        Emit an event to all connected clients.
+        Emit an event to Logseq: the window that sent the event being
+        handled, or the primary one (see logspyq.server.connections).
 
         Args:
             name: The name of the event.
             *args: The arguments to pass to the event.
             **data: The data/opts to pass to the event.
         """
-        data.update({"args": args})
-        await self._sio.emit(name, data)
+        data = unwrap(data)
+        data.update({"args": unwrap(args)})
+        batch = current_batch.get()
+        if batch is not None and batch.active:
+            batch.queue(name, data, expect_reply=False)
+            return
+        await self.emit_raw(name, data)
         log.debug(f"Sent event: {name} {data}")
 
-    async def request(self, name: str, *args, timeout: int = 3, **data):
+    async def emit_raw(self, name: str, data, priority: Optional[str] = None, agent: Optional[str] = None):
+        """
+        Emit a payload as-is, without waiting for a reply.
+
+        `priority` and `agent` default to the caller's context (see
+        logspyq.server.outbound).
+        """
+        if self.connections.disconnected:
+            if len(self._outbox) == self._outbox.maxlen:
+                self.metrics.emits_dropped.inc()
+            self._outbox.append((name, data, priority or current_priority.get(), agent or current_agent.get()))
+            return
+        self.metrics.observe_payload(name, "sent", data)
+        async with self._outbound_slot(priority, agent):
+            await self._send(name, data)
+
+    async def _flush_outbox(self):
+        """
+        Send the emits buffered while no Logseq window was ready.
+        """
+        if self._outbox:
+            log.info(f"Sending {len(self._outbox)} events buffered while disconnected")
+        while self._outbox and not self.connections.disconnected:
+            name, data, priority, agent = self._outbox.popleft()
+            await self.emit_raw(name, data, priority=priority, agent=agent)
+
+    @contextlib.asynccontextmanager
+    async def _outbound_slot(self, priority: Optional[str], agent: Optional[str]):
+        priority = priority or current_priority.get()
+        start = time.perf_counter()
+        async with self.outbound.slot(priority, current_agent.get() if agent is None else agent):
+            self.metrics.observe_outbound_wait(priority, time.perf_counter() - start)
+            yield
+
+    async def _send(self, name: str, data, callback=None):
+        """
+        Emit to the connections the call is routed to (see
+        logspyq.server.connections), encoding the payload once per codec.
+        Returns those connections, or None after a blind broadcast.
+        """
+        sids = self.connections.route(current_sid.get())
+        if sids is None:
+            # No connection known (yet): broadcast, like socket.io would.
+            groups = self.codecs.groups()
+            if groups is None:
+                await self._sio.emit(name, data, callback=callback)
+                return None
+        else:
+            groups = self.codecs.group(sids)
+        for codec, group in groups.items():
+            to = group[0] if len(group) == 1 else group
+            await self._sio.emit(name, codec.encode(data), to=to, callback=callback)
+        return sids
+
+    async def request(
+        self, name: str, *args, timeout: Optional[float] = None, response_mode: Optional[str] = None, **data
+    ):
         """
-        Emit an event and wait for reply from a client.
+        Emit an event and wait for the reply, routed like `emit()`.
 
         Args:
             name: The name of the request.
             *args: The arguments to pass to the request.
-            timeout: The timeout in seconds.
+            timeout: The timeout in seconds; by default it follows the
+                method's observed latency (see `timeouts`).
+            response_mode: "lazy", "box" or "raw"; defaults to the server's.
             **data: The data/opts to pass to the request.
         """
-        response = None
+        log.debug(f"Request: {name!r} <== {args!r}")
+        data = unwrap(data)
+        data.update({"args": unwrap(args)})
+        batch = current_batch.get()
+        if batch is not None and batch.active:
+            future = batch.queue(name, data, expect_reply=True, response_mode=response_mode)
+            if batch.is_owner():
+                # Awaited directly inside the batch: send what we have now.
+                await batch.flush()
+            return await future
+        response = await self.request_raw(name, data, timeout=timeout)
+        log.debug(f"Response: {response!r}")
+        return self.convert_response(response, response_mode)
+
+    async def request_raw(
+        self,
+        name: str,
+        data,
+        timeout: Optional[float] = None,
+        priority: Optional[str] = None,
+        agent: Optional[str] = None,
+    ):
+        """
+        Emit a payload as-is and wait for the unconverted reply.
 
-        async def set_response(r):
-            nonlocal response
-            response = r
+        Without a timeout, the method's timeout policy applies and read-only
+        requests are retried after timing out; an explicit timeout is a hard
+        limit for a single attempt.
 
-        async def wait_loop():
-            while not response:
-                await asyncio.sleep(0.001)
-            return response
+        While Logseq is reconnecting, the request waits for it. If the
+        connection closes while the request is in flight, it fails with
+        ConnectionLost, or is sent once more if it is read-only and
+        `replay_requests` is on.
 
-        log.debug(f"Request: {name!r} <== {args!r}")
-        data.update({"args": args})
-        await self._sio.emit(name, data, callback=set_response)
+        Args:
+            name: The name of the request.
+            data: The payload to send.
+            timeout: The timeout in seconds, counted once the request has
+                a slot.
+            priority: "interactive", "background" or "bulk"; defaults to
+                the caller's context.
+            agent: The agent making the request, for fair queuing.
+        """
+        attempts = 1 if timeout is not None else self.timeouts.attempts(name)
+        attempt, replayed = 0, False
+        while True:
+            await self._wait_for_logseq(name)
+            try:
+                async with self._outbound_slot(priority, agent):
+                    return await self._request_raw(
+                        name, data, timeout if timeout is not None else self.timeouts.timeout(name, attempt)
+                    )
+            except TimeoutError:
+                attempt += 1
+                if attempt == attempts:
+                    raise
+                delay = self.timeouts.retry_delay(attempt)
+                log.warning(f"Retrying {name!r} in {delay:.2f}s (attempt {attempt + 1} of {attempts})")
+                self.metrics.rpc_retries.inc(name)
+                await asyncio.sleep(delay)
+            except ConnectionLost:
+                if replayed or not (self.replay_requests and is_replayable(name, data)):
+                    raise
+                replayed = True
+                log.info(f"Connection lost during {name!r}, sending it again once Logseq is back")
+                self.metrics.rpc_replays.inc(name)
+
+    async def _wait_for_logseq(self, name: str):
+        if self.connections.disconnected and not await self.connections.wait_ready(self.reconnect_grace):
+            raise ConnectionLost(f"Logseq did not reconnect within {self.reconnect_grace:g}s: {name!r}")
+
+    async def _request_raw(self, name: str, data, timeout: float):
+        request_id = self._pending.create()
+        self.metrics.observe_payload(name, "sent", data)
+        start = time.perf_counter()
         try:
-            await asyncio.wait_for(wait_loop(), timeout=timeout)
-            log.debug(f"Response: {response!r}")
-            if isinstance(response, dict):
-                return Box(response)
-            elif isinstance(response, list):
-                return BoxList(response)
-            elif isinstance(response, str) and response == "null":
-                return None
-            else:
-                return response
+            sids = await self._send(name, data, callback=self._pending.callback(request_id))
+            self._pending.bind(request_id, sids)
+            response = decode(await self._pending.wait(request_id, timeout=timeout))
         except asyncio.TimeoutError:
-            error_message = f"Request timed out: {name!r} {args!r}"
+            self.metrics.rpc_timeouts.inc(name)
+            # Counted as at least the timeout: leaving stalls out would keep
+            # the observed p99, and so the next timeout, too short.
+            self.metrics.observe_request(name, max(timeout, time.perf_counter() - start))
+            error_message = f"Request timed out after {timeout:g}s: {name!r} {data.get('args')!r}"
             log.error(error_message)
             raise TimeoutError(error_message)
+        except ConnectionLost:
+            self.metrics.rpc_interrupted.inc(name)
+            raise
+        except Exception:
+            self.metrics.rpc_errors.inc(name)
+            raise
+        finally:
+            self._pending.discard(request_id)
+        self.metrics.observe_request(name, time.perf_counter() - start)
+        self.metrics.observe_payload(name, "received", response)
+        return response
+
+    async def stream(
+        self,
+        source: str,
+        *args,
+        chunk_size: int = 100,
+        timeout: float = 30,
+        response_mode: Optional[str] = None,
+    ):
+        """
+        Iterate over a large result in bounded chunks.
+
+        Logseq keeps the result and hands out `chunk_size` items per
+        "stream.next" request. One chunk is fetched ahead while the caller
+        works through the current one, so memory stays flat and the first
+        items arrive after a single small frame.
+
+        Args:
+            source: "Editor.getAllPages" or "Editor.getPageBlocksTree".
+            *args: The arguments to pass to the source.
+            chunk_size: Items per frame.
+            timeout: The timeout in seconds for each frame.
+            response_mode: "lazy", "box" or "raw"; defaults to the server's.
+
+        Raises:
+            RequestError: if Logseq cannot open the stream, e.g. for an
+                unknown source.
+        """
+        stream_id = uuid.uuid4().hex
+        opened = await self.request_raw(
+            "stream.open",
+            {"stream": stream_id, "source": source, "args": unwrap(args)},
+            timeout=timeout,
+        )
+        if isinstance(opened, dict) and opened.get("error"):
+            raise RequestError(f"{source}: {opened['error']}")
+        log.debug(f"Stream {stream_id}: opened {source!r} {args!r}")
+
+        def fetch():
+            return asyncio.ensure_future(
+                self.request_raw(
+                    "stream.next", {"stream": stream_id, "chunk_size": chunk_size}, timeout=timeout
+                )
+            )
+
+        pending = fetch()
+        try:
+            while pending is not None:
+                chunk = await pending
+                # Prefetch the next chunk while the caller consumes this one.
+                pending = None if chunk.get("done") else fetch()
+                for item in chunk.get("items") or []:
+                    yield self.convert_response(item, response_mode)
+        finally:
+            if pending is not None:
+                # Caller stopped early: release the result held by Logseq.
+                pending.cancel()
+                await self.emit_raw("stream.close", {"stream": stream_id})
+                log.debug(f"Stream {stream_id}: closed early")
+
+    def batch(self, timeout: float = 10) -> RequestBatch:
+        """
+        Coalesce requests and emits into a single round trip.
+
+        Usage:
+            async with server.batch() as batch:
+                ...
+        """
+        return RequestBatch(self, timeout=timeout)
+
+    def convert_response(self, response, response_mode: Optional[str] = None):
+        """
+        Convert a raw reply from Logseq into lazy views, Box/BoxList or
+        plain values, following `response_mode` or the server default.
+        """
+        return convert_response(response, response_mode or self.response_mode)
 
     def on_cron(self, **kwargs):
         """
@@ -288,7 +718,7 @@ class PluginServer:
             async def _async_inner(*args):
                 return await func(*args)
 
-            self._sio.on(event)(_async_inner)
+            self.add_listener(event, _async_inner)
             return _async_inner
 
         return outer
@@ -308,6 +738,48 @@ class PluginServer:
         return outer
         
 
+    async def _metrics(self):
+        """
+        Metrics in the Prometheus text format.
+        """
+        return Response(self.metrics.render_prometheus(), content_type="text/plain; version=0.0.4")
+
+    async def _debug(self):
+        """
+        Render the debug page.
+        """
+        return await render_template("debug.html")
+
+    async def _debug_primary(self):
+        """
+        Choose the primary Logseq window; an empty sid goes back to the
+        longest-connected ready one.
+        """
+        sid = (await request.form).get("sid") or None
+        try:
+            self.set_primary(sid)
+        except ValueError as e:
+            return str(e), 404
+        return jsonify(self.connections.as_dict())
+
+    async def _debug_metrics(self):
+        """
+        Metrics summary as JSON, for the debug page.
+        """
+        metrics = self.metrics.as_dict()
+        metrics["connections"] = self.connections.as_dict()
+        for sid, count in self._pending.by_connection().items():
+            if sid in metrics["connections"]:
+                metrics["connections"][sid]["in_flight"] = count
+        for method, summary in metrics["requests"].items():
+            summary["timeout"] = self.timeouts.timeout(method) * 1000
+        metrics["write_behind"] = {}
+        for name, agent in self._agents.items():
+            queue = getattr(getattr(agent, "Editor", None), "write_behind", None)
+            if queue is not None:
+                metrics["write_behind"][name] = queue.stats()
+        return jsonify(metrics)
+
     async def _index(self):
         """
         Render the index page.
@@ -318,7 +790,7 @@ class PluginServer:
         """
         Render the agent page.
         """
-        agent = self._agents.get(name)
+        agent = await self._get_agent(name)
         return await render_template("agent.html", agent=agent)
 
     async def _agent_list(self):
@@ -331,13 +803,17 @@ class PluginServer:
         """
         Toggle an agent's enabled state.
         """
-        assert self._db is not None
-        agent = self._agents.get(name)
+        agent = await self._get_agent(name)
         if agent:
-            agent.enabled = not agent.enabled
-            self._db[f"agent:{name}:enabled"] = str(agent.enabled)
-            if agent.enabled:
-                await agent.register_callbacks_with_logseq(fire_ready_now=True)
+            async with self._agent_lock(agent.name):
+                agent.enabled = not agent.enabled
+                # `name` may be the discovery key of an agent imported just now.
+                self._store.set_enabled(agent.name, agent.enabled)
+                if agent.enabled:
+                    # Not triggered by a window: hooks go to all of them.
+                    await agent.register_callbacks_with_logseq(fire_ready_now=True)
+                else:
+                    await agent.stop()
             return await render_template("_include/agent_list_item_status.html", agent=agent)
         else:
             return "Agent not found", 404
@@ -346,13 +822,14 @@ class PluginServer:
         """
         Update an agent's setting.
         """
-        assert self._db is not None
-        agent = self._agents.get(name)
+        agent = await self._get_agent(name)
         if agent:
             data = await request.form 
             if data:
-                for key, value in data.items():
-                    self._db[f"agent:{name}:setting:{key}"] = value
+                try:
+                    self._store.set_settings(agent, dict(data.items()))
+                except ValueError as e:
+                    return f"Invalid value: {e}", 400
                 await self._load_agent_settings_from_db(agent)
                 return "OK"
             else:
@@ -0,0 +1,276 @@
+"""
+Persistent agent state (enabled flag and settings) for the plugin server.
+"""
+import asyncio
+import contextlib
+import dbm
+import json
+import logging
+import sqlite3
+from dataclasses import fields
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+TRUE_STRINGS = {"true", "yes", "on", "1"}
+FALSE_STRINGS = {"false", "no", "off", "0", ""}
+
+
+def coerce(value: Any, type_: Any) -> Any:
+    """
+    Convert a stored or submitted value to a settings field type.
+
+    Examples:
+        >>> coerce("False", bool), coerce("5", int), coerce("1.5", float)
+        (False, 5, 1.5)
+        >>> coerce('{"a": 1}', dict)
+        {'a': 1}
+    """
+    if type_ in ("bool", bool):
+        if isinstance(value, str):
+            lowered = value.strip().lower()
+            if lowered in TRUE_STRINGS:
+                return True
+            if lowered in FALSE_STRINGS:
+                return False
+            raise ValueError(f"Not a boolean: {value!r}")
+        return bool(value)
+    if type_ in ("int", int):
+        return int(value)
+    if type_ in ("float", float):
+        return float(value)
+    if type_ in ("dict", dict):
+        return json.loads(value) if isinstance(value, str) else dict(value)
+    if type_ in ("str", str):
+        return value if isinstance(value, str) else str(value)
+    return value
+
+
+class SettingsStore:
+    """
+    In-memory cache in front of a SQLite (WAL) database.
+
+    Everything is read once when the store opens; lookups never touch the
+    disk. Writes update the cache immediately and are flushed in batches
+    from a worker thread, so the event loop never blocks on I/O.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS agents (
+            name TEXT PRIMARY KEY,
+            enabled INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS agent_meta (
+            key TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL,
+            import_seconds REAL
+        );
+        CREATE TABLE IF NOT EXISTS settings (
+            agent TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (agent, key)
+        );
+    """
+
+    def __init__(self, path: Path, flush_delay: float = 0.5, legacy_dbm_path: Optional[Path] = None) -> None:
+        self.path = Path(path)
+        self.flush_delay = flush_delay
+        self.legacy_dbm_path = legacy_dbm_path
+        self._enabled: Dict[str, bool] = {}
+        self._settings: Dict[str, Dict[str, Any]] = {}
+        self._meta: Dict[str, Dict[str, Any]] = {}
+        self._dirty_enabled: Dict[str, bool] = {}
+        self._dirty_meta: Dict[str, Dict[str, Any]] = {}
+        self._dirty_settings: Dict[Tuple[str, str], Any] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flushing: Optional[asyncio.Future] = None
+        self._conn: Optional[sqlite3.Connection] = None
+
+    # --- Lifecycle ---
+
+    async def open(self) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._open_sync)
+
+    def _open_sync(self) -> None:
+        is_new = not self.path.exists()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        if is_new and self.legacy_dbm_path is not None:
+            self._migrate_dbm(self.legacy_dbm_path)
+        for name, enabled in self._conn.execute("SELECT name, enabled FROM agents"):
+            self._enabled[name] = bool(enabled)
+        for key, name, description, import_seconds in self._conn.execute(
+            "SELECT key, name, description, import_seconds FROM agent_meta"
+        ):
+            self._meta[key] = {"name": name, "description": description, "import_seconds": import_seconds}
+        for agent, key, value in self._conn.execute("SELECT agent, key, value FROM settings"):
+            self._settings.setdefault(agent, {})[key] = json.loads(value)
+        log.debug(f"Loaded {len(self._enabled)} agents, {len(self._settings)} agent settings")
+
+    def _migrate_dbm(self, dbm_path: Path) -> None:
+        """
+        Import agent state from the dbm database used by earlier versions.
+        """
+        if dbm.whichdb(str(dbm_path)) in (None, ""):
+            return
+        assert self._conn is not None
+        log.info(f"Migrating settings from {dbm_path}")
+        with dbm.open(str(dbm_path), "r") as db:
+            with self._conn:
+                for raw_key in db.keys():
+                    key = raw_key.decode("utf-8")
+                    value = db[raw_key].decode("utf-8")
+                    parts = key.split(":", 3)
+                    if len(parts) == 3 and parts[0] == "agent" and parts[2] == "enabled":
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO agents (name, enabled) VALUES (?, ?)",
+                            (parts[1], value == "True"),
+                        )
+                    elif len(parts) == 4 and parts[0] == "agent" and parts[2] == "setting":
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO settings (agent, key, value) VALUES (?, ?, ?)",
+                            (parts[1], parts[3], json.dumps(value)),
+                        )
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # --- Reads (cache only) ---
+
+    def is_enabled(self, agent: str) -> Optional[bool]:
+        """
+        Stored enabled flag, or None if the agent was never toggled.
+        """
+        return self._enabled.get(agent)
+
+    def enabled_agents(self) -> List[str]:
+        return [name for name, enabled in self._enabled.items() if enabled]
+
+    def get_agent_meta(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Name, description and import time recorded the last time the agent
+        with this discovery key was imported.
+        """
+        return self._meta.get(key)
+
+    def get_settings(self, agent: str) -> Dict[str, Any]:
+        return dict(self._settings.get(agent, {}))
+
+    def apply_settings(self, agent) -> None:
+        """
+        Copy stored settings onto an agent's settings dataclass, converted
+        to each field's declared type.
+        """
+        if agent.settings is None:
+            return
+        stored = self._settings.get(agent.name, {})
+        for field in fields(agent.settings):
+            if field.name not in stored:
+                continue
+            try:
+                setattr(agent.settings, field.name, coerce(stored[field.name], field.type))
+            except (TypeError, ValueError) as e:
+                log.warning(f"Ignoring stored {agent.name}:{field.name}={stored[field.name]!r}: {e}")
+
+    # --- Writes (cache now, disk later) ---
+
+    def set_enabled(self, agent: str, enabled: bool) -> None:
+        self._enabled[agent] = enabled
+        self._dirty_enabled[agent] = enabled
+        self._schedule_flush()
+
+    def set_agent_meta(self, key: str, name: str, description: str, import_seconds: Optional[float]) -> None:
+        meta = {"name": name, "description": description, "import_seconds": import_seconds}
+        self._meta[key] = meta
+        self._dirty_meta[key] = meta
+        self._schedule_flush()
+
+    def set_settings(self, agent, values: Dict[str, Any]) -> None:
+        """
+        Store submitted values for an agent, typed by its settings dataclass.
+
+        Raises:
+            ValueError: if a value cannot be converted to its field type.
+        """
+        types = {field.name: field.type for field in fields(agent.settings)} if agent.settings else {}
+        typed = {key: coerce(value, types.get(key, str)) for key, value in values.items()}
+        self._settings.setdefault(agent.name, {}).update(typed)
+        for key, value in typed.items():
+            self._dirty_settings[(agent.name, key)] = value
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.flush_delay, lambda: asyncio.ensure_future(self._flush_quietly()))
+
+    async def _flush_quietly(self) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            log.exception("Error saving agent settings; keeping them for the next flush")
+
+    async def flush(self) -> None:
+        """
+        Write pending changes in one transaction, off the event loop.
+
+        If the write fails, the changes stay pending (under any made since)
+        and the error is raised.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flushing is not None:
+            # Serialize flushes so transactions land in order. A failed
+            # flush puts its changes back, so this one writes them.
+            with contextlib.suppress(Exception):
+                await self._flushing
+        if not (self._dirty_enabled or self._dirty_settings or self._dirty_meta) or self._conn is None:
+            return
+        enabled, self._dirty_enabled = self._dirty_enabled, {}
+        settings, self._dirty_settings = self._dirty_settings, {}
+        meta, self._dirty_meta = self._dirty_meta, {}
+        loop = asyncio.get_running_loop()
+        self._flushing = loop.run_in_executor(None, self._write, enabled, settings, meta)
+        try:
+            await self._flushing
+        except Exception:
+            # Changes made while writing are newer; they win.
+            self._dirty_enabled = {**enabled, **self._dirty_enabled}
+            self._dirty_settings = {**settings, **self._dirty_settings}
+            self._dirty_meta = {**meta, **self._dirty_meta}
+            raise
+        finally:
+            self._flushing = None
+        log.debug(f"Flushed {len(enabled)} agent flags, {len(settings)} settings")
+
+    def _write(
+        self,
+        enabled: Dict[str, bool],
+        settings: Dict[Tuple[str, str], Any],
+        meta: Dict[str, Dict[str, Any]],
+    ) -> None:
+        assert self._conn is not None
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO agent_meta (key, name, description, import_seconds) VALUES (?, ?, ?, ?)",
+                [(key, m["name"], m["description"], m["import_seconds"]) for key, m in meta.items()],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO agents (name, enabled) VALUES (?, ?)",
+                [(name, int(value)) for name, value in enabled.items()],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO settings (agent, key, value) VALUES (?, ?, ?)",
+                [(agent, key, json.dumps(value)) for (agent, key), value in settings.items()],
+            )
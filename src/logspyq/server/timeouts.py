@@ -0,0 +1,143 @@
+"""
+Per-method timeouts derived from observed latency, and retries for
+read-only requests.
+
+A single fixed timeout is wrong in both directions: getAllPages on a large
+graph can legitimately take longer, while getEditingBlockContent normally
+answers in milliseconds and is stalled long before 3 seconds have passed.
+`TimeoutPolicy` sets each method's timeout to a multiple of its observed
+p99 round trip, and retries requests that are safe to repeat. The same
+rule decides which requests are replayed after a reconnect.
+"""
+import random
+from typing import Dict, Optional
+
+from logspyq.server.metrics import Histogram
+
+DEFAULT_TIMEOUT = 3.0
+# Until a method has enough samples; these are known to be slow on big graphs.
+INITIAL_TIMEOUTS = {
+    "Editor.getAllPages": 30.0,
+    "Editor.getPageBlocksTree": 10.0,
+    "Editor.getPageLinkedReferences": 10.0,
+    "DB.q": 10.0,
+    "DB.datascriptQuery": 10.0,
+    "DB.customQuery": 10.0,
+}
+# Read-only methods whose names do not start with "get".
+READ_ONLY_METHODS = frozenset({"DB.q", "DB.datascriptQuery", "DB.customQuery", "Editor.checkEditing"})
+# Never repeated, even if a name matches otherwise: these change the graph
+# or the UI, and Logseq may have applied the first attempt.
+WRITE_PREFIXES = (
+    "insert", "update", "upsert", "remove", "delete", "move", "create", "rename",
+    "set", "append", "prepend", "edit", "exit", "open", "select", "register", "show",
+)
+
+
+def is_idempotent(name: str) -> bool:
+    """
+    Whether a request can be sent again after a timeout.
+
+    Examples:
+        >>> is_idempotent("Editor.getBlock"), is_idempotent("DB.datascriptQuery")
+        (True, True)
+        >>> is_idempotent("Editor.insertBlock"), is_idempotent("batch"), is_idempotent("stream.next")
+        (False, False, False)
+    """
+    if name in READ_ONLY_METHODS:
+        return True
+    namespace, _, method = name.rpartition(".")
+    if not namespace or method.startswith(WRITE_PREFIXES):
+        return False
+    return method.startswith("get")
+
+
+def is_replayable(name: str, data) -> bool:
+    """
+    Whether a request can be sent again after its connection closed: an
+    idempotent request, or a batch of idempotent calls.
+
+    Examples:
+        >>> is_replayable("batch", {"calls": [{"name": "Editor.getPage"}, {"name": "DB.q"}]})
+        True
+        >>> is_replayable("batch", {"calls": [{"name": "Editor.getPage"}, {"name": "Editor.updateBlock"}]})
+        False
+    """
+    if name == "batch":
+        calls = (data or {}).get("calls") or ()
+        return bool(calls) and all(is_idempotent(call.get("name", "")) for call in calls)
+    return is_idempotent(name)
+
+
+class TimeoutPolicy:
+    """
+    Timeouts and retries for requests without an explicit timeout.
+
+    Once a method has `min_samples` replies, its timeout is `multiplier`
+    times the `quantile` of its latency, clamped to [minimum, maximum].
+    Before that, INITIAL_TIMEOUTS or `default` applies.
+
+    Idempotent methods are retried `retries` times after a timeout, each
+    attempt with twice the previous timeout, after a jittered exponential
+    backoff starting at `backoff` seconds.
+
+    Examples:
+        >>> latency = Histogram("latency", "", ("method",))
+        >>> policy = TimeoutPolicy(latency, min_samples=3)
+        >>> policy.timeout("Editor.getEditingBlockContent")
+        3.0
+        >>> for _ in range(3):
+        ...     latency.observe(0.004, "Editor.getEditingBlockContent")
+        >>> policy.timeout("Editor.getEditingBlockContent")
+        0.5
+        >>> policy.attempts("Editor.getBlock"), policy.attempts("Editor.insertBlock")
+        (3, 1)
+    """
+
+    def __init__(
+        self,
+        latency: Histogram,
+        default: float = DEFAULT_TIMEOUT,
+        initial: Optional[Dict[str, float]] = None,
+        quantile: float = 0.99,
+        multiplier: float = 4.0,
+        minimum: float = 0.5,
+        maximum: float = 60.0,
+        min_samples: int = 20,
+        retries: int = 2,
+        backoff: float = 0.2,
+    ) -> None:
+        self.latency = latency
+        self.default = default
+        self.initial = dict(INITIAL_TIMEOUTS if initial is None else initial)
+        self.quantile = quantile
+        self.multiplier = multiplier
+        self.minimum = minimum
+        self.maximum = maximum
+        self.min_samples = min_samples
+        self.retries = retries
+        self.backoff = backoff
+        # Fixed timeouts that override the observed latency.
+        self.overrides: Dict[str, float] = {}
+
+    def timeout(self, name: str, attempt: int = 0) -> float:
+        """
+        Timeout in seconds for the given attempt (0 for the first).
+        """
+        if name in self.overrides:
+            base = self.overrides[name]
+        elif self.latency.count(name) >= self.min_samples:
+            observed = self.latency.quantile(self.quantile, name) * self.multiplier
+            base = min(max(observed, self.minimum), self.maximum)
+        else:
+            base = self.initial.get(name, self.default)
+        return min(base * 2 ** attempt, max(base, self.maximum))
+
+    def attempts(self, name: str) -> int:
+        return 1 + self.retries if is_idempotent(name) else 1
+
+    def retry_delay(self, attempt: int) -> float:
+        """
+        Seconds to wait before attempt number `attempt` (1 for the first retry).
+        """
+        return self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.0)
@@ -0,0 +1,509 @@
+"""
+Run agents in worker processes, one process per agent.
+
+The main server keeps the socket.io connection to Logseq. Each worker
+imports a single agent and talks to the main server over its stdin and
+stdout, one JSON message per line. Editor/App/DB calls made by the agent
+are forwarded to Logseq by the main server, and the events the agent
+subscribed to are forwarded back. A blocking or CPU-heavy agent then
+stalls only its own process, not the other agents or the socket.io
+heartbeat.
+
+Usage:
+    logspyq --isolate-agents
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+from dataclasses import asdict, fields, make_dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from async_signals.dispatcher import Signal
+
+from logspyq.api.settings import schema_as_dict, setting
+from logspyq.server.connections import current_sid, routing
+from logspyq.server.metrics import ServerMetrics
+from logspyq.server.mirror import GraphMirror
+from logspyq.server.outbound import current_priority
+from logspyq.server.plug import AgentSpec, discover_agents
+from logspyq.server.registry import RegistrationRegistry
+from logspyq.server.rpc import ConnectionLost, PendingRequests, RequestError
+from logspyq.server.server import PluginServer
+
+log = logging.getLogger(__name__)
+
+# Longest message line accepted on a channel; large page trees fit easily.
+LINE_LIMIT = 64 * 1024 * 1024
+# Error types that keep their class when sent across a channel.
+ERROR_TYPES = {"TimeoutError": TimeoutError, "RequestError": RequestError, "ConnectionLost": ConnectionLost}
+SETTING_TYPES = {"str": str, "int": int, "float": float, "bool": bool, "dict": dict}
+
+
+class ChannelClosed(ConnectionError):
+    """
+    Raised for calls that cannot complete because the other end went away.
+    """
+
+
+class Channel:
+    """
+    Bidirectional RPC over a pair of asyncio streams, one JSON object per line.
+
+    Messages:
+        {"id": 1, "method": "request", "params": {...}}   call, expects a reply
+        {"method": "emit", "params": {...}}               notification
+        {"id": 1, "result": ...}                          reply
+        {"id": 1, "error": "...", "type": "TimeoutError"}  failed reply
+
+    Calls are handled in their own tasks so a slow handler does not hold up
+    the channel. Notifications are handled in the order they arrive.
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        handlers: Dict[str, Callable[..., Awaitable[Any]]],
+    ) -> None:
+        self._reader = reader
+        self._writer = writer
+        self._handlers = handlers
+        self._pending = PendingRequests()
+        self._tasks: Set[asyncio.Task] = set()
+        self.closed = False
+
+    async def call(self, method: str, timeout: Optional[float] = None, **params) -> Any:
+        """
+        Call a handler on the other end and wait for its result.
+        """
+        if self.closed:
+            raise ChannelClosed(f"Channel closed, cannot call {method!r}")
+        request_id = self._pending.create()
+        self._send({"id": request_id, "method": method, "params": params})
+        return await self._pending.wait(request_id, timeout=timeout)
+
+    def notify(self, method: str, **params) -> None:
+        """
+        Send a message that expects no reply; never blocks.
+        """
+        if self.closed:
+            log.debug(f"Channel closed, dropping {method!r}")
+            return
+        self._send({"method": method, "params": params})
+
+    def _send(self, message: dict) -> None:
+        self._writer.write(json.dumps(message, default=str).encode("utf-8") + b"\n")
+
+    async def serve(self) -> None:
+        """
+        Read and dispatch messages until the other end closes the stream.
+        """
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    log.error(f"Malformed channel message: {line[:200]!r}")
+                    continue
+                if "method" not in message:
+                    self._on_reply(message)
+                elif message.get("id") is None:
+                    await self._on_notify(message)
+                else:
+                    task = asyncio.ensure_future(self._on_call(message))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._pending.fail_all(ChannelClosed("Channel closed"))
+        for task in self._tasks:
+            task.cancel()
+        try:
+            self._writer.close()
+        except (OSError, RuntimeError):
+            pass
+
+    def _on_reply(self, message: dict) -> None:
+        request_id = message.get("id")
+        if "error" in message:
+            error_type = ERROR_TYPES.get(message.get("type"), RequestError)
+            self._pending.fail(request_id, error_type(message["error"]))
+        else:
+            self._pending.resolve(request_id, message.get("result"))
+
+    async def _on_notify(self, message: dict) -> None:
+        try:
+            await self._handler(message["method"])(**message.get("params", {}))
+        except Exception:
+            log.exception(f"Error handling {message['method']!r} notification")
+
+    async def _on_call(self, message: dict) -> None:
+        try:
+            result = await self._handler(message["method"])(**message.get("params", {}))
+        except Exception as e:
+            if not isinstance(e, tuple(ERROR_TYPES.values())):
+                log.exception(f"Error handling {message['method']!r} call")
+            reply = {"id": message["id"], "error": str(e), "type": type(e).__name__}
+        else:
+            reply = {"id": message["id"], "result": result}
+        if not self.closed:
+            self._send(reply)
+
+    def _handler(self, method: str):
+        handler = self._handlers.get(method)
+        if handler is None:
+            raise RequestError(f"Unknown channel method: {method!r}")
+        return handler
+
+
+# --- Main process ---
+
+
+class WorkerAgent:
+    """
+    Stands in for an agent running in a worker process.
+
+    The web UI and settings store use it like a LogseqPlugin: it mirrors the
+    agent's name, description and settings, and forwards registration,
+    settings and events to the worker.
+    """
+
+    loaded = True
+
+    def __init__(self, spec: AgentSpec, server) -> None:
+        self.key = spec.key
+        self.name = spec.name
+        self.description = spec.description
+        self.import_seconds = spec.import_seconds
+        self.enabled = False
+        self.running = False
+        self.settings: Optional[Any] = None
+        self._server = server
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._channel: Optional[Channel] = None
+        self._serving: Optional[asyncio.Task] = None
+        self._listening: Set[str] = set()
+        self._stopping = False
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self._process.pid if self._process else None
+
+    @property
+    def alive(self) -> bool:
+        return (
+            self._process is not None
+            and self._process.returncode is None
+            and self._channel is not None
+            and not self._channel.closed
+        )
+
+    @property
+    def settings_as_dict(self):
+        return asdict(self.settings) if self.settings else {}
+
+    @property
+    def settings_schema_as_dict(self):
+        return schema_as_dict(self.settings)
+
+    async def start(self) -> None:
+        """
+        Spawn the worker and wait until it has imported the agent.
+        """
+        self._process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "logspyq.server.worker",
+            self.key,
+            str(logging.getLogger().getEffectiveLevel()),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            limit=LINE_LIMIT,
+        )
+        self._channel = Channel(
+            self._process.stdout,
+            self._process.stdin,
+            {"request": self._request, "emit": self._emit, "listen": self._listen},
+        )
+        self._serving = asyncio.ensure_future(self._serve())
+        self._listening = set()
+        self._stopping = False
+        info = await self._channel.call("describe")
+        self.name = info["name"]
+        self.description = info["description"]
+        self.import_seconds = info["import_seconds"]
+        if info["settings"] is not None:
+            self.settings = _settings_class(info["settings"])(
+                **{field["name"]: field["value"] for field in info["settings"]}
+            )
+        log.info(f"Started worker {self.pid} for agent {self.name!r}")
+
+    async def _serve(self) -> None:
+        await self._channel.serve()
+        if self._process.returncode is None:
+            await self._process.wait()
+        self.running = False
+        if not self._stopping:
+            log.warning(f"Worker {self._process.pid} for {self.name!r} exited ({self._process.returncode})")
+
+    async def stop(self, timeout: float = 5) -> None:
+        """
+        Stop the agent (running its on_stop hooks), close the channel and
+        wait for the worker to exit. Registering again restarts it.
+        """
+        self.running = False
+        self._server._signal_ready.disconnect(self._forward_ready, dispatch_uid=("worker", self.key))
+        for event in self._listening:
+            self._server.remove_listener(event, ("worker", self.key))
+        self._listening = set()
+        if self._process is None or self._process.returncode is not None:
+            return
+        self._stopping = True
+        if self.alive:
+            try:
+                await self._channel.call("stop", timeout=timeout)
+            except Exception:
+                log.exception(f"Error stopping agent {self.name!r} in worker {self._process.pid}")
+        self._channel.close()
+        try:
+            await asyncio.wait_for(self._process.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            log.warning(f"Worker {self._process.pid} for {self.name!r} did not exit, killing it")
+            self._process.kill()
+            await self._process.wait()
+
+    async def push_settings(self) -> None:
+        """
+        Send the current settings values to the worker.
+        """
+        if self.settings is not None and self.alive:
+            await self._channel.call("settings", values=asdict(self.settings))
+
+    async def register_callbacks_with_logseq(self, fire_ready_now=False):
+        if not self.enabled:
+            log.debug(f"Skipping {self.name!r}")
+            return
+        if not self.alive:
+            log.info(f"Restarting worker for {self.name!r}")
+            await self.start()
+            await self.push_settings()
+        self._server._signal_ready.connect(self._forward_ready, dispatch_uid=("worker", self.key))
+        await self._channel.call("register", fire_ready_now=fire_ready_now, sid=current_sid.get())
+        self.running = True
+
+    # Calls from the worker
+
+    async def _request(
+        self,
+        name: str,
+        data,
+        request_timeout: Optional[float] = None,
+        priority: Optional[str] = None,
+        sid: Optional[str] = None,
+    ):
+        with routing(sid):
+            return await self._server.request_raw(
+                name, data, timeout=request_timeout, priority=priority, agent=self.name
+            )
+
+    async def _emit(self, name: str, data, priority: Optional[str] = None, sid: Optional[str] = None):
+        with routing(sid):
+            await self._server.emit_raw(name, data, priority=priority, agent=self.name)
+
+    async def _listen(self, event: str):
+        if event in self._listening:
+            return
+        self._listening.add(event)
+
+        async def forward(sid, *args):
+            self._channel.notify("event", event=event, sid=sid, args=list(args))
+
+        self._server.add_listener(event, forward, key=("worker", self.key))
+
+    async def _forward_ready(self, sender=None, **kwargs):
+        if self.alive:
+            self._channel.notify("ready", sid=sender)
+
+
+def _settings_class(settings_fields):
+    """
+    Rebuild an agent's settings dataclass from the fields its worker reported.
+    """
+    return make_dataclass(
+        "Settings",
+        [
+            (
+                field["name"],
+                SETTING_TYPES.get(field["type"], str),
+                setting(default=field["default"], description=field["description"]),
+            )
+            for field in settings_fields
+        ],
+    )
+
+
+# --- Worker process ---
+
+
+class WorkerServer:
+    """
+    Stands in for PluginServer inside a worker process.
+
+    Requests and emits go to the main server over the channel; listeners,
+    the ready signal, the scheduler and the graph mirror are local to the
+    worker, so the agent's handlers and jobs run here.
+    """
+
+    # Request, batching and streaming logic is the same as in the main
+    # server; only emit_raw() and request_raw() differ.
+    emit = PluginServer.emit
+    request = PluginServer.request
+    stream = PluginServer.stream
+    batch = PluginServer.batch
+    convert_response = PluginServer.convert_response
+    _make_dispatcher = PluginServer._make_dispatcher
+
+    def __init__(self, response_mode: str = "box") -> None:
+        self.response_mode = response_mode
+        self._channel: Optional[Channel] = None
+        self._scheduler = AsyncIOScheduler()
+        self._signal_ready = Signal()
+        self.registrations = RegistrationRegistry()
+        self._listeners: Dict[str, dict] = {}
+        self._dispatchers: Dict[str, Callable] = {}
+        # Handler runtimes inside the worker; not exported.
+        self.metrics = ServerMetrics()
+        self.mirror = GraphMirror(self)
+
+    # The main server schedules and routes calls (see logspyq.server.outbound
+    # and .connections); the priority class and the sid of the event being
+    # handled travel with each call, the agent is the worker's.
+
+    async def emit_raw(self, name: str, data, priority: Optional[str] = None, agent: Optional[str] = None):
+        priority = priority or current_priority.get()
+        self._channel.notify("emit", name=name, data=data, priority=priority, sid=current_sid.get())
+
+    async def request_raw(
+        self,
+        name: str,
+        data,
+        timeout: Optional[float] = None,
+        priority: Optional[str] = None,
+        agent: Optional[str] = None,
+    ):
+        # The main server enforces the timeout (or its timeout policy) and
+        # always replies, so the channel call itself does not time out.
+        priority = priority or current_priority.get()
+        return await self._channel.call(
+            "request", name=name, data=data, request_timeout=timeout, priority=priority, sid=current_sid.get()
+        )
+
+    def add_listener(self, event: str, func, key=None):
+        listeners = self._listeners.setdefault(event, {})
+        listeners[func if key is None else key] = func
+        if event not in self._dispatchers:
+            self._dispatchers[event] = self._make_dispatcher(event)
+            self._channel.notify("listen", event=event)
+
+    def remove_listener(self, event: str, key):
+        self._listeners.get(event, {}).pop(key, None)
+
+    async def _on_event(self, event: str, sid: str, args: list):
+        dispatch = self._dispatchers.get(event)
+        if dispatch is not None:
+            asyncio.ensure_future(dispatch(sid, *args))
+
+    async def _on_ready(self, sid: str):
+        with routing(sid):
+            asyncio.ensure_future(self._signal_ready.send(sid))
+
+
+async def _serve_agent(key: str) -> None:
+    # Keep the protocol on the original stdout; anything the agent prints
+    # goes to stderr instead.
+    channel_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb", buffering=0)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=LINE_LIMIT)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, channel_out)
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+
+    server = WorkerServer()
+    spec = discover_agents()[key]
+    agent = spec.load()
+    agent._set_server(server)
+
+    async def describe():
+        settings = None
+        if agent.settings is not None:
+            settings = [
+                {
+                    "name": field.name,
+                    "type": getattr(field.type, "__name__", str(field.type)),
+                    "default": field.metadata.get("default", field.default),
+                    "description": field.metadata.get("description", ""),
+                    "value": getattr(agent.settings, field.name),
+                }
+                for field in fields(agent.settings)
+            ]
+        return {
+            "name": agent.name,
+            "description": agent.description,
+            "import_seconds": spec.import_seconds,
+            "settings": settings,
+        }
+
+    async def apply_settings(values: dict):
+        for name, value in values.items():
+            setattr(agent.settings, name, value)
+
+    async def register(fire_ready_now: bool = False, sid: Optional[str] = None):
+        agent.enabled = True
+        with routing(sid):
+            await agent.register_callbacks_with_logseq(fire_ready_now=fire_ready_now)
+
+    async def stop():
+        agent.enabled = False
+        await agent.stop()
+
+    server._channel = Channel(
+        reader,
+        writer,
+        {
+            "describe": describe,
+            "settings": apply_settings,
+            "register": register,
+            "stop": stop,
+            "event": server._on_event,
+            "ready": server._on_ready,
+        },
+    )
+    server._scheduler.start()
+    try:
+        await server._channel.serve()
+    finally:
+        server._scheduler.shutdown(wait=False)
+
+
+def main() -> None:
+    key = sys.argv[1]
+    level = int(sys.argv[2]) if len(sys.argv) > 2 else logging.INFO
+    logging.basicConfig(level=level, format=f"%(levelname)s [{key}] %(name)s - %(message)s")
+    asyncio.run(_serve_agent(key))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import pytest
+from logspyq.server.server import PluginServer
+
+
+class FakeSocket:
+    """
+    Stands in for the socket.io server: records frames and answers
+    requests the way plugin/index.ts would.
+    """
+
+    def __init__(self, pages=(), trees=None):
+        self.frames = []
+        self.pages = list(pages)
+        self.trees = trees or {}
+        self.streams = {}
+
+    def on(self, event):
+        return lambda func: func
+
+    def call(self, name, data):
+        if name == "Editor.getAllPages":
+            return self.pages
+        if name == "Editor.getPageBlocksTree":
+            return self.trees.get(data["args"][0])
+        if name == "Editor.fail":
+            raise RuntimeError("boom")
+        return {"name": name, "args": data["args"]}
+
+    async def emit(self, name, data=None, callback=None, **kwargs):
+        self.frames.append((name, data))
+        if name == "stream.close":
+            self.streams.pop(data["stream"], None)
+        if callback is None:
+            return
+        if name == "batch":
+            replies = []
+            for call in data["calls"]:
+                try:
+                    replies.append({"result": self.call(call["name"], call["data"])})
+                except RuntimeError as e:
+                    replies.append({"error": str(e)})
+            callback(replies)
+        elif name == "stream.open":
+            source = data["source"]
+            if source not in ("Editor.getAllPages", "Editor.getPageBlocksTree"):
+                callback({"error": f"Unknown stream source: {source}"})
+                return
+            items = self.call(source, {"args": data["args"]}) or []
+            self.streams[data["stream"]] = list(items)
+            callback({"stream": data["stream"], "total": len(items)})
+        elif name == "stream.next":
+            items = self.streams.get(data["stream"], [])
+            chunk, rest = items[: data["chunk_size"]], items[data["chunk_size"] :]
+            if rest:
+                self.streams[data["stream"]] = rest
+            else:
+                self.streams.pop(data["stream"], None)
+            callback({"items": chunk, "done": not rest})
+        else:
+            callback(self.call(name, data))
+
+    def names(self):
+        return [name for name, _data in self.frames]
+
+
+@pytest.fixture
+def fake_socket():
+    return FakeSocket()
+
+
+@pytest.fixture
+def server(fake_socket):
+    server = PluginServer()
+    server._sio = fake_socket
+    return server
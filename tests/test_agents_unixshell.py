@@ -0,0 +1,104 @@
+import asyncio
+
+from logspyq.agents.unixshell.lib import OutputBuffer, execute_command_async
+
+
+async def test_streams_capped_output_until_timeout():
+    updates = []
+
+    async def on_output(partial):
+        updates.append(partial)
+
+    result = await execute_command_async(
+        "yes", timeout=0.5, on_output=on_output, update_interval=0.1, max_bytes=10_000, max_lines=50
+    )
+    assert result.timeout and result.truncated
+    lines = result.stdout.splitlines()
+    assert lines[:50] == ["y"] * 50
+    assert lines[50].startswith("[... output truncated:")
+    assert 1 <= len(updates) <= 6
+    assert updates[0].returncode is None
+
+
+async def test_small_output_is_complete():
+    result = await execute_command_async("seq 3")
+    assert (result.stdout, result.returncode, result.truncated) == ("1\n2\n3", 0, False)
+
+
+async def test_cancelled_command_is_killed(monkeypatch):
+    processes = []
+    create = asyncio.create_subprocess_exec
+
+    async def spawn(*args, **kwargs):
+        processes.append(await create(*args, **kwargs))
+        return processes[-1]
+
+    async def on_output(partial):
+        pass
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", spawn)
+    task = asyncio.ensure_future(execute_command_async("sleep 30", timeout=60, on_output=on_output))
+    await asyncio.sleep(0.2)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert await asyncio.wait_for(processes[0].wait(), 5) == -9
+
+
+def test_buffer_byte_cap_keeps_utf8_intact():
+    buffer = OutputBuffer(max_bytes=5, max_lines=10)
+    buffer.write("aé€b".encode())
+    buffer.write(b"more")
+    assert buffer.size == 5 and buffer.dropped_bytes == 6
+    assert buffer.text.startswith("aé")
+
+
+async def test_shellcheck_results_are_cached(tmp_path, monkeypatch):
+    from logspyq.agents.unixshell import lib
+
+    calls = tmp_path / "calls"
+    fake = tmp_path / "shellcheck"
+    fake.write_text(f"#!/bin/sh\necho run >> {calls}\nsleep 0.1\necho 'SC2086: Double quote'\n")
+    fake.chmod(0o755)
+    monkeypatch.setattr(lib, "SHELLCHECK_PATH", str(fake))
+    monkeypatch.setattr(lib, "SHELLCHECK_CACHE", lib.ShellcheckCache(max_size=2))
+
+    results = await asyncio.gather(*[lib.shellcheck_command("echo $x") for _ in range(5)])
+    assert results == [["SC2086: Double quote"]] * 5
+    assert await lib.shellcheck_command("echo $x") == ["SC2086: Double quote"]
+    assert calls.read_text().count("run") == 1
+
+
+async def test_shellcheck_waiters_survive_a_cancelled_run(tmp_path, monkeypatch):
+    from logspyq.agents.unixshell import lib
+
+    calls = tmp_path / "calls"
+    fake = tmp_path / "shellcheck"
+    fake.write_text(f"#!/bin/sh\necho run >> {calls}\nsleep 0.2\necho 'SC2086: Double quote'\n")
+    fake.chmod(0o755)
+    monkeypatch.setattr(lib, "SHELLCHECK_PATH", str(fake))
+    monkeypatch.setattr(lib, "SHELLCHECK_CACHE", lib.ShellcheckCache())
+
+    first = asyncio.ensure_future(lib.shellcheck_command("echo $x"))
+    await asyncio.sleep(0.05)
+    waiters = [asyncio.ensure_future(lib.shellcheck_command("echo $x")) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await asyncio.gather(*waiters) == [["SC2086: Double quote"]] * 3
+    assert first.cancelled()
+    assert calls.read_text().count("run") == 2
+
+
+async def test_pool_limits_concurrent_processes():
+    from logspyq.agents.unixshell.lib import SubprocessPool
+
+    pool = SubprocessPool(max_processes=2)
+    peak = 0
+
+    async def job():
+        nonlocal peak
+        async with pool.slot():
+            peak = max(peak, pool.running)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*[job() for _ in range(10)])
+    assert peak == 2 and pool.running == 0 and pool.waiting == 0
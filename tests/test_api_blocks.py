@@ -0,0 +1,48 @@
+import itertools
+
+import pytest
+from logspyq.api import LogseqPlugin
+from logspyq.api.blocks import block_spec, chunk_blocks
+
+
+@pytest.fixture
+def plugin(server, fake_socket):
+    ids = itertools.count(1)
+    answer = fake_socket.call
+
+    def flatten(blocks):
+        for block in blocks:
+            yield {"uuid": f"u{next(ids)}", "content": block["content"]}
+            yield from flatten(block.get("children", ()))
+
+    def call(name, data):
+        if name == "Editor.insertBatchBlock":
+            return list(flatten(data["args"][1]))
+        return answer(name, data)
+
+    fake_socket.call = call
+    plugin = LogseqPlugin(name="Test", description="test")
+    plugin._set_server(server)
+    return plugin
+
+
+async def test_insert_blocks_chunks_and_anchors(plugin, fake_socket):
+    blocks = [{"content": f"Result {i}", "properties": {"n": i}, "children": ["Detail"]} for i in range(5)]
+    uuids = await plugin.Editor.insertBlocks("parent", blocks, max_batch_blocks=4)
+    assert uuids == [f"u{i}" for i in range(1, 11)]
+    calls = [data["args"] for name, data in fake_socket.frames if name == "Editor.insertBatchBlock"]
+    assert [len(args[1]) for args in calls] == [2, 2, 1]
+    assert calls[0][0] == "parent" and calls[0][2] == {}
+    # Later chunks go after the previous chunk's last top-level block.
+    assert calls[1][0] == "u3" and calls[1][2] == {"sibling": True}
+    assert calls[2][0] == "u7"
+
+
+def test_block_spec_rejects_missing_content():
+    with pytest.raises(ValueError):
+        block_spec({"properties": {}})
+
+
+def test_oversized_subtree_gets_own_chunk():
+    big = block_spec({"content": "Big", "children": ["x"] * 10})
+    assert [len(chunk) for chunk in chunk_blocks([{"content": "a"}, big, {"content": "b"}], max_blocks=5)] == [1, 1, 1]
@@ -0,0 +1,96 @@
+import time
+
+import pytest
+from logspyq.api.cache import TAG_TREES, ResponseCache
+from logspyq.api.editor import Editor
+
+
+class FakePlugin:
+    def __init__(self):
+        self.cache = ResponseCache(max_size=8, ttl=60)
+        self.requests = []
+
+    async def request(self, name, *args, **kwargs):
+        self.requests.append(name)
+        return {"name": name, "args": args}
+
+    async def emit(self, name, *args, **kwargs):
+        self.requests.append(name)
+
+
+def test_cache_lru_eviction():
+    cache = ResponseCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == (True, 1)
+    cache.set("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_ttl_expiry():
+    cache = ResponseCache(max_size=2, ttl=0.001)
+    cache.set("a", 1)
+    time.sleep(0.01)
+    assert cache.get("a") == (False, None)
+
+
+def test_cache_invalidate_by_tag():
+    cache = ResponseCache()
+    cache.set("block", 1, tags=("uuid-1",))
+    cache.set("tree", 2, tags=(TAG_TREES,))
+    cache.set("other", 3, tags=("uuid-2",))
+    assert cache.invalidate(["uuid-1", TAG_TREES]) == 2
+    assert cache.get("other") == (True, 3)
+
+
+async def test_cached_request_hits():
+    plugin = FakePlugin()
+    editor = Editor(plugin, "Editor")
+    await editor.getBlock("uuid-1")
+    await editor.getBlock("uuid-1")
+    await editor.getBlock("uuid-2")
+    assert plugin.requests == ["Editor.getBlock", "Editor.getBlock"]
+    assert plugin.cache.stats()["hits"] == 1
+    editor.invalidate_cache("uuid-1")
+    await editor.getBlock("uuid-1")
+    assert len(plugin.requests) == 3
+
+
+async def test_own_writes_invalidate_reads():
+    plugin = FakePlugin()
+    editor = Editor(plugin, "Editor")
+    await editor.getBlock("uuid-1")
+    await editor.getPageBlocksTree("page")
+    await editor.updateBlock("uuid-1", "new content")
+    await editor.getBlock("uuid-1")
+    await editor.getPageBlocksTree("page")
+    assert plugin.requests.count("Editor.getBlock") == 2
+    assert plugin.requests.count("Editor.getPageBlocksTree") == 2
+
+    editor.enable_write_behind(interval=None)
+    await editor.upsertBlockProperty("uuid-1", "status", "done")
+    await editor.getBlock("uuid-1")
+    assert plugin.requests.count("Editor.getBlock") == 2
+    await editor.flush()
+    await editor.getBlock("uuid-1")
+    assert plugin.requests.count("Editor.getBlock") == 3
+
+
+async def test_page_writes_invalidate_page_reads():
+    plugin = FakePlugin()
+    editor = Editor(plugin, "Editor")
+    await editor.getPage("old")
+    await editor.getAllPages()
+    await editor.renamePage("old", "new")
+    await editor.getPage("old")
+    await editor.getAllPages()
+    assert plugin.requests.count("Editor.getPage") == 2
+    assert plugin.requests.count("Editor.getAllPages") == 2
+
+    await editor.createPage("other")
+    await editor.getAllPages()
+    await editor.deletePage("other")
+    await editor.getAllPages()
+    assert plugin.requests.count("Editor.getAllPages") == 4
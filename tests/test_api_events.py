@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from logspyq.api import LogseqPlugin
+from logspyq.api.events import EventGate
+
+
+def recorder():
+    calls = []
+
+    async def handler(*args):
+        calls.append(args)
+
+    return calls, handler
+
+
+async def test_debounce_runs_once_after_quiet_window():
+    calls, handler = recorder()
+    gate = EventGate(handler, debounce=0.05)
+    for i in range(20):
+        await gate("sid", {"n": i})
+    await asyncio.sleep(0.1)
+    assert calls == [("sid", {"n": 19})]
+    assert gate.received == 20 and gate.runs == 1
+
+
+async def test_throttle_leading_and_trailing():
+    calls, handler = recorder()
+    gate = EventGate(handler, throttle=0.05)
+    for i in range(10):
+        await gate("sid", i)
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.1)
+    assert calls == [("sid", 0), ("sid", 9)]
+
+
+async def test_merge_coalesces_changed_events():
+    calls, handler = recorder()
+    gate = EventGate(handler, debounce=0.02, coalesce="merge")
+    await gate("sid", {"blocks": [{"uuid": "a", "content": "1"}], "txData": [1]})
+    await gate("sid", {"blocks": [{"uuid": "a", "content": "2"}, {"uuid": "b"}], "txData": [2]})
+    await asyncio.sleep(0.05)
+    assert calls == [("sid", {"blocks": [{"uuid": "a", "content": "2"}, {"uuid": "b"}], "txData": [1, 2]})]
+
+
+async def test_coalesce_without_timing_serializes_runs():
+    calls = []
+
+    async def slow(*args):
+        calls.append(args)
+        await asyncio.sleep(0.02)
+
+    gate = EventGate(slow, coalesce="latest")
+    await gate(0)
+    await asyncio.sleep(0)
+    for i in range(1, 5):
+        await gate(i)
+    await asyncio.sleep(0.1)
+    assert calls == [(0,), (4,)]
+
+
+async def test_gate_options_validated():
+    with pytest.raises(ValueError):
+        EventGate(lambda: None, debounce=1, throttle=1)
+    with pytest.raises(ValueError):
+        EventGate(lambda: None, coalesce="all")
+
+
+async def test_decorators_install_gate():
+    plugin = LogseqPlugin(name="Test", description="test")
+
+    @plugin.DB.onChanged(debounce=0.5, coalesce="merge")
+    async def changed(sid, event):
+        pass
+
+    @plugin.on("route-changed", throttle=1)
+    async def route(sid, event):
+        pass
+
+    assert isinstance(plugin.DB._register_callbacks[("onChanged", "changed")]["func"], EventGate)
+    assert any(isinstance(handler, EventGate) for handler in plugin._events)
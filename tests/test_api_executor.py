@@ -0,0 +1,100 @@
+import asyncio
+import threading
+
+import pytest
+from logspyq.api import LogseqPlugin
+from logspyq.api.executor import call_handler, check_executor
+
+
+def square(x):
+    return x * x
+
+
+@pytest.fixture
+async def plugin(server):
+    plugin = LogseqPlugin(name="Test", description="test")
+    plugin._set_server(server)
+    plugin._loop = asyncio.get_running_loop()
+    return plugin
+
+
+async def test_call_handler_sync_on_loop():
+    assert await call_handler(square, [3]) == 9
+
+
+async def test_call_handler_process():
+    assert await call_handler(square, [4], executor="process") == 16
+
+
+async def test_async_handler_in_thread_routes_api_calls(plugin):
+    main_thread = threading.current_thread()
+
+    async def handler(uuid):
+        assert threading.current_thread() is not main_thread
+        return await plugin.Editor.getBlock(uuid)
+
+    block = await call_handler(handler, ["abc"], executor="thread")
+    assert block["name"] == "Editor.getBlock"
+    assert block["args"][0] == "abc"
+
+
+async def test_sync_handler_in_thread_call_sync(plugin):
+    def handler(uuid):
+        return plugin.call_sync(plugin.Editor.getBlock(uuid))
+
+    block = await call_handler(handler, ["abc"], executor="thread")
+    assert block["args"][0] == "abc"
+    with pytest.raises(RuntimeError):
+        plugin.call_sync(plugin.Editor.getBlock("abc"))
+
+
+async def test_check_executor():
+    async def handler():
+        pass
+
+    check_executor(handler, "thread")
+    with pytest.raises(ValueError):
+        check_executor(handler, "gpu")
+    with pytest.raises(TypeError):
+        check_executor(handler, "process")
+
+
+async def test_decorators_accept_sync_handlers(plugin):
+    @plugin.Editor.registerSlashCommand("Sync", executor="thread")
+    def slash(sid, event):
+        return event
+
+    @plugin.on_interval(executor="process", seconds=60)
+    def job():
+        return 1
+
+    assert job() == 1
+    assert await slash("sid", {"uuid": "abc"}) == {"uuid": "abc"}
+
+
+async def test_event_decorators_take_an_executor(plugin):
+    main_thread = threading.current_thread()
+    threads = []
+
+    @plugin.on("route-changed", executor="thread")
+    def route(sid, event):
+        threads.append(threading.current_thread())
+
+    @plugin.DB.onChanged(executor="thread")
+    def changed(sid, event):
+        threads.append(threading.current_thread())
+
+    @plugin.App.registerPageMenuItem("Export", executor="process")
+    def export(sid, event):
+        return event
+
+    await route("sid", {})
+    await changed("sid", {"blocks": []})
+    assert len(threads) == 2 and main_thread not in threads
+    assert export("sid", 1) == 1
+    with pytest.raises(TypeError):
+        plugin.App.registerUIItem("toolbar", "k", "<a/>", executor="process")(changed_async)
+
+
+async def changed_async(sid, event):
+    pass
@@ -0,0 +1,36 @@
+from logspyq.api.linker import PageLinker, page_names
+
+
+def test_linker_word_boundaries_and_case():
+    linker = PageLinker()
+    linker.update_page(1, ["log"])
+    assert linker.link("Log the logs in a catalog") == "[[log]] the logs in a catalog"
+
+
+def test_linker_longest_match_and_existing_links():
+    linker = PageLinker()
+    linker.update_pages([
+        {"id": 1, "name": "new york"},
+        {"id": 2, "name": "york", "properties": {"alias": ["yorkshire"]}},
+    ])
+    assert linker.link("New York and [[york]] and Yorkshire") == "[[new york]] and [[york]] and [[yorkshire]]"
+
+
+def test_linker_skip_names_and_brackets():
+    linker = PageLinker()
+    linker.update_page(1, ["todo", "a [b]", "later"])
+    assert len(linker) == 0
+    assert linker.link("todo later") == "todo later"
+
+
+def test_linker_rename_and_remove():
+    linker = PageLinker()
+    linker.update_page(1, ["alpha"])
+    linker.update_page(1, ["beta"])
+    assert linker.link("alpha beta") == "alpha [[beta]]"
+    linker.remove_page(1)
+    assert linker.link("alpha beta") == "alpha beta"
+
+
+def test_page_names():
+    assert page_names({"name": "a", "properties": {"aliases": ["b", "c"]}}) == ["a", "b", "c"]
@@ -0,0 +1,48 @@
+import json
+
+import pytest
+from box import Box
+from logspyq.api.utils import LazyBox, LazyList, convert_response, unwrap
+
+
+def test_lazy_box_attribute_access():
+    block = convert_response({"uuid": "a", "properties": {"status": "done"}, "original-name": "A"}, "lazy")
+    assert isinstance(block, LazyBox)
+    assert block.uuid == "a"
+    assert block.properties.status == "done"
+    assert block.original_name == "A"
+    assert "properties" in block
+    with pytest.raises(AttributeError):
+        block.missing
+
+
+def test_lazy_views_do_not_copy():
+    raw = {"children": [{"uuid": "c"}]}
+    block = convert_response(raw, "lazy")
+    block.children[0].content = "x"
+    assert raw["children"][0]["content"] == "x"
+    assert block.children[0] is block.children[0]
+
+
+def test_lazy_list_behaves_like_list():
+    result = convert_response([[{"name": "a"}], [{"name": "b"}]], "lazy")
+    assert isinstance(result, LazyList)
+    assert [page["name"] for page in sum(result, [])] == ["a", "b"]
+    assert result[-1][0].name == "b"
+    assert json.dumps(unwrap(result)) == '[[{"name": "a"}], [{"name": "b"}]]'
+
+
+def test_response_modes():
+    assert convert_response("null") is None
+    assert isinstance(convert_response({"a": 1}, "box"), Box)
+    raw = {"a": 1}
+    assert convert_response(raw, "raw") is raw
+    with pytest.raises(ValueError):
+        convert_response(raw, "eager")
+
+
+def test_default_mode_returns_dicts():
+    block = convert_response({"uuid": "a", "children": [{"uuid": "b"}]})
+    assert isinstance(block, dict) and isinstance(block.children[0], dict)
+    assert json.loads(json.dumps(block)) == {"uuid": "a", "children": [{"uuid": "b"}]}
+    assert isinstance(unwrap(convert_response({"a": {"b": 1}}, "lazy")), dict)
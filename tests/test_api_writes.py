@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from logspyq.api import LogseqPlugin
+from logspyq.api.writes import WriteBehindQueue
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, method, *args):
+        self.calls.append((method, *args))
+
+
+async def test_writes_coalesce_per_block_in_first_write_order():
+    send = Recorder()
+    queue = WriteBehindQueue(send, interval=None)
+    for i in range(10):
+        queue.update_block("a", f"Progress {i}%", {"step": i})
+    queue.upsert_property("b", "status", "running")
+    queue.upsert_property("a", "step", "done")
+    queue.remove_property("b", "status")
+    assert queue.depth == 3
+    assert await queue.flush() == 3
+    assert send.calls == [
+        ("updateBlock", "a", "Progress 9%", {"properties": {}}),
+        ("upsertBlockProperty", "a", "step", "done"),
+        ("removeBlockProperty", "b", "status"),
+    ]
+    assert queue.stats() == {"depth": 0, "queued": 13, "coalesced": 10, "sent": 3}
+
+
+async def test_interval_flush():
+    send = Recorder()
+    queue = WriteBehindQueue(send, interval=0.01)
+    queue.update_block("a", "x", {})
+    await asyncio.sleep(0.05)
+    assert send.calls == [("updateBlock", "a", "x", {"properties": {}})]
+
+
+async def test_failed_flush_keeps_writes():
+    send = Recorder()
+    queue = WriteBehindQueue(send, interval=0.01)
+    failing = True
+
+    async def flaky(method, *args):
+        if failing:
+            raise ConnectionError("Logseq went away")
+        await send(method, *args)
+
+    queue._send = flaky
+    queue.update_block("a", "old", {})
+    queue.upsert_property("a", "status", "running")
+    await asyncio.sleep(0.05)
+    assert queue.depth == 2 and send.calls == []
+
+    queue.upsert_property("a", "status", "done")
+    failing = False
+    assert await queue.flush() == 2
+    assert send.calls == [
+        ("updateBlock", "a", "old", {"properties": {}}),
+        ("upsertBlockProperty", "a", "status", "done"),
+    ]
+
+
+@pytest.fixture
+def plugin(server):
+    plugin = LogseqPlugin(name="Test", description="test")
+    plugin._set_server(server)
+    return plugin
+
+
+async def test_editor_flush_sends_one_batch_frame(plugin, fake_socket):
+    plugin.Editor.enable_write_behind(interval=None)
+    await plugin.Editor.updateBlock("a", "one")
+    await plugin.Editor.updateBlock("a", "two")
+    await plugin.Editor.updateBlock("b", "three")
+    await plugin.Editor.upsertBlockProperty("c", "k", 1)
+    await plugin.Editor.removeBlock("c")
+    assert fake_socket.names() == ["Editor.removeBlock"]
+    assert await plugin.Editor.flush() == 2
+    name, data = fake_socket.frames[-1]
+    assert name == "batch"
+    assert [(call["name"], call["data"]["args"][1]) for call in data["calls"]] == [
+        ("Editor.updateBlock", "two"),
+        ("Editor.updateBlock", "three"),
+    ]
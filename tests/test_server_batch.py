@@ -0,0 +1,28 @@
+import pytest
+from logspyq.server.rpc import RequestError
+
+
+async def test_batch_single_round_trip(server, fake_socket):
+    async with server.batch() as batch:
+        first = batch.add(server.request("Editor.getBlock", "a"))
+        second = batch.add(server.request("Editor.getPage", "b"))
+        await server.emit("Editor.updateBlock", "a", "content")
+    assert fake_socket.names() == ["batch"]
+    _name, frame = fake_socket.frames[0]
+    assert [c["name"] for c in frame["calls"]] == ["Editor.getBlock", "Editor.getPage", "Editor.updateBlock"]
+    assert list(first.result().args) == ["a"]
+    assert second.result().name == "Editor.getPage"
+
+
+async def test_batch_owner_await_flushes(server, fake_socket):
+    async with server.batch():
+        await server.emit("Editor.updateBlock", "a", "content")
+        block = await server.request("Editor.getBlock", "a")
+        assert block.name == "Editor.getBlock"
+    assert fake_socket.names() == ["batch"]
+
+
+async def test_batch_error(server):
+    with pytest.raises(RequestError):
+        async with server.batch() as batch:
+            batch.add(server.request("Editor.fail"))
@@ -0,0 +1,49 @@
+import pytest
+from logspyq.server.codec import CODECS, ConnectionCodecs, negotiate
+from logspyq.server.connections import BROADCAST, routing
+
+msgpack_only = pytest.mark.skipif("msgpack" not in CODECS, reason="msgpack not installed")
+
+
+@msgpack_only
+def test_negotiate_prefers_server_order():
+    assert negotiate(["json", "msgpack"]).name == "msgpack"
+    assert negotiate(["json", "msgpack"], preference=("json",)).name == "json"
+
+
+@msgpack_only
+def test_groups_only_when_binary_in_use():
+    codecs = ConnectionCodecs()
+    codecs.connect("a")
+    codecs.connect("b")
+    assert codecs.groups() is None
+    codecs.negotiate("b", ["msgpack"])
+    assert {codec.name: sids for codec, sids in codecs.groups().items()} == {"json": ["a"], "msgpack": ["b"]}
+    codecs.disconnect("b")
+    assert codecs.groups() is None
+
+
+@msgpack_only
+async def test_payload_encoded_per_connection(server, fake_socket):
+    msgpack = CODECS["msgpack"]
+    await server._on_connect("a", {})
+    await server._on_connect("b", {})
+    assert await server._on_codec("b", {"codecs": ["msgpack", "json"]}) == {"codec": "msgpack"}
+    server.connections.set_ready("a")
+
+    async def emit(name, data=None, to=None, callback=None):
+        fake_socket.frames.append((name, data, to))
+        if isinstance(data, bytes) and callback is not None:
+            callback(msgpack.encode({"from": "b", "args": msgpack.decode(data)["args"]}))
+
+    fake_socket.emit = emit
+    with routing("b"):
+        reply = await server.request("Editor.getBlock", "abc", response_mode="raw")
+    assert reply == {"from": "b", "args": ["abc"]}
+    assert len(fake_socket.frames) == 1 and isinstance(fake_socket.frames[0][1], bytes)
+
+    fake_socket.frames.clear()
+    with routing(BROADCAST):
+        await server.emit("UI.showMsg", "hi")
+    assert fake_socket.frames[0] == ("UI.showMsg", {"args": ["hi"]}, "a")
+    assert isinstance(fake_socket.frames[1][1], bytes) and fake_socket.frames[1][2] == "b"
@@ -0,0 +1,150 @@
+import asyncio
+from collections import deque
+
+import pytest
+from logspyq.api import LogseqPlugin
+from logspyq.server.rpc import ConnectionLost
+
+
+class RoutingSocket:
+    """
+    Records who each frame was sent to and replies with the recipient.
+    """
+
+    def __init__(self):
+        self.frames = []
+
+    def on(self, event):
+        return lambda func: func
+
+    async def emit(self, name, data=None, to=None, callback=None):
+        self.frames.append((name, to))
+        if callback is not None:
+            callback({"sid": to})
+
+
+async def connect(server, *sids):
+    for sid in sids:
+        await server._on_connect(sid, {})
+        await server._on_graph(sid, {"name": f"graph-{sid}"})
+
+
+async def test_handler_calls_go_to_the_triggering_window(server):
+    server._sio = socket = RoutingSocket()
+    await connect(server, "a", "b")
+    plugin = LogseqPlugin(name="Test", description="test", response_mode="raw")
+    plugin._set_server(server)
+    plugin.enabled = True
+    replies = []
+
+    @plugin.Editor.registerSlashCommand("Where")
+    async def where(sid, event):
+        replies.append(await plugin.Editor.getCurrentBlock())
+
+    @plugin.on_interval(seconds=60)
+    async def tick():
+        replies.append(await plugin.Editor.getCurrentBlock())
+
+    # Enabled from the web UI: hooks are installed in every window.
+    server.connections.set_ready("b")
+    await plugin.register_callbacks_with_logseq()
+    assert socket.frames == [("Editor.registerSlashCommand", ["a", "b"])]
+
+    await server._make_dispatcher("slash-command-Where")("a", {"uuid": "x"})
+    # Jobs go to the longest-connected ready window, unless one is chosen.
+    await server._scheduler.get_jobs()[0].func()
+    server.connections.set_ready("a")
+    await server._scheduler.get_jobs()[0].func()
+    server.set_primary("b")
+    await server._scheduler.get_jobs()[0].func()
+    assert replies == [{"sid": "a"}, {"sid": "b"}, {"sid": "a"}, {"sid": "b"}]
+
+
+async def test_ready_window_gets_the_hooks(server):
+    server._sio = socket = RoutingSocket()
+    await connect(server, "a", "b")
+    plugin = LogseqPlugin(name="Test", description="test")
+    plugin.enabled = True
+    server._agents = {plugin.name: plugin}
+    plugin._set_server(server)
+
+    @plugin.Editor.registerSlashCommand("Where")
+    async def where(sid, event):
+        pass
+
+    await server._on_ready("b")
+    assert socket.frames == [("Editor.registerSlashCommand", "b")]
+    assert server.connections.as_dict() == {
+        "a": {"graph": "graph-a", "ready": False, "primary": False},
+        "b": {"graph": "graph-b", "ready": True, "primary": True},
+    }
+
+    await server._on_disconnect("b")
+    assert server.connections.primary().sid == "a"
+
+
+async def test_primary_window_can_be_chosen(server):
+    server._sio = RoutingSocket()
+    await connect(server, "a", "b")
+    server.connections.set_ready("a")
+    server.connections.set_ready("b")
+    with pytest.raises(ValueError):
+        server.set_primary("c")
+
+    client = server._quart_app.test_client()
+    response = await client.post("/debug/primary", form={"sid": "b"})
+    assert (await response.get_json())["b"]["primary"] is True
+    assert await server.request("Editor.getBlock", "x", response_mode="raw") == {"sid": "b"}
+
+    response = await client.post("/debug/primary", form={"sid": ""})
+    assert (await response.get_json())["a"]["primary"] is True
+    assert (await client.post("/debug/primary", form={"sid": "c"})).status_code == 404
+
+
+class SilentSocket(RoutingSocket):
+    """
+    Holds replies back, like a window that is about to reload.
+    """
+
+    async def emit(self, name, data=None, to=None, callback=None):
+        self.frames.append((name, to))
+
+
+async def test_disconnect_fails_writes_and_replays_reads(server):
+    server._sio = socket = SilentSocket()
+    await connect(server, "a")
+    server.connections.set_ready("a")
+    write = asyncio.ensure_future(server.request("Editor.insertBlock", "x", "content"))
+    read = asyncio.ensure_future(server.request("Editor.getBlock", "x", response_mode="raw"))
+    await asyncio.sleep(0.01)
+    assert server._pending.by_connection() == {"a": 2}
+
+    await server._on_disconnect("a")
+    with pytest.raises(ConnectionLost):
+        await write
+    assert not read.done()
+
+    server._sio = RoutingSocket()
+    await connect(server, "b")
+    await server._on_ready("b")
+    assert await read == {"sid": "b"}
+    assert server.metrics.rpc_replays.get("Editor.getBlock") == 1
+    assert socket.frames == [("Editor.insertBlock", "a"), ("Editor.getBlock", "a")]
+
+
+async def test_emits_are_buffered_while_disconnected(server):
+    server._sio = socket = RoutingSocket()
+    server._outbox = deque(maxlen=2)
+    await connect(server, "a")
+    await server._on_disconnect("a")
+    for i in range(3):
+        await server.emit("UI.showMsg", f"message {i}")
+    assert socket.frames == [] and server.metrics.emits_dropped.get() == 1
+
+    server.reconnect_grace = 0.01
+    with pytest.raises(ConnectionLost):
+        await server.request("Editor.getBlock", "x")
+
+    await connect(server, "b")
+    await server._on_ready("b")
+    assert socket.frames == [("UI.showMsg", "b"), ("UI.showMsg", "b")]
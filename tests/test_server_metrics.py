@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+from logspyq.api import LogseqPlugin
+from logspyq.server.metrics import Histogram, ServerMetrics
+
+
+def test_histogram_quantiles():
+    histogram = Histogram("latency_seconds", "Latency", ("method",), buckets=(0.01, 0.1, 1))
+    for _ in range(98):
+        histogram.observe(0.005, "a")
+    histogram.observe(0.5, "a")
+    histogram.observe(0.5, "a")
+    assert histogram.count("a") == 100
+    assert histogram.quantile(0.5, "a") <= 0.01
+    assert 0.1 < histogram.quantile(0.99, "a") <= 1
+    assert histogram.quantile(0.5, "b") is None
+
+
+def test_prometheus_text():
+    metrics = ServerMetrics(size_sample=1, in_flight=lambda: 2)
+    metrics.observe_request("Editor.getBlock", 0.003)
+    metrics.rpc_timeouts.inc("Editor.getBlock")
+    metrics.observe_payload("Editor.getBlock", "received", {"uuid": "abc"})
+    text = metrics.render_prometheus()
+    assert 'logspyq_rpc_latency_seconds_bucket{method="Editor.getBlock",le="0.005"} 1' in text
+    assert 'logspyq_rpc_latency_seconds_count{method="Editor.getBlock"} 1' in text
+    assert 'logspyq_rpc_timeouts_total{method="Editor.getBlock"} 1' in text
+    assert "logspyq_requests_in_flight 2" in text
+    assert metrics.as_dict()["requests"]["Editor.getBlock"]["timeouts"] == 1
+
+
+async def test_server_records_requests_and_handlers(server):
+    await server.request("Editor.getBlock", "abc")
+    calls = []
+
+    async def handler(sid, *args):
+        calls.append(args)
+
+    server.add_listener("changed", handler)
+    await server._make_dispatcher("changed")("sid", {})
+    summary = server.metrics.as_dict()
+    assert summary["requests"]["Editor.getBlock"]["count"] == 1
+    assert summary["handlers"]["changed"]["count"] == 1
+    assert calls == [({},)]
+
+
+async def test_gated_handler_is_timed_when_it_runs(server):
+    plugin = LogseqPlugin(name="Test", description="test")
+    plugin._set_server(server)
+    plugin.enabled = True
+
+    @plugin.DB.onChanged(debounce=0.01)
+    async def changed(sid, event):
+        await asyncio.sleep(0.05)
+
+    await plugin.register_callbacks_with_logseq()
+    await server._make_dispatcher("changed")("sid", {})
+    assert server.metrics.handler_runtime.count("changed") == 0
+    await asyncio.sleep(0.1)
+    assert server.metrics.handler_runtime.count("changed") == 1
+    assert server.metrics.handler_runtime.total("changed") >= 0.05
@@ -0,0 +1,73 @@
+import asyncio
+
+from logspyq.server.mirror import GraphMirror
+
+
+PAGES = [{"id": 1, "uuid": "p1", "name": "todo", "originalName": "TODO"}]
+TREES = {
+    "todo": [
+        {"id": 10, "uuid": "b1", "content": "one", "parent": {"id": 1}, "page": {"id": 1}, "left": {"id": 1},
+         "children": [
+             {"id": 12, "uuid": "b3", "content": "child", "parent": {"id": 10}, "page": {"id": 1}, "left": {"id": 10}},
+         ]},
+        {"id": 11, "uuid": "b2", "content": "two", "parent": {"id": 1}, "page": {"id": 1}, "left": {"id": 10}},
+    ]
+}
+
+
+async def test_mirror_bootstrap_and_query(server, fake_socket):
+    fake_socket.pages, fake_socket.trees = PAGES, TREES
+    mirror = await server.mirror.ready()
+    assert mirror.get_page("TODO").uuid == "p1"
+    assert [b.uuid for b in mirror.page_blocks("todo")] == ["b1", "b2"]
+    assert [b.uuid for b in mirror.children("b1")] == ["b3"]
+    assert "children" not in mirror.get_block("b1")
+    assert fake_socket.names().count("batch") == 1
+
+
+def test_mirror_apply_change():
+    mirror = GraphMirror(server=None)
+    mirror._put_page({"id": 1, "uuid": "p1", "name": "todo"})
+    mirror.apply_change({"blocks": [
+        {"id": 10, "uuid": "b1", "content": "one", "parent": {"id": 1}, "page": {"id": 1}, "left": {"id": 1}},
+    ], "txData": []})
+    assert mirror.get_block("b1").content == "one"
+    mirror.apply_change({"blocks": [
+        {"id": 11, "uuid": "b2", "content": "zero", "parent": {"id": 1}, "page": {"id": 1}, "left": {"id": 1}},
+        {"id": 10, "uuid": "b1", "content": "one!", "parent": {"id": 1}, "page": {"id": 1}, "left": {"id": 11}},
+    ], "txData": []})
+    assert [b.content for b in mirror.page_blocks("todo")] == ["zero", "one!"]
+    mirror.apply_change({"blocks": [], "txData": [[11, "uuid", "b2", 536870913, False]]})
+    assert mirror.get_block("b2") is None
+    assert [b.uuid for b in mirror.page_blocks("todo")] == ["b1"]
+
+
+async def test_mirror_waiters_follow_a_reload(server, fake_socket):
+    fake_socket.pages, fake_socket.trees = PAGES, TREES
+    gate = asyncio.Event()
+    emit = fake_socket.emit
+
+    async def slow_emit(name, data=None, callback=None, **kwargs):
+        if name == "stream.open":
+            await gate.wait()
+        return await emit(name, data, callback=callback, **kwargs)
+
+    fake_socket.emit = slow_emit
+    waiter = asyncio.ensure_future(server.mirror.ready())
+    await asyncio.sleep(0.01)
+    reload = asyncio.ensure_future(server.mirror.refresh())
+    await asyncio.sleep(0.01)
+    gate.set()
+    assert (await waiter).get_page("todo").uuid == "p1"
+    await reload
+    assert await server.mirror.ready() is server.mirror
+
+
+def test_removing_a_page_drops_its_blocks():
+    mirror = GraphMirror(server=None)
+    mirror._put_page(PAGES[0])
+    for block in TREES["todo"]:
+        mirror._put_tree(block)
+    mirror.apply_change({"blocks": [], "txData": [[1, "uuid", "p1", 536870913, False]]})
+    assert mirror.get_block("b1") is None and mirror.get_block("b3") is None
+    assert len(mirror) == 0
@@ -0,0 +1,74 @@
+import asyncio
+
+from logspyq.api import LogseqPlugin
+from logspyq.server.outbound import BACKGROUND, BULK, INTERACTIVE, OutboundScheduler, current_agent, current_priority
+
+
+async def enter(scheduler, order, label, priority, agent):
+    async with scheduler.slot(priority, agent):
+        order.append(label)
+        await asyncio.sleep(0)
+
+
+async def test_interactive_goes_before_background():
+    scheduler = OutboundScheduler(total=1)
+    order = []
+    async with scheduler.slot(BACKGROUND, "a"):
+        tasks = [
+            asyncio.ensure_future(enter(scheduler, order, "bulk", BULK, "a")),
+            asyncio.ensure_future(enter(scheduler, order, "background", BACKGROUND, "a")),
+            asyncio.ensure_future(enter(scheduler, order, "interactive", INTERACTIVE, "b")),
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.stats()[BACKGROUND]["queued"] == 1
+    await asyncio.gather(*tasks)
+    assert order == ["interactive", "background", "bulk"]
+
+
+async def test_agents_take_turns_within_a_class():
+    scheduler = OutboundScheduler(limits={BACKGROUND: 1})
+    order = []
+    async with scheduler.slot(BACKGROUND, "noisy"):
+        tasks = [
+            asyncio.ensure_future(enter(scheduler, order, f"noisy{i}", BACKGROUND, "noisy")) for i in range(3)
+        ]
+        tasks.append(asyncio.ensure_future(enter(scheduler, order, "quiet", BACKGROUND, "quiet")))
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    assert order == ["noisy0", "quiet", "noisy1", "noisy2"]
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    scheduler = OutboundScheduler(limits={BULK: 1})
+    async with scheduler.slot(BULK, "a"):
+        task = asyncio.ensure_future(enter(scheduler, [], "b", BULK, "b"))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.sleep(0)
+        assert scheduler.queued(BULK) == 0
+    assert scheduler.active(BULK) == 0
+
+
+async def test_jobs_and_handlers_are_classified(server):
+    plugin = LogseqPlugin(name="Test", description="test")
+    plugin._set_server(server)
+    plugin.enabled = True
+    seen = []
+
+    @plugin.on_interval(seconds=60)
+    async def tick():
+        seen.append((current_priority.get(), current_agent.get()))
+        await plugin.Editor.getBlock("a")
+
+    @plugin.on("route-changed")
+    async def route(sid, event):
+        seen.append((current_priority.get(), current_agent.get()))
+
+    await plugin.register_callbacks_with_logseq()
+    await server._scheduler.get_jobs()[0].func()
+    await server._make_dispatcher("route-changed")("sid", {})
+    assert seen == [(BACKGROUND, "Test"), (INTERACTIVE, "Test")]
+
+    assert server.metrics.outbound_wait.count(BACKGROUND) == 1
+    assert 'logspyq_outbound_queued{priority="bulk"} 0' in server.metrics.render_prometheus()
+    assert server.metrics.as_dict()["outbound"][BACKGROUND]["limit"] == 4
@@ -1,9 +1,25 @@
+import sys
+
 import pytest
 from logspyq import agents
-from logspyq.server.plug import discover_agents
+from logspyq.server.plug import AgentSpec, discover_agents
 
 
 async def test_plug_discover():
     agents = discover_agents()
-    assert len(agents) == 1  # Update when adding new agents!
-    assert "logspyq.agents.hello" in agents
\ No newline at end of file
+    assert "logspyq.agents.unixshell" in agents
+    assert all(isinstance(spec, AgentSpec) for spec in agents.values())
+
+
+async def test_plug_discover_does_not_import():
+    sys.modules.pop("logspyq.agents.unixshell", None)
+    discover_agents()
+    assert "logspyq.agents.unixshell" not in sys.modules
+
+
+async def test_plug_load_records_import_time():
+    spec = discover_agents()["logspyq.agents.unixshell"]
+    agent = spec.load()
+    assert agent.name
+    assert spec.import_seconds is not None and spec.import_seconds >= 0
+    assert agent.import_seconds == spec.import_seconds
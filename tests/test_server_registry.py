@@ -0,0 +1,74 @@
+from logspyq.api import LogseqPlugin
+
+
+def make_plugin(server):
+    plugin = LogseqPlugin(name="Test", description="test")
+    plugin._set_server(server)
+    plugin.enabled = True
+    plugin.calls = []
+
+    @plugin.Editor.registerSlashCommand("First")
+    async def first(sid, event):
+        plugin.calls.append("First")
+
+    @plugin.Editor.registerSlashCommand("Second")
+    async def second(sid, event):
+        pass
+
+    @plugin.on_interval(seconds=60)
+    async def tick():
+        pass
+
+    @plugin.on("route-changed")
+    async def route(sid, event):
+        pass
+
+    @plugin.on_ready()
+    async def ready():
+        pass
+
+    return plugin
+
+
+async def test_register_twice_installs_once(server):
+    plugin = make_plugin(server)
+    report = await plugin.register_callbacks_with_logseq()
+    assert len(report.installed) == 5 and not report.skipped
+
+    report = await plugin.register_callbacks_with_logseq()
+    assert not report.installed and len(report.skipped) == 5
+    assert len(server._scheduler.get_jobs()) == 1
+    assert sum(len(listeners) for listeners in server._listeners.values()) == 3
+    # Each slash command still runs its handler once per use.
+    await server._make_dispatcher("slash-command-First")("sid", {})
+    assert plugin.calls == ["First"]
+
+
+async def test_clear_removes_everything(server):
+    plugin = make_plugin(server)
+    await plugin.register_callbacks_with_logseq()
+    report = server.registrations.clear(plugin.name)
+    assert len(report.removed) == 5
+    assert server._scheduler.get_jobs() == []
+    assert not any(server._listeners.values())
+    assert server.registrations.installed(plugin.name) == []
+
+
+async def test_stop_removes_handlers_and_runs_hooks(server):
+    plugin = make_plugin(server)
+    stopped = []
+
+    @plugin.on_stop()
+    async def closed():
+        stopped.append(True)
+
+    await plugin.register_callbacks_with_logseq()
+    report = await plugin.stop()
+    assert len(report.removed) == 5 and stopped == [True]
+    assert not plugin.running
+    assert server._scheduler.get_jobs() == []
+    assert not any(server._listeners.values())
+    assert not server._signal_ready.receivers
+
+    report = await plugin.register_callbacks_with_logseq()
+    assert len(report.installed) == 5
@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+from logspyq.server.rpc import PendingRequests
+
+
+async def test_pending_requests_resolve():
+    pending = PendingRequests()
+    request_id = pending.create()
+    assert len(pending) == 1
+    pending.callback(request_id)([])
+    assert await pending.wait(request_id, timeout=1) == []
+    assert len(pending) == 0
+
+
+async def test_pending_requests_falsy_reply():
+    pending = PendingRequests()
+    for value in (False, 0, [], None):
+        request_id = pending.create()
+        asyncio.get_running_loop().call_soon(pending.resolve, request_id, value)
+        assert await pending.wait(request_id, timeout=1) == value
+
+
+async def test_pending_requests_timeout_cleanup():
+    pending = PendingRequests()
+    request_id = pending.create()
+    with pytest.raises(asyncio.TimeoutError):
+        await pending.wait(request_id, timeout=0.01)
+    assert request_id not in pending
+    assert pending.resolve(request_id, "late") is False
@@ -0,0 +1,119 @@
+import asyncio
+import dbm
+import sqlite3
+
+import pytest
+from logspyq.api import LogseqPlugin, setting, settings_schema
+from logspyq.server.plug import AgentSpec
+from logspyq.server.server import PluginServer
+from logspyq.server.store import SettingsStore
+
+
+@settings_schema
+class Settings:
+    max_results: int = setting(default=5, description="Max results")
+    link_pages: bool = setting(default=True, description="Link pages")
+    name: str = setting(default="", description="Name")
+
+
+def make_agent():
+    agent = LogseqPlugin(name="Test Agent", description="test")
+    agent.settings = Settings()
+    return agent
+
+
+async def test_store_typed_settings_round_trip(tmp_path):
+    store = SettingsStore(tmp_path / "store.sqlite3")
+    await store.open()
+    agent = make_agent()
+    store.set_settings(agent, {"max_results": "10", "link_pages": "False", "name": "x"})
+    store.set_enabled(agent.name, True)
+    store.apply_settings(agent)
+    assert agent.settings.max_results == 10
+    assert agent.settings.link_pages is False
+    await store.close()
+
+    reopened = SettingsStore(tmp_path / "store.sqlite3")
+    await reopened.open()
+    assert reopened.is_enabled(agent.name) is True
+    assert reopened.get_settings(agent.name) == {"max_results": 10, "link_pages": False, "name": "x"}
+    await reopened.close()
+
+
+async def test_failed_flush_keeps_changes(tmp_path, monkeypatch):
+    store = SettingsStore(tmp_path / "store.sqlite3", flush_delay=0.01)
+    await store.open()
+    write = store._write
+
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(store, "_write", locked)
+    store.set_enabled("Test Agent", True)
+    with pytest.raises(sqlite3.OperationalError):
+        await store.flush()
+    store.set_enabled("Other Agent", False)
+    await asyncio.sleep(0.05)  # The scheduled flush fails and logs.
+
+    monkeypatch.setattr(store, "_write", write)
+    await store.close()
+    reopened = SettingsStore(tmp_path / "store.sqlite3")
+    await reopened.open()
+    assert reopened.is_enabled("Test Agent") is True
+    assert reopened.is_enabled("Other Agent") is False
+    await reopened.close()
+
+
+async def test_store_migrates_dbm(tmp_path):
+    with dbm.open(str(tmp_path / "legacy.db"), "c") as db:
+        db["agent:Test Agent:enabled"] = "True"
+        db["agent:Test Agent:setting:max_results"] = "7"
+    store = SettingsStore(tmp_path / "store.sqlite3", legacy_dbm_path=tmp_path / "legacy.db")
+    await store.open()
+    agent = make_agent()
+    store.apply_settings(agent)
+    assert store.is_enabled("Test Agent") is True
+    assert agent.settings.max_results == 7
+    await store.close()
+
+
+async def test_store_agent_meta_persists(tmp_path):
+    store = SettingsStore(tmp_path / "store.sqlite3")
+    await store.open()
+    store.set_agent_meta("logspyq.agents.test", "Test Agent", "test", 0.25)
+    await store.close()
+
+    store = SettingsStore(tmp_path / "store.sqlite3")
+    await store.open()
+    assert store.get_agent_meta("logspyq.agents.test") == {
+        "name": "Test Agent",
+        "description": "test",
+        "import_seconds": 0.25,
+    }
+    assert store.get_agent_meta("missing") is None
+    await store.close()
+
+
+async def test_toggle_unloaded_agent_survives_restart(tmp_path, fake_socket):
+    async def start_server():
+        store = SettingsStore(tmp_path / "store.sqlite3")
+        await store.open()
+        server = PluginServer()
+        server._store = store
+        server._sio = fake_socket
+        await server._load_agents()
+        return server
+
+    server = await start_server()
+    assert isinstance(server._agents["logspyq.agents.unixshell"], AgentSpec)
+    async with server._quart_app.app_context():
+        await server._agent_enable_toggle("logspyq.agents.unixshell")
+    agent = server._agents["UNIX Shell"]
+    assert agent.enabled
+    await agent.stop()
+    await server._store.close()
+
+    server = await start_server()
+    agent = server._agents["UNIX Shell"]
+    assert not isinstance(agent, AgentSpec) and agent.enabled
+    await server._store.close()
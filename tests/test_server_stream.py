@@ -0,0 +1,30 @@
+import pytest
+from logspyq.api.plugin import LogseqPlugin
+from logspyq.server.rpc import RequestError
+
+
+async def test_stream_all_pages_in_chunks(server, fake_socket):
+    fake_socket.pages = [{"name": f"page {i}"} for i in range(25)]
+    names = [page.name async for page in server.stream("Editor.getAllPages", chunk_size=10)]
+    assert names == [f"page {i}" for i in range(25)]
+    assert fake_socket.names().count("stream.next") == 3
+    assert not fake_socket.streams
+
+
+async def test_stream_closed_early(server, fake_socket):
+    fake_socket.pages = [{"name": f"page {i}"} for i in range(25)]
+    plugin = LogseqPlugin(name="test", description="test")
+    plugin._set_server(server)
+    pages = plugin.Editor.iterAllPages(chunk_size=10)
+    async for page in pages:
+        break
+    await pages.aclose()
+    assert "stream.close" in fake_socket.names()
+    assert not fake_socket.streams
+
+
+async def test_stream_unknown_source(server, fake_socket):
+    with pytest.raises(RequestError, match="Unknown stream source"):
+        async for page in server.stream("Editor.getEverything"):
+            pass
+    assert "stream.next" not in fake_socket.names()
@@ -0,0 +1,77 @@
+import pytest
+from logspyq.server.metrics import Histogram
+from logspyq.server.timeouts import TimeoutPolicy
+
+
+class StallingSocket:
+    """
+    Drops the first `stalls` requests, then replies to each.
+    """
+
+    def __init__(self, stalls=1):
+        self.stalls = stalls
+        self.frames = []
+
+    async def emit(self, name, data=None, callback=None, **kwargs):
+        self.frames.append(name)
+        if self.stalls:
+            self.stalls -= 1
+        elif callback is not None:
+            callback({"uuid": "a"})
+
+
+def fast_policy(server):
+    server.timeouts.default = 0.05
+    server.timeouts.backoff = 0.001
+
+
+async def test_getter_is_retried_after_timeout(server):
+    server._sio = StallingSocket(stalls=1)
+    fast_policy(server)
+    block = await server.request("Editor.getBlock", "a", response_mode="raw")
+    assert block == {"uuid": "a"}
+    assert server._sio.frames == ["Editor.getBlock", "Editor.getBlock"]
+    assert server.metrics.rpc_retries.get("Editor.getBlock") == 1
+
+
+async def test_writes_and_explicit_timeouts_are_not_retried(server):
+    server._sio = StallingSocket(stalls=2)
+    fast_policy(server)
+    with pytest.raises(TimeoutError):
+        await server.request("Editor.insertBlock", "a", "content")
+    with pytest.raises(TimeoutError):
+        await server.request("Editor.getBlock", "a", timeout=0.05)
+    assert server._sio.frames == ["Editor.insertBlock", "Editor.getBlock"]
+
+
+def test_timeout_follows_observed_latency():
+    latency = Histogram("latency", "", ("method",))
+    policy = TimeoutPolicy(latency, min_samples=10)
+    assert policy.timeout("Editor.getAllPages") == 30
+    for _ in range(10):
+        latency.observe(8, "Editor.getAllPages")
+    # Interpolated inside the 5-10s bucket, but never above the slowest reply.
+    assert policy.timeout("Editor.getAllPages") == 32
+    assert policy.timeout("Editor.getAllPages", attempt=1) == 60
+    policy.overrides["Editor.getAllPages"] = 120
+    assert policy.timeout("Editor.getAllPages") == 120
+
+
+def test_latency_past_the_last_bucket():
+    latency = Histogram("latency", "", ("method",), buckets=(1, 10))
+    policy = TimeoutPolicy(latency, min_samples=10)
+    for _ in range(10):
+        latency.observe(12, "DB.q")
+    assert latency.quantile(0.99, "DB.q") == 12
+    assert policy.timeout("DB.q") == 48
+    latency.observe(90, "DB.q")
+    assert policy.timeout("DB.q") == 60
+
+
+async def test_timed_out_attempts_count_as_slow(server):
+    server._sio = StallingSocket(stalls=1)
+    with pytest.raises(TimeoutError):
+        await server.request("Editor.insertBlock", "a", "content", timeout=0.05)
+    latency = server.metrics.rpc_latency
+    assert latency.count("Editor.insertBlock") == 1
+    assert latency.total("Editor.insertBlock") >= 0.05
@@ -0,0 +1,72 @@
+import asyncio
+import socket
+
+import pytest
+from logspyq.server.plug import discover_agents
+from logspyq.server.rpc import RequestError
+from logspyq.server.worker import Channel, ChannelClosed, WorkerAgent
+
+
+async def channel_pair(left_handlers, right_handlers):
+    left_sock, right_sock = socket.socketpair()
+    left = Channel(*await asyncio.open_unix_connection(sock=left_sock), left_handlers)
+    right = Channel(*await asyncio.open_unix_connection(sock=right_sock), right_handlers)
+    tasks = [asyncio.ensure_future(left.serve()), asyncio.ensure_future(right.serve())]
+    return left, right, tasks
+
+
+async def test_channel_call_and_notify():
+    received = []
+
+    async def add(a, b):
+        return a + b
+
+    async def note(value):
+        received.append(value)
+
+    async def fail():
+        raise TimeoutError("too slow")
+
+    left, right, tasks = await channel_pair({}, {"add": add, "note": note, "fail": fail})
+    assert await left.call("add", a=1, b=2) == 3
+    left.notify("note", value="x")
+    with pytest.raises(TimeoutError):
+        await left.call("fail")
+    with pytest.raises(RequestError):
+        await left.call("missing")
+    assert received == ["x"]
+    left.close()
+    await asyncio.gather(*tasks)
+
+
+async def test_channel_close_fails_pending_calls():
+    async def hang():
+        await asyncio.sleep(10)
+
+    left, right, tasks = await channel_pair({}, {"hang": hang})
+    call = asyncio.ensure_future(left.call("hang"))
+    await asyncio.sleep(0.05)
+    right.close()
+    with pytest.raises(ChannelClosed):
+        await call
+    await asyncio.gather(*tasks)
+
+
+async def test_worker_agent_forwards_registration(server, fake_socket):
+    spec = discover_agents()["logspyq.agents.unixshell"]
+    agent = WorkerAgent(spec, server)
+    await agent.start()
+    try:
+        assert agent.name == "UNIX Shell"
+        assert agent.alive and agent.pid
+        agent.enabled = True
+        await agent.register_callbacks_with_logseq()
+        for _ in range(100):
+            if "App.registerCommand" in fake_socket.names():
+                break
+            await asyncio.sleep(0.02)
+        assert "App.registerCommand" in fake_socket.names()
+    finally:
+        await agent.stop()
+    assert not agent.alive
+    assert not any(server._listeners.values())